@@ -0,0 +1,133 @@
+"""Persistent content-addressed cache of perturbation results"""
+
+import glob
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+import cloudpickle
+import numpy as np
+
+from anamod.core.prediction import unwrap_model
+
+CACHE_EXTENSION = ".cpkl"
+
+
+class PerturbationCache():
+    """
+    On-disk cache of perturbed losses, keyed by a hash of everything that determines them: the model, data and targets,
+    the analysis configuration, and the feature indices, timesteps, perturbation type, RNG state and number of permutations.
+    Entries are evicted in least-recently-used order once the total size of the cache exceeds max_bytes.
+    Safe to share across threads and processes (entries are written atomically).
+    """
+    def __init__(self, cache_dir, max_bytes, context):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.context = context  # Hash of inputs/configuration shared by all entries
+        self._lock = threading.Lock()
+        self._size = sum(os.path.getsize(filename) for filename in self._filenames())
+
+    @classmethod
+    def from_args(cls, args, inputs, config):
+        """Create cache for given worker arguments, inputs and (JSON-serializable) configuration determining perturbation results"""
+        data, targets, model = inputs
+        context = hashlib.sha256()
+        if getattr(args, "model_filename", None):
+            context.update(hash_file(args.model_filename))
+        else:
+            context.update(cloudpickle.dumps(unwrap_model(model)))
+        for array in [data, targets]:
+            array = array if hasattr(array, "dtype") else np.asarray(array)
+            context.update(f"{array.dtype.str}{array.shape}".encode())
+            # Hash in chunks of instances, since data may be out-of-core
+            chunk_rows = max(1, 2**24 // max(1, np.asarray(array[:1]).nbytes))
+            for start in range(0, len(array), chunk_rows):
+                context.update(memoryview(np.ascontiguousarray(array[start: start + chunk_rows])).cast("B"))
+        context.update(json.dumps(config, sort_keys=True).encode())
+        return cls(args.cache_dir, args.cache_max_bytes, context.hexdigest())
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def key(self, feature, timesteps, perturbation_type, num_permutations, stopping_rule=None):
+        """Return key for perturbation of feature, given the current state of its RNG"""
+        # pylint: disable = too-many-arguments
+        if isinstance(timesteps, range):
+            timesteps = [timesteps.start, timesteps.stop, timesteps.step]
+        elif timesteps is not ...:
+            timesteps = np.asarray(timesteps).tolist()
+        if stopping_rule is not None:
+            stopping_rule = [stopping_rule.statistic, stopping_rule.significance_level, stopping_rule.error_tolerance,
+                             sorted(stopping_rule.checkpoints)]
+        description = {"context": self.context, "idx": np.asarray(feature.idx).tolist(), "timesteps": str(timesteps),
+                       "perturbation_type": perturbation_type, "rng_state": feature.rng.bit_generator.state,
+                       "num_permutations": num_permutations, "stopping_rule": stopping_rule}
+        return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key):
+        """Return (perturbed loss, RNG state after perturbation) for key if cached, else None"""
+        filename = self._filename(key)
+        try:
+            with open(filename, "rb") as cache_file:
+                entry = pickle.load(cache_file)
+            os.utime(filename)  # Mark as recently used
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return entry
+
+    def put(self, key, perturbed_loss, rng_state):
+        """Add perturbed loss and RNG state after perturbation to cache, evicting old entries if required"""
+        tmp_fd, tmp_filename = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(tmp_fd, "wb") as cache_file:
+            pickle.dump((perturbed_loss, rng_state), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        size = os.path.getsize(tmp_filename)
+        os.replace(tmp_filename, self._filename(key))
+        with self._lock:
+            self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until cache fits within size limit"""
+        entries = []
+        for filename in self._filenames():
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue  # Removed concurrently
+            entries.append((stat.st_mtime, stat.st_size, filename))
+        entries.sort()
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, filename in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                continue
+            self._size -= size
+
+    def _filename(self, key):
+        return os.path.join(self.cache_dir, f"{key}{CACHE_EXTENSION}")
+
+    def _filenames(self):
+        return glob.glob(os.path.join(self.cache_dir, f"*{CACHE_EXTENSION}"))
+
+
+def hash_file(filename, chunk_size=2**24):
+    """Return SHA-256 digest of file contents"""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as hash_input:
+        for chunk in iter(lambda: hash_input.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.digest()
@@ -0,0 +1,85 @@
+"""Per-feature checkpointing of worker results"""
+
+import os
+import pickle
+import threading
+
+from anamod.core.feature import ATTRIBUTES
+
+# Checkpoint stages
+IMPORTANCE = "importance"  # Overall importance test
+WINDOW = "window"  # Ordering test and window search
+TEMPORAL = "temporal"  # Complete temporal analysis
+
+
+class Checkpoint():
+    """
+    Append-only log of feature results, written (durably) after each stage of analysis of each feature.
+    A restarted worker restores results (and RNG states) from the log instead of repeating the analysis.
+    The log starts with the worker configuration, and is discarded if the configuration changes.
+    If filename is None, checkpointing is disabled.
+    """
+    def __init__(self, filename, config, logger):
+        self._filename = filename
+        self._records = {}  # (stage, feature name) -> (attributes, RNG state)
+        self._lock = threading.Lock()
+        self._file = None
+        if filename is None:
+            return
+        offset = self._load(config, logger)
+        self._file = open(filename, "r+b" if offset else "wb")  # pylint: disable = consider-using-with
+        self._file.truncate(offset)  # Discard partially written record, if any
+        self._file.seek(offset)
+        if not offset:
+            self._append(config)
+
+    def _load(self, config, logger):
+        """Load records from existing log; returns offset after last complete record (0 if log is missing or stale)"""
+        if not os.path.isfile(self._filename):
+            return 0
+        offset = 0
+        with open(self._filename, "rb") as log:
+            try:
+                if pickle.load(log) != config:
+                    logger.warning(f"Checkpoint {self._filename} has different configuration, discarding")
+                    return 0
+                offset = log.tell()
+                while True:
+                    stage, name, attributes, rng_state = pickle.load(log)
+                    self._records[(stage, name)] = (attributes, rng_state)
+                    offset = log.tell()
+            except (EOFError, pickle.UnpicklingError, ValueError):
+                pass
+        logger.info(f"Resuming from checkpoint {self._filename} with {len(self._records)} records")
+        return offset
+
+    def _append(self, record):
+        """Durably append record to log"""
+        pickle.dump(record, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record(self, stage, feature):
+        """Record results of given stage of analysis of feature"""
+        if self._file is None:
+            return
+        attributes = {key: getattr(feature, key) for key in ATTRIBUTES}
+        with self._lock:
+            self._append((stage, feature.name, attributes, feature.rng.bit_generator.state))
+
+    def restore(self, stage, feature):
+        """Restore results of given stage of analysis of feature if recorded; returns whether restored"""
+        entry = self._records.get((stage, feature.name))
+        if entry is None:
+            return False
+        attributes, rng_state = entry
+        for key, value in attributes.items():
+            setattr(feature, key, value)
+        feature.rng.bit_generator.state = rng_state
+        return True
+
+    def close(self):
+        """Close log"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
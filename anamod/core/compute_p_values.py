@@ -1,46 +1,231 @@
 """Computes p-values for paired statistical tests over input vectors"""
 
+import copy
+
 import numpy as np
 from numpy import asarray, compress, sqrt
-from scipy.stats import find_repeats, rankdata, norm, ttest_rel
+from scipy.stats import beta, find_repeats, rankdata, norm, ttest_rel
 
 from anamod.core import constants, utils
 
 
 def compute_empirical_p_value(baseline_loss, perturbed_loss, statistic):
     """Compute Monte Carlo estimate of empirical permutation-based p-value"""
-    num_instances, num_permutations = perturbed_loss.shape
+    return compute_empirical_p_values(baseline_loss, perturbed_loss, [statistic])[statistic]
+
+
+def compute_empirical_p_values(baseline_loss, perturbed_loss, statistics):
+    """Compute Monte Carlo estimates of empirical permutation-based p-values for several statistics (dict mapping statistics to p-values)"""
+    num_permutations = perturbed_loss.shape[1]
+    counts = count_null_exceedances(baseline_loss, perturbed_loss, statistics)
+    return {statistic: (1 + count) / (1 + num_permutations) for statistic, count in counts.items()}
+
+
+def count_null_exceedances(baseline_loss, perturbed_loss, statistics):
+    """
+    Count permutations for which the perturbed statistic does not exceed the baseline statistic,
+    for a single statistic (returns count) or a list of statistics (returns dict mapping statistics to counts)
+    """
+    if isinstance(statistics, str):
+        return count_null_exceedances(baseline_loss, perturbed_loss, [statistics])[statistics]
+    counts = {}
+    for statistic, (baseline_statistic, perturbed_statistic) in compute_statistics(baseline_loss, perturbed_loss, statistics).items():
+        # Baseline statistic should be smaller to reject null
+        counts[statistic] = np.count_nonzero(perturbed_statistic <= baseline_statistic + 1e-10)
+    return counts
+
+
+def compute_statistics(baseline_loss, perturbed_loss, statistics):
+    """
+    Compute test statistics over baseline loss vector and perturbed loss matrix (instances x permutations)
+    using whole-matrix operations (one reduction of the matrix per statistic, over all permutations at once).
+    The perturbed loss matrix may also be a StreamingPerturbedLoss, which holds precomputed perturbed statistics.
+    Returns dict mapping each statistic to (baseline statistic, vector of perturbed statistics)
+    """
+    if isinstance(perturbed_loss, StreamingPerturbedLoss):
+        return {statistic: (compute_baseline_statistic(baseline_loss, statistic), perturbed_loss.statistics[statistic])
+                for statistic in statistics}
+    perturbed_statistics = compute_perturbed_statistics(baseline_loss, perturbed_loss, statistics)
+    return {statistic: (compute_baseline_statistic(baseline_loss, statistic), perturbed_statistics[statistic]) for statistic in statistics}
+
+
+def compute_baseline_statistic(baseline_loss, statistic):
+    """Compute test statistic over baseline loss vector"""
     if statistic == constants.MEAN_LOSS:
-        baseline_statistic = np.mean(baseline_loss)
-        perturbed_statistic = np.mean(perturbed_loss, axis=0)
-    elif statistic == constants.MEAN_LOG_LOSS:
-        baseline_statistic = np.mean(np.log(baseline_loss))
-        perturbed_statistic = np.mean(np.log(perturbed_loss), axis=0)
-    elif statistic == constants.MEDIAN_LOSS:
-        baseline_statistic = np.median(baseline_loss)
-        perturbed_statistic = np.median(perturbed_loss, axis=0)
-    elif statistic == constants.RELATIVE_MEAN_LOSS:
-        perturbed_statistic = np.zeros(num_permutations)
-        for kidx in range(num_permutations):
-            normalized_loss = np.divide(perturbed_loss[:, kidx], baseline_loss)
-            perturbed_statistic[kidx] = np.mean(normalized_loss)
-        baseline_statistic = 1
-    elif statistic == constants.SIGN_LOSS:
-        threshold = num_instances // 2
-        perturbed_statistic = np.zeros(num_permutations)
-        for kidx in range(num_permutations):
-            count = sum(perturbed_loss[:, kidx] > baseline_loss + 1e-10)
-            if count > threshold:
-                perturbed_statistic[kidx] = 1
-            elif count == threshold:
-                perturbed_statistic[kidx] = 0
+        return np.mean(baseline_loss, dtype=np.float64)
+    if statistic == constants.MEAN_LOG_LOSS:
+        return np.mean(np.log(baseline_loss), dtype=np.float64)
+    if statistic == constants.MEDIAN_LOSS:
+        return np.median(baseline_loss)
+    if statistic == constants.RELATIVE_MEAN_LOSS:
+        return 1
+    if statistic == constants.SIGN_LOSS:
+        return 0
+    raise ValueError(f"Unknown statistic {statistic}")
+
+
+def compute_perturbed_statistics(baseline_loss, perturbed_loss, statistics):
+    """Compute test statistics per permutation over perturbed loss matrix; returns dict mapping statistics to vectors"""
+    num_instances = perturbed_loss.shape[0]
+    results = {}
+    for statistic in statistics:
+        if statistic == constants.MEAN_LOSS:
+            results[statistic] = np.mean(perturbed_loss, axis=0, dtype=np.float64)
+        elif statistic == constants.MEAN_LOG_LOSS:
+            results[statistic] = np.mean(np.log(perturbed_loss), axis=0, dtype=np.float64)
+        elif statistic == constants.MEDIAN_LOSS:
+            results[statistic] = partition_median(perturbed_loss)
+        elif statistic == constants.RELATIVE_MEAN_LOSS:
+            # Transposed to average over contiguous rows, matching the summation order of per-permutation averages
+            normalized_loss = np.ascontiguousarray(perturbed_loss.T) / baseline_loss
+            results[statistic] = np.mean(normalized_loss, axis=1, dtype=np.float64)
+        elif statistic == constants.SIGN_LOSS:
+            count = np.count_nonzero(perturbed_loss > (baseline_loss + 1e-10)[:, np.newaxis], axis=0)
+            results[statistic] = np.sign(count - num_instances // 2)
+        else:
+            raise ValueError(f"Unknown statistic {statistic}")
+    return results
+
+
+class StreamingPerturbedLoss():
+    """
+    Online stand-in for perturbed loss matrix (instances x permutations): each column of losses (one permutation)
+    is reduced to its test statistics and mean loss as soon as it is assigned, so that memory does not grow
+    with the number of instances. Supports assigning columns (loss[:, kidx] = column), truncating permutations
+    (loss[:, :num_permutations]), np.mean and the test statistics in this module.
+    """
+    def __init__(self, baseline_loss, statistics, num_permutations):
+        self.baseline_loss = baseline_loss
+        self.statistics = {statistic: np.zeros(num_permutations) for statistic in statistics}
+        self.loss_means = np.zeros(num_permutations)
+        self.shape = (len(baseline_loss), num_permutations)
+
+    def __setitem__(self, key, losses):
+        _, kidx = key
+        self.loss_means[kidx] = np.mean(losses, dtype=np.float64)
+        for statistic, values in compute_perturbed_statistics(self.baseline_loss, losses[:, np.newaxis], self.statistics).items():
+            self.statistics[statistic][kidx] = values[0]
+
+    def __getitem__(self, key):
+        _, permutations = key
+        truncated = copy.copy(self)
+        truncated.statistics = {statistic: values[permutations] for statistic, values in self.statistics.items()}
+        truncated.loss_means = self.loss_means[permutations]
+        truncated.shape = (self.shape[0], len(truncated.loss_means))
+        return truncated
+
+    def mean(self, axis=None, dtype=None, out=None):
+        """Return mean loss over all instances and permutations (called by np.mean)"""
+        assert axis is None and out is None
+        return np.mean(self.loss_means, dtype=dtype)
+
+
+class PartialPerturbedLoss():
+    """
+    Stand-in for the rows of a perturbed loss matrix (instances x permutations) belonging to a shard of instances:
+    each column of losses (one permutation) is reduced to sums over the shard's instances, of the losses and of the
+    per-instance terms of the test statistics. These sums are additive across shards (see '+'), and the partial losses
+    of all shards are reduced to a StreamingPerturbedLoss by 'reduce'. Not supported for the median statistic.
+    """
+    def __init__(self, baseline_loss, statistics, num_permutations):
+        assert constants.MEDIAN_LOSS not in statistics, "Median loss statistic is not additive across instances"
+        self.baseline_loss = baseline_loss  # baseline losses of shard
+        self.statistics = list(statistics)
+        self.sums = {key: np.zeros(num_permutations) for key in [constants.MEAN_LOSS, *statistics]}
+        self.shape = (len(baseline_loss), num_permutations)
+
+    def __setitem__(self, key, losses):
+        _, kidx = key
+        for statistic in self.sums:
+            if statistic == constants.MEAN_LOSS:
+                self.sums[statistic][kidx] = np.sum(losses, dtype=np.float64)
+            elif statistic == constants.MEAN_LOG_LOSS:
+                self.sums[statistic][kidx] = np.sum(np.log(losses), dtype=np.float64)
+            elif statistic == constants.RELATIVE_MEAN_LOSS:
+                self.sums[statistic][kidx] = np.sum(losses / self.baseline_loss, dtype=np.float64)
+            elif statistic == constants.SIGN_LOSS:
+                self.sums[statistic][kidx] = np.count_nonzero(losses > self.baseline_loss + 1e-10)
             else:
-                perturbed_statistic[kidx] = -1
-        baseline_statistic = 0
-    else:
-        raise ValueError(f"Unknown statistic {statistic}")
-    # Baseline statistic should be smaller to reject null
-    return (1 + sum(perturbed_statistic <= baseline_statistic + 1e-10)) / (1 + num_permutations)
+                raise ValueError(f"Unknown statistic {statistic}")
+
+    def __getitem__(self, key):
+        _, permutations = key
+        truncated = copy.copy(self)
+        truncated.sums = {statistic: values[permutations] for statistic, values in self.sums.items()}
+        truncated.shape = (self.shape[0], len(truncated.sums[constants.MEAN_LOSS]))
+        return truncated
+
+    def __add__(self, other):
+        assert self.sums.keys() == other.sums.keys() and self.shape[1] == other.shape[1]
+        merged = copy.copy(self)
+        merged.baseline_loss = None  # spans several shards
+        merged.sums = {statistic: values + other.sums[statistic] for statistic, values in self.sums.items()}
+        merged.shape = (self.shape[0] + other.shape[0], self.shape[1])
+        return merged
+
+    def reduce(self, baseline_loss):
+        """Return StreamingPerturbedLoss over all instances, given partial losses summed across all shards"""
+        num_instances, num_permutations = self.shape
+        assert len(baseline_loss) == num_instances
+        reduced = StreamingPerturbedLoss(baseline_loss, self.statistics, num_permutations)
+        reduced.loss_means = self.sums[constants.MEAN_LOSS] / num_instances
+        for statistic in reduced.statistics:
+            if statistic == constants.SIGN_LOSS:
+                reduced.statistics[statistic] = np.sign(self.sums[statistic] - num_instances // 2)
+            else:
+                reduced.statistics[statistic] = self.sums[statistic] / num_instances
+        return reduced
+
+
+def partition_median(losses):
+    """Compute column medians of loss matrix with a single partial sort, equivalent to np.median(losses, axis=0)"""
+    num_instances = losses.shape[0]
+    mid = num_instances // 2
+    kth = [mid] if num_instances % 2 else [mid - 1, mid]
+    partitioned = np.partition(losses, kth, axis=0)
+    if num_instances % 2:
+        return partitioned[mid]
+    return np.mean(partitioned[mid - 1: mid + 1], axis=0)
+
+
+class SequentialPermutationTest():
+    """
+    Sequential Monte Carlo permutation test, used to stop permuting a feature once its decision at the given
+    significance level is settled, i.e. once a Clopper-Pearson confidence interval for the permutation p-value
+    lies entirely above or below the significance level. The decision is checked after geometrically increasing
+    numbers of permutations, splitting the error tolerance across checks (Bonferroni).
+    """
+    min_permutations = 10  # number of permutations before first check
+
+    def __init__(self, baseline_loss, statistic, significance_level, error_tolerance, num_permutations):
+        # pylint: disable = too-many-arguments
+        self.baseline_loss = baseline_loss
+        self.statistic = statistic
+        self.significance_level = significance_level
+        self.checkpoints = set()
+        checkpoint = self.min_permutations
+        while checkpoint < num_permutations:
+            self.checkpoints.add(checkpoint)
+            checkpoint *= 2
+        self.error_tolerance = error_tolerance / max(len(self.checkpoints), 1)
+
+    def is_checkpoint(self, num_permutations):
+        """Return whether decision is to be checked after given number of permutations"""
+        return num_permutations in self.checkpoints
+
+    def settled(self, perturbed_loss):
+        """Return whether decision is settled given perturbed losses so far"""
+        num_permutations = perturbed_loss.shape[1]
+        count = count_null_exceedances(self.baseline_loss, perturbed_loss, self.statistic)
+        lower, upper = clopper_pearson_interval(count, num_permutations, self.error_tolerance)
+        return upper < self.significance_level or lower > self.significance_level
+
+
+def clopper_pearson_interval(count, num_trials, error):
+    """Return (exact) Clopper-Pearson confidence interval for binomial proportion with coverage 1 - error"""
+    lower = beta.ppf(error / 2, count, num_trials - count + 1) if count > 0 else 0.
+    upper = beta.ppf(1 - error / 2, count + 1, num_trials - count) if count < num_trials else 1.
+    return lower, upper
 
 
 def compute_p_value(baseline, perturbed, test=constants.PAIRED_TTEST, alternative=constants.TWOSIDED):
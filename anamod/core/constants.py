@@ -24,6 +24,19 @@ EFFECT_SIZE = "effect_size"
 IMPORTANCE_TEST = "importance_test"
 CHOICES_WINDOW_SEARCH_ALGORITHM = {EFFECT_SIZE}  # {EFFECT_SIZE, IMPORTANCE_TEST}
 
+# Worker execution
+SERIAL = "serial"
+THREAD = "thread"
+PROCESS = "process"
+CHOICES_WORKER_EXECUTORS = [SERIAL, THREAD, PROCESS]
+FLOAT32 = "float32"
+FLOAT64 = "float64"
+CHOICES_DTYPES = [FLOAT32, FLOAT64]
+HDF5 = "hdf5"
+NPY = "npy"
+CHOICES_DATA_FORMATS = [HDF5, NPY]
+DATA_CHUNK_BYTES = 2**26  # Default size of chunks of instances of out-of-core data
+
 # Condor
 POLL_BASED_TRACKING = "poll_based_tracking"
 EVENT_LOG_TRACKING = "event_log_tracking"
@@ -39,18 +52,28 @@ CONDOR_AVOID_HOSTS = ["mastodon-5.biostat.wisc.edu", "qlu-1.biostat.wisc.edu",
                       "mastodon-1.biostat.wisc.edu"]   # don't seem to be on shared filesystem
 CONDOR_MAX_ERROR_COUNT = 100  # Maximum number of condor errors to tolerate before aborting (for a variety of possible reasons)
 QUEUE, REMOVE, QUERY, HISTORY = ("queue", "remove", "query", "history")  # Condor scheduler actions
+CONDOR_MAX_OPEN_EVENT_LOGS = 64  # Maximum number of job event logs to keep open at once (below sysctl fs.inotify.max_user_instances)
+CONDOR_MIN_POLL_INTERVAL = 2  # Time (in seconds) between polls of event logs after new events
+CONDOR_MAX_POLL_INTERVAL = 60  # Maximum time between polls of event logs, reached while no new events are seen
+CONDOR_POLL_BACKOFF = 1.5  # Factor by which time between polls grows while no new events are seen
 
 # Master I/O
 MODEL_FILENAME = "model.cpkl"
 DATA_FILENAME = "data.hdf5"
+DATA_ARRAY_FILENAME = "data.npy"
+BASELINE_FILENAME = "baseline.hdf5"
 FEATURE_IMPORTANCE = "feature_importance"
 FEATURE_IMPORTANCE_HIERARCHY = f"{FEATURE_IMPORTANCE}_hierarchy"
 FEATURE_IMPORTANCE_WINDOWS = f"{FEATURE_IMPORTANCE}_windows"
 
 # Worker I/O
 INPUT_FEATURES_FILENAME = "{}/input_features_worker_{}.cpkl"
-OUTPUT_FEATURES_FILENAME = "{}/output_features_worker_{}.cpkl"
+PARTIAL_LOSSES_FILENAME = "{}/partial_losses_worker_{}.cpkl"
 RESULTS_FILENAME = "{}/results_worker_{}.hdf5"
+QUEUE_RESULTS_FILENAME = "{}/queue_results_worker_{}.hdf5"
+QUEUE_FILENAME = "{}/queue_features.cpkl"
+PARTITION_FILENAME = "{}/partition.cpkl"
+CHECKPOINT_FILENAME = "{}/checkpoint_worker_{}.cpkl"
 
 # Hypothesis testing
 PVALUE = "p-value"
@@ -82,6 +105,14 @@ TARGETS = "targets"
 STATIC = "static"
 TEMPORAL = "temporal"
 DATA = "data"
+EXTERNAL_DATA = "external_data"  # Attribute of data file referencing out-of-core data
+# Columns of results files (besides feature attributes)
+NAMES = "names"
+DESCRIPTIONS = "descriptions"
+PARENTS = "parents"
+INDEX_POINTERS = "index_pointers"
+INDICES = "indices"
+PERTURBABLE = "perturbable"
 
 # Simulation
 RELEVANT = "relevant"
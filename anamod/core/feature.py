@@ -1,10 +1,7 @@
-"""Feature class"""
-import anytree
+"""Feature hierarchy and feature classes"""
 import numpy as np
 import xxhash
 
-from anamod.core import constants
-
 ATTRIBUTES = dict(
     # p-value attributes
     pvalue=1.,
@@ -23,59 +20,249 @@ ATTRIBUTES = dict(
     temporal_window=None
 )
 
+ALIASES = dict(
+    overall_pvalue="pvalue",
+    overall_important="important",
+    overall_effect_size="effect_size",
+    importance_score="effect_size",
+    window_importance_score="window_effect_size",
+    window="temporal_window"
+)
+
+
+class FeatureHierarchy():
+    """
+    Array-backed hierarchy (forest) over features/feature groups, numbered by position in pre-order:
+
+    * parents: position of each node's parent (-1 for roots)
+    * child_pointers, child_indices: children of node i are child_indices[child_pointers[i]: child_pointers[i + 1]]
+    * index_starts, index_stops, indices: feature indices of node i are indices[index_starts[i]: index_stops[i]]
+      (nodes may share ranges of indices, e.g. a group's range spans the ranges of its descendants)
+    * columns: one array per result attribute (see ATTRIBUTES), with temporal windows stored as (start, stop) pairs (-1 if none)
+
+    Nodes are accessed through Feature views (see feature/features).
+    """
+    # pylint: disable = too-many-arguments, too-many-instance-attributes
+    def __init__(self, names, parents, index_starts, index_stops, indices, descriptions=None, perturbable=None):
+        num_nodes = len(names)
+        self.names = list(names)
+        self.parents = np.asarray(parents, dtype=np.int64)
+        self.index_starts = np.asarray(index_starts, dtype=np.int64)
+        self.index_stops = np.asarray(index_stops, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.descriptions = [""] * num_nodes if descriptions is None else list(descriptions)
+        self.perturbable = np.ones(num_nodes, dtype=bool) if perturbable is None else np.asarray(perturbable, dtype=bool)
+        self.rng_seeds = np.array([xxhash.xxh32_intdigest(name) for name in self.names], dtype=np.int64)
+        self.rngs = [None] * num_nodes  # RNGs used for permuting features - see perturbations.py: 'feature.rng'
+        self.columns = {}
+        for key, default in ATTRIBUTES.items():
+            if key == "temporal_window":
+                self.columns[key] = np.full((num_nodes, 2), -1, dtype=np.int64)
+            else:
+                self.columns[key] = np.full(num_nodes, default, dtype=type(default))
+        # Children in CSR form, in order of position (stable sort keeps siblings in pre-order)
+        order = np.argsort(self.parents, kind="stable")
+        num_roots = np.count_nonzero(self.parents < 0)
+        self.roots = order[:num_roots]
+        self.child_indices = order[num_roots:]
+        counts = np.bincount(self.parents[self.parents >= 0], minlength=num_nodes)
+        self.child_pointers = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    @classmethod
+    def from_parents(cls, parents, leaf_idx, names=None, descriptions=None, perturbable=None):
+        """
+        Create hierarchy in linear time given the position of each node's parent (-1 for roots), in any order,
+        along with the feature indices of each leaf (ignored for internal nodes, which cover the indices of their leaves).
+        Nodes are renumbered in pre-order, so that the indices of each node form a single range of a shared index array.
+        """
+        # pylint: disable = too-many-locals
+        num_nodes = len(parents)
+        children = [[] for _ in range(num_nodes)]
+        roots = []
+        for node, parent in enumerate(parents):
+            (roots if parent < 0 else children[parent]).append(node)
+        # Traverse in pre-order, laying out leaf indices contiguously
+        order = []
+        starts = np.zeros(num_nodes, dtype=np.int64)
+        leaf_indices = []
+        num_indices = 0
+        stack = roots[::-1]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            starts[node] = num_indices
+            if not children[node]:
+                leaf_indices.append(leaf_idx[node])
+                num_indices += len(leaf_idx[node])
+            stack.extend(reversed(children[node]))
+        assert len(order) == num_nodes, "Hierarchy must not contain cycles"
+        # Each node's range of indices ends where that of its last descendant ends
+        stops = starts.copy()
+        for node in reversed(order):
+            if not children[node]:
+                stops[node] += len(leaf_idx[node])
+            if parents[node] >= 0:
+                stops[parents[node]] = max(stops[parents[node]], stops[node])
+        order = np.array(order, dtype=np.int64)
+        positions = np.full(num_nodes + 1, -1, dtype=np.int64)  # last entry maps missing parents (-1) to -1
+        positions[order] = np.arange(num_nodes)
+        names = [str(node) for node in range(num_nodes)] if names is None else names
+        indices = np.concatenate([np.asarray(idx, dtype=np.int64) for idx in leaf_indices]) if leaf_indices else np.zeros(0, dtype=np.int64)
+        return cls([names[node] for node in order], positions[np.asarray(parents, dtype=np.int64)[order]], starts[order], stops[order], indices,
+                   descriptions=None if descriptions is None else [descriptions[node] for node in order],
+                   perturbable=None if perturbable is None else np.asarray(perturbable, dtype=bool)[order])
+
+    def __len__(self):
+        return len(self.names)
+
+    def feature(self, position):
+        """Return view of node at given position"""
+        return Feature(self, int(position))
+
+    def features(self, positions=None):
+        """Return views of nodes at given positions (all nodes by default)"""
+        positions = range(len(self)) if positions is None else positions
+        return [Feature(self, int(position)) for position in positions]
+
+    @property
+    def root(self):
+        """Return view of (first) root"""
+        return self.feature(self.roots[0])
+
+    def children(self, position):
+        """Return positions of children of node"""
+        return self.child_indices[self.child_pointers[position]: self.child_pointers[position + 1]]
+
+    def idx(self, position):
+        """Return feature indices of node"""
+        return self.indices[self.index_starts[position]: self.index_stops[position]]
+
+    def levels(self):
+        """Iterate over positions of nodes level by level, starting with roots"""
+        level = self.roots
+        while level.size:
+            yield level
+            level = np.concatenate([self.children(position) for position in level])
 
-# pylint: disable = too-many-instance-attributes
-class Feature(anytree.Node):
-    """Class representing feature/feature group"""
-    aliases = dict(
-        overall_pvalue="pvalue",
-        overall_important="important",
-        overall_effect_size="effect_size",
-        importance_score="effect_size",
-        window_importance_score="window_effect_size",
-        window="temporal_window"
-    )
-
-    def __setattr__(self, name, value):
-        name = self.aliases.get(name, name)
-        object.__setattr__(self, name, value)
-
-    def __getattr__(self, name):
-        if name == "aliases":
-            raise AttributeError  # http://nedbatchelder.com/blog/201010/surprising_getattr_recursion.html
-        name = self.aliases.get(name, name)
-        return object.__getattribute__(self, name)
+    def get(self, key, position):
+        """Return result attribute of node"""
+        value = self.columns[key][position]
+        if key == "temporal_window":
+            return None if value[0] < 0 else tuple(value.tolist())
+        return value.item()
+
+    def set(self, key, position, value):
+        """Set result attribute of node"""
+        self.columns[key][position] = (-1, -1) if key == "temporal_window" and value is None else value
+
+    def subset(self, positions):
+        """Return hierarchy restricted to nodes at given positions, with results, RNGs and links among them (sharing indices)"""
+        positions = np.asarray(positions, dtype=np.int64)
+        mapping = np.full(len(self) + 1, -1, dtype=np.int64)  # last entry maps missing parents (-1) to -1
+        mapping[positions] = np.arange(positions.size)
+        hierarchy = FeatureHierarchy([self.names[position] for position in positions], mapping[self.parents[positions]],
+                                     self.index_starts[positions], self.index_stops[positions], self.indices,
+                                     descriptions=[self.descriptions[position] for position in positions],
+                                     perturbable=self.perturbable[positions])
+        hierarchy.rng_seeds = self.rng_seeds[positions]
+        hierarchy.rngs = [self.rngs[position] for position in positions]
+        hierarchy.columns = {key: values[positions] for key, values in self.columns.items()}
+        return hierarchy
+
+
+def linkage_parents(linkage):
+    """
+    Return parent array of hierarchy defined by (scipy) linkage matrix over n base features:
+    nodes 0, ..., n - 1 are the base features, and node n + i is the cluster formed by the i-th merge (the last being the root)
+    """
+    linkage = np.asarray(linkage)
+    num_leaves = linkage.shape[0] + 1
+    parents = np.full(2 * num_leaves - 1, -1, dtype=np.int64)
+    clusters = np.arange(num_leaves, 2 * num_leaves - 1)
+    parents[linkage[:, 0].astype(np.int64)] = clusters
+    parents[linkage[:, 1].astype(np.int64)] = clusters
+    return parents
+
+
+class Feature():
+    """
+    Class representing feature/feature group: lightweight view of node of feature hierarchy (see FeatureHierarchy),
+    with hierarchy navigation compatible with anytree iterators
+    """
+    __slots__ = ("hierarchy", "position")
+
+    def __init__(self, hierarchy, position):
+        self.hierarchy = hierarchy
+        self.position = position
+
+    def __eq__(self, other):
+        return isinstance(other, Feature) and self.hierarchy is other.hierarchy and self.position == other.position
+
+    def __hash__(self):
+        return hash((id(self.hierarchy), self.position))
+
+    def __repr__(self):
+        return f"Feature({self.name!r})"
 
     def __str__(self):
-        out = f"Name: {self.name}\nDescription: {self.description}\nIndices: {self.idx}"
-        for key, value in ATTRIBUTES.items():
-            out += f"\n{key.replace('_', ' ').title()}: {value}"
+        out = f"Name: {self.name}\nDescription: {self.description}\nIndices: {self.idx.tolist()}"
+        for key in ATTRIBUTES:
+            out += f"\n{key.replace('_', ' ').title()}: {getattr(self, key)}"
         return out
 
-    def __init__(self, name, **kwargs):
-        super().__init__(name, **kwargs)
-        self.description = kwargs.get(constants.DESCRIPTION, "")
-        self.idx = kwargs.get("idx", [])
-        self.perturbable = kwargs.get("perturbable", True)
-        # TODO: (Verify) Could initialize the RNG right away, since cloudpickle should still be able to pickle it
-        self._rng_seed = xxhash.xxh32_intdigest(name)
-        self.rng = None  # RNG used for permuting this feature - see perturbations.py: 'feature.rng'
-        for key, value in ATTRIBUTES.items():
-            setattr(self, key, value)
+    @property
+    def name(self):
+        """Get name"""
+        return self.hierarchy.names[self.position]
+
+    @name.setter
+    def name(self, name):
+        """Set name"""
+        self.hierarchy.names[self.position] = name
+
+    @property
+    def description(self):
+        """Get description"""
+        return self.hierarchy.descriptions[self.position]
+
+    @property
+    def idx(self):
+        """Get feature indices (array)"""
+        return self.hierarchy.idx(self.position)
+
+    @property
+    def size(self):
+        """Return size"""
+        return int(self.hierarchy.index_stops[self.position] - self.hierarchy.index_starts[self.position])
+
+    @property
+    def perturbable(self):
+        """Return whether feature is perturbed"""
+        return bool(self.hierarchy.perturbable[self.position])
 
     @property
     def rng_seed(self):
         """Get RNG seed"""
-        return self._rng_seed
+        return int(self.hierarchy.rng_seeds[self.position])
 
     @rng_seed.setter
     def rng_seed(self, seed):
         """Set RNG seed"""
-        self._rng_seed = seed
+        self.hierarchy.rng_seeds[self.position] = seed
+
+    @property
+    def rng(self):
+        """Get RNG used for permuting this feature"""
+        return self.hierarchy.rngs[self.position]
+
+    @rng.setter
+    def rng(self, rng):
+        """Set RNG used for permuting this feature"""
+        self.hierarchy.rngs[self.position] = rng
 
     def initialize_rng(self):
         """Initialize random number generator for feature (used for permutations)"""
-        self.rng = np.random.default_rng(self._rng_seed)
+        self.rng = np.random.default_rng(self.rng_seed)
 
     def uniquify(self, uniquifier):
         """Add uniquifying identifier to name"""
@@ -83,11 +270,54 @@ class Feature(anytree.Node):
         self.name = "{0}->{1}".format(uniquifier, self.name)
 
     @property
-    def size(self):
-        """Return size"""
-        return len(self.idx)
+    def parent(self):
+        """Return parent (None for root)"""
+        parent = self.hierarchy.parents[self.position]
+        return None if parent < 0 else self.hierarchy.feature(parent)
+
+    @property
+    def children(self):
+        """Return children"""
+        return tuple(self.hierarchy.features(self.hierarchy.children(self.position)))
+
+    @property
+    def root(self):
+        """Return root of hierarchy containing feature"""
+        position = self.position
+        while self.hierarchy.parents[position] >= 0:
+            position = self.hierarchy.parents[position]
+        return self.hierarchy.feature(position)
+
+    @property
+    def is_leaf(self):
+        """Return whether feature has no children"""
+        return bool(self.hierarchy.child_pointers[self.position] == self.hierarchy.child_pointers[self.position + 1])
+
+    @property
+    def is_root(self):
+        """Return whether feature has no parent"""
+        return bool(self.hierarchy.parents[self.position] < 0)
+
+    @property
+    def depth(self):
+        """Return number of ancestors"""
+        depth, position = (0, self.hierarchy.parents[self.position])
+        while position >= 0:
+            depth, position = (depth + 1, self.hierarchy.parents[position])
+        return depth
 
     def copy_attributes(self, other):
         """Copy attributes from other feature"""
         for key in ATTRIBUTES:
             setattr(self, key, getattr(other, key))
+
+
+def _column_property(key):
+    """Return property accessing result attribute column of hierarchy"""
+    return property(lambda self: self.hierarchy.get(key, self.position),
+                    lambda self, value: self.hierarchy.set(key, self.position, value),
+                    doc=f"Get/set {key.replace('_', ' ')}")
+
+
+for _name in [*ATTRIBUTES, *ALIASES]:
+    setattr(Feature, _name, _column_property(ALIASES.get(_name, _name)))
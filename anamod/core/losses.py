@@ -3,6 +3,7 @@
 from abc import ABC
 from inspect import currentframe, getframeinfo
 import sys
+import threading
 
 import numpy as np
 
@@ -44,23 +45,26 @@ class ZeroOneLoss(LossFunction):
 class BinaryCrossEntropy(LossFunction):
     """Binary cross-entropy"""
     fp_warned = False
+    fp_warned_lock = threading.Lock()
 
     @staticmethod
-    def fp_warn(err, flag):
+    def fp_warn():
         """Warn once if zero encountered in np.log"""
-        # pylint: disable = unused-argument
-        if not BinaryCrossEntropy.fp_warned:
-            frameinfo = getframeinfo(currentframe())
-            sys.stderr.write(f"Warning: {frameinfo.filename}: {frameinfo.lineno}: 0 encountered in np.log; "
-                             "ensure that model predictions are probabilities\n")
+        with BinaryCrossEntropy.fp_warned_lock:
+            if BinaryCrossEntropy.fp_warned:
+                return
             BinaryCrossEntropy.fp_warned = True
-
-    np.seterrcall(fp_warn.__func__)
+        frameinfo = getframeinfo(currentframe())
+        sys.stderr.write(f"Warning: {frameinfo.filename}: {frameinfo.lineno}: 0 encountered in np.log; "
+                         "ensure that model predictions are probabilities\n")
 
     @staticmethod
     def loss(y_true, y_pred):
         assert all(y_pred >= 0) and all(y_pred <= 1)
-        with np.errstate(invalid="call", divide="call"):
+        # Zeros in np.log are detected explicitly rather than through a (process-wide) np.seterrcall handler, to be thread-safe
+        if np.any(y_pred == 0) or np.any(y_pred == 1):
+            BinaryCrossEntropy.fp_warn()
+        with np.errstate(invalid="ignore", divide="ignore"):
             losses = -y_true * np.log(y_pred) - (1 - y_true) * np.log(1 - y_pred)
         losses[np.isnan(losses)] = 0  # to handle indeterminate case where y_pred components are zero
         return losses
@@ -74,10 +78,12 @@ LOSS_FUNCTIONS = {constants.QUADRATIC_LOSS: QuadraticLoss,
 
 class Loss():
     """Compute losses given true and predicted model values over a list of instances"""
-    def __init__(self, loss_function, targets):
+    def __init__(self, loss_function, targets, dtype=None):
         self._loss_fn = LOSS_FUNCTIONS[loss_function].loss
         self._targets = targets
+        self._dtype = dtype
 
     def loss_fn(self, predictions):
-        """Return loss vector"""
-        return self._loss_fn(self._targets, predictions)
+        """Return loss vector (of given floating-point type, if provided)"""
+        losses = self._loss_fn(self._targets, predictions)
+        return losses if self._dtype is None else losses.astype(self._dtype, copy=False)
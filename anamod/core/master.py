@@ -8,14 +8,17 @@ in the hierarchy.
 import importlib
 import csv
 import os
-import pickle
 import sys
 
-import cloudpickle
+import h5py
 import numpy as np
 
 from anamod.core import constants, utils
-from anamod.core.pipelines import CondorPipeline, SerialPipeline
+from anamod.core.losses import Loss
+from anamod.core.prediction import adapt_model
+from anamod.core.results import write_results
+from anamod.core.pipelines import CondorPipeline, LocalParallelPipeline, SerialPipeline
+from anamod.core.worker import predict_chunked
 from anamod.visualization.analysis import visualize_hierarchical, visualize_temporal
 
 
@@ -33,8 +36,16 @@ def pipeline(args):
     """Master pipeline"""
     # TODO: 'args' is now an object. Change to reflect that and figure out way to print object attributes
     args.logger.info("Begin anamod master pipeline with args: %s" % args)
+    # Compute baseline once for all workers
+    compute_baseline(args)
     # Perturb features
-    worker_pipeline = CondorPipeline(args) if args.condor else SerialPipeline(args)
+    if args.condor:
+        worker_pipeline = CondorPipeline(args)
+    elif args.n_jobs != 1 or getattr(args, "instance_shards", 1) > 1:
+        # Shards of instances are perturbed by separate jobs (one at a time if n_jobs is 1), and reduced by the master
+        worker_pipeline = LocalParallelPipeline(args)
+    else:
+        worker_pipeline = SerialPipeline(args)
     analyzed_features = worker_pipeline.run()
     write_outputs(args, analyzed_features)
     visualize(args, analyzed_features)
@@ -42,11 +53,28 @@ def pipeline(args):
     return analyzed_features
 
 
+def compute_baseline(args):
+    """Compute baseline predictions/losses, and write them to file (next to data file) for condor workers"""
+    model = adapt_model(args.model, getattr(args, "max_batch_rows", 0), getattr(args, "max_batch_bytes", 0))
+    try:
+        if getattr(args, "data_chunk_rows", 0):
+            args.baseline_predictions = predict_chunked(model, args.data, args.data_chunk_rows)
+        else:
+            args.baseline_predictions = model.predict(args.data)
+    finally:
+        model.close()
+    args.baseline_loss = Loss(args.loss_function, args.targets, args.dtype).loss_fn(args.baseline_predictions)
+    args.logger.info(f"Baseline mean loss: {np.mean(args.baseline_loss, dtype=np.float64)}")
+    if args.condor:
+        args.baseline_filename = f"{args.output_dir}/{constants.BASELINE_FILENAME}"
+        with h5py.File(args.baseline_filename, "w") as root:
+            root.create_dataset(constants.PREDICTIONS, data=args.baseline_predictions)
+            root.create_dataset(constants.LOSSES, data=args.baseline_loss)
+
+
 def write_outputs(args, features):
     """Write outputs to file"""
-    features_filename = f"{args.output_dir}/{constants.FEATURE_IMPORTANCE}.cpkl"
-    with open(features_filename, "wb") as features_file:
-        cloudpickle.dump(features, features_file, protocol=pickle.DEFAULT_PROTOCOL)
+    write_results(f"{args.output_dir}/{constants.FEATURE_IMPORTANCE}.hdf5", features)
     csv_filename = f"{args.output_dir}/{constants.FEATURE_IMPORTANCE}.csv"
     attributes = ["name", "important", "importance_score", "pvalue"]
     if args.analysis_type == constants.TEMPORAL:
@@ -74,6 +102,12 @@ def visualize(args, features):
 
 def validate_args(args):
     """Validate arguments"""
+    for arg in ["n_jobs", "worker_n_jobs"]:
+        n_jobs = getattr(args, arg, 1)
+        if n_jobs < 1 and n_jobs != -1:
+            raise ValueError(f"Number of jobs {arg} must be positive, or -1 to use all available CPUs: {n_jobs}")
+    validate_instance_shards(args)
+    validate_shared_queue(args)
     if args.condor:
         try:
             importlib.import_module("htcondor")
@@ -82,3 +116,32 @@ def validate_args(args):
                   "Use 'pip install htcondor' to install htcondor on a compatible platform, or "
                   "disable condor", file=sys.stderr)
             raise
+
+
+def validate_instance_shards(args):
+    """Validate sharding of instances across jobs"""
+    instance_shards = getattr(args, "instance_shards", 1)
+    if instance_shards < 1:
+        raise ValueError(f"Number of shards of instances must be positive: {instance_shards}")
+    if instance_shards == 1:
+        return
+    if args.analysis_type != constants.HIERARCHICAL:
+        raise ValueError("Instance sharding is only supported for hierarchical analysis")
+    if args.early_stopping_tolerance:
+        raise ValueError("Instance sharding is not supported with early stopping")
+    if args.permutation_test_statistic == constants.MEDIAN_LOSS:
+        raise ValueError("Instance sharding is not supported with median loss statistic")
+    if instance_shards > args.data.shape[0]:
+        raise ValueError("Number of shards of instances exceeds number of instances")
+
+
+def validate_shared_queue(args):
+    """Validate queue of features shared across jobs"""
+    if not getattr(args, "shared_queue_fraction", 0.):
+        return
+    if not 0. <= args.shared_queue_fraction < 1.:
+        raise ValueError("Fraction of features' cost held in shared queue must be in [0, 1)")
+    if getattr(args, "instance_shards", 1) != 1:
+        raise ValueError("Shared queue is not supported with instance sharding")
+    if args.condor and not args.shared_filesystem:
+        raise ValueError("Shared queue requires shared filesystem for condor")
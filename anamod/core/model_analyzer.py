@@ -1,6 +1,7 @@
 """Python API to analyze temporal models"""
 from abc import ABC
 import importlib
+import json
 import os
 import sys
 
@@ -9,7 +10,8 @@ import h5py
 import numpy as np
 
 from anamod.core import master, constants, model_loader
-from anamod.core.feature import Feature
+from anamod.core.feature import FeatureHierarchy, linkage_parents
+from anamod.core.utils import out_of_core_spec
 
 
 COMMON_DOC = (
@@ -36,7 +38,8 @@ COMMON_DOC = (
                 Flag to control output visualization.
 
             seed: int, default: {constants.SEED}
-                Seed for random number generator (used to order features to be analyzed).
+                Seed for random number generator. Results do not depend on it: permutations are seeded per feature
+                (from feature names), and features are assigned to jobs by estimated cost.
 
             loss_function: str, choices: {constants.CHOICES_LOSS_FUNCTIONS}, default: None
                 Loss function to apply to model outputs.
@@ -50,6 +53,108 @@ COMMON_DOC = (
                 Flag to attempt to compile results only (assuming they already exist), skipping actually launching jobs.
     """)
 
+PERFORMANCE_DOC = (
+    f"""
+        **Performance parameters:**
+
+            max_batch_rows: int, default: 0
+                Maximum number of rows (instances) to pass to the model's 'predict' function in a single call.
+                Permuted copies of the data are stacked (across permutations and across sibling features)
+                into batched calls within this budget, reducing per-call overhead for vectorized models,
+                and inputs larger than the budget (e.g. the data itself) are split across calls, bounding model memory usage.
+
+                If both :attr:`max_batch_rows` and :attr:`max_batch_bytes` are 0, each permuted copy of the data
+                is passed to the model separately.
+
+            max_batch_bytes: int, default: 0
+                Maximum size in bytes of the input passed to the model's 'predict' function in a single call.
+                Applied in addition to :attr:`max_batch_rows` if both are provided.
+
+            tune_batch_size: bool, default: False
+                Flag to make workers measure the model's prediction throughput at a few geometrically increasing batch sizes
+                on startup (within :attr:`max_batch_rows` and :attr:`max_batch_bytes`, if provided), and use the batch size
+                with the highest throughput as :attr:`max_batch_rows`.
+
+            max_concurrent_predictions: int, default: 16
+                Maximum number of calls to the model's prediction coroutine kept in flight at once, for asynchronous models
+                (e.g. clients of an inference service) that provide 'async def predict' or 'predict_async' instead of a
+                synchronous 'predict' function. Results are gathered back in order, so they do not depend on this limit.
+
+            perturb_in_place: bool, default: False
+                Flag to perturb features within a persistent workspace and restore the original values after prediction,
+                instead of copying the data for every permutation. This substantially reduces memory traffic
+                for large data, but requires that the model's 'predict' function does not retain references to its input.
+                If no batching is configured, the input data itself is used as the workspace (it is left unchanged upon completion).
+
+            n_jobs: int, default: 1
+                Number of local processes to distribute the analysis across (ignored if :attr:`condor` is enabled).
+                If -1, all available CPUs are used. Features are split into jobs of about :attr:`features_per_worker` features
+                each, and the data is shared across processes through shared memory instead of being copied to each of them.
+
+            worker_executor: str, choices: {constants.CHOICES_WORKER_EXECUTORS}, default: {constants.SERIAL}
+                Executor used within each worker to perturb independent features concurrently.
+                When descending the feature hierarchy, all children of the nodes on the current level are perturbed together,
+                followed by FDR control per parent. Results are identical to serial execution.
+
+                Threads share the data and model without copying them, and are preferable for models that
+                release the GIL within 'predict' (e.g. tree ensembles, BLAS-backed linear models, ONNX runtimes);
+                each thread perturbs a private workspace, and temporal analysis of important features is threaded as well.
+                Processes receive the data through shared memory and a copy of the model.
+
+            worker_n_jobs: int, default: 1
+                Number of threads/processes used by :attr:`worker_executor`. If -1, all available CPUs are used.
+
+            early_stopping_tolerance: float, default: 0
+                If positive, permutation tests (for feature importance and ordering) stop early once the decision at
+                :attr:`importance_significance_level` is settled up to this error probability, as judged by a confidence
+                interval for the Monte Carlo p-value. Since most features are typically unimportant, this can reduce the
+                number of calls to 'predict' substantially. The p-values of features tested with fewer permutations are coarser
+                (the smallest possible p-value after k permutations is 1 / (k + 1)). Disabled if 0.
+
+            streaming_statistics: bool, default: False
+                Flag to reduce the losses of each permutation to the test statistic (:attr:`permutation_test_statistic`)
+                and mean loss as soon as they are computed, instead of storing a matrix of losses of size
+                (number of instances x :attr:`num_permutations`) per feature. Memory usage then no longer grows with the
+                number of instances times the number of permutations. Results may differ from the default
+                in the last floating-point digits.
+
+            dtype: str, choices: {constants.CHOICES_DTYPES}, default: None
+                Floating-point precision used end to end: the data (and real-valued targets) are converted to this type,
+                which carries over to the data file, perturbed copies of the data and workspaces, and losses are stored
+                with this precision. Test statistics and effect sizes are still accumulated in float64.
+                'float32' halves memory usage and bandwidth, and is appropriate for models that run in float32.
+                If None, the data is used as provided and losses are stored in float64.
+
+            cache_dir: str, default: None
+                Directory of persistent cache of perturbation results (perturbed losses), reused across analyses.
+                Results are keyed by the model, data, targets, loss function, feature indices, timesteps, perturbation type,
+                RNG state and number of permutations, so rerunning an analysis after changing unrelated options
+                (e.g. visualization, significance level or parts of the hierarchy) skips predictions for unchanged tests.
+                Must be on a shared filesystem to be used by condor jobs. Disabled if None.
+
+            cache_max_bytes: int, default: 4294967296
+                Maximum size of the cache in bytes; least recently used results are evicted beyond this size.
+
+            checkpoint: bool, default: False
+                Flag to make workers append the results of each feature (after its importance test, window search and
+                complete temporal analysis) to a durable checkpoint log in the output directory. If the analysis is
+                restarted (with the same output directory and configuration), workers resume from the log without repeating
+                completed tests. The log is removed upon completion if :attr:`cleanup` is enabled.
+
+            data_chunk_rows: int, default: 0
+                If positive, workers stream the data through the model's 'predict' function in chunks of (up to) this many
+                instances, and condor workers open the data file lazily instead of reading it into memory. Only the values
+                of the feature being perturbed are held in memory in full, so peak worker memory scales with the chunk size
+                rather than the size of the data (and :attr:`memory_requirement` may be lowered accordingly).
+                Data is written to the HDF5 data file in chunks of this many instances.
+                Supersedes :attr:`max_batch_rows` and :attr:`max_batch_bytes`. If 0, data is read and perturbed as a whole,
+                unless it is provided out-of-core, in which case chunks of about {constants.DATA_CHUNK_BYTES // 2**20} MB are used.
+
+            data_format: str, choices: {constants.CHOICES_DATA_FORMATS}, default: {constants.HDF5}
+                Format of data file written for condor workers. If 'npy', the data is written to a raw .npy file
+                (next to the HDF5 file holding the targets) that workers memory-map when streaming data in chunks.
+    """)
+
 CONDOR_DOC = (
     f"""
         **HTCondor parameters:**
@@ -67,10 +172,34 @@ CONDOR_DOC = (
                 Enabled by default to reduced space usage and clutter."
 
             features_per_worker: int, default: 1
-                Number of features to test per condor job. Fewer features per job reduces job
-                load at the cost of more jobs.
+                Average number of features to test per condor job (or local job, if :attr:`n_jobs` is not 1).
+                Fewer features per job reduces job load at the cost of more jobs.
+                Features are assigned to jobs so as to balance their estimated cost, which grows with the time taken by the model
+                to predict (measured on a sample of instances) and with the number of values perturbed per feature,
+                assigning the most expensive features first.
                 TODO: If none provided, this will be chosen automatically to create up to 100 jobs.
 
+            prune_hierarchy: bool, default: False
+                Flag to descend the feature hierarchy level by level across condor jobs (or local jobs, if :attr:`n_jobs`
+                is not 1), as done without them: each level is tested by its own round of jobs, followed by hierarchical
+                FDR control of its results, and only the children of important features are tested at the next level.
+                By default, all features are tested in a single round of jobs, with FDR control applied afterwards;
+                pruning skips testing the descendants of unimportant feature groups, at the cost of one round per level.
+
+            shared_queue_fraction: float, default: 0
+                If positive, the cheapest features, up to this fraction of the total estimated cost, are held back in
+                a queue shared across jobs instead of being assigned to jobs up front. Jobs that finish their own features
+                claim queued features a few at a time until the queue is exhausted, evening out errors in the cost estimates.
+                Requires a shared filesystem for condor, and is not supported with :attr:`instance_shards`.
+
+            instance_shards: int, default: 1
+                Number of shards of instances to split each job's features across (condor or local parallel pipelines;
+                without condor, jobs run one at a time in a single worker process if :attr:`n_jobs` is 1),
+                for data too large for a single worker to perturb. Each job perturbs its features over its shard of
+                instances only, using permutations drawn across all instances, and returns sums of losses per permutation;
+                these are reduced across shards to test features. Supported for hierarchical analysis without early
+                stopping, and for additive test statistics (i.e. not 'median_loss').
+
             memory_requirement: int, default: 8
                 Memory requirement in GB
 
@@ -109,11 +238,18 @@ class ModelAnalyzer(ABC):
 
                 For instance, this may be a simple wrapper around a scikit-learn or Tensorflow model.
 
-            data: 2D numpy array
+            data: 2D numpy array, h5py dataset, numpy memmap, or str
                 Test data matrix of instances **x** features.
+                Data larger than memory may be provided out-of-core, as an HDF5 dataset, a memory-mapped array,
+                or the path to an HDF5 file holding the data in dataset '{constants.DATA}' (and optionally the targets
+                in dataset '{constants.TARGETS}'). Out-of-core data is processed in chunks of instances
+                (see :attr:`data_chunk_rows`) and never copied, not even into the data file for condor.
+                If data is a path, the file is held open until :meth:`close` is called (or on exiting the analyzer,
+                if used as a context manager).
 
             targets: 1D numpy array
                 A vector containing targets for each instance in the test data.
+                May be None if data is the path to an HDF5 file holding the targets.
 
         **Hierarchical feature analysis parameters:**
 
@@ -121,6 +257,12 @@ class ModelAnalyzer(ABC):
                 Hierarchy over features, defined as an anytree_ node.
                 anytree_ allows importing trees from multiple formats (Python dict, JSON)
 
+                Alternatively, the hierarchy may be defined by a (scipy) linkage matrix over the base features,
+                or by a parent array giving the position of each node's parent (-1 for roots), with nodes 0, ..., num_features - 1
+                being the base features (node i representing feature i) followed by the feature groups.
+                Siblings are ordered by position. These are ingested in linear time, for large and deep hierarchies.
+                Base features are named using :attr:`feature_names` if provided, and other nodes by their positions.
+
                 If no hierarchy is provided, a flat hierarchy will be auto-generated over base features.
 
                 Supersedes :attr:`feature_names` for source of feature names.
@@ -138,11 +280,15 @@ class ModelAnalyzer(ABC):
 
         {COMMON_DOC}
 
+        {PERFORMANCE_DOC}
+
         {CONDOR_DOC}
         """)
 
     def __init__(self, model, data, targets, **kwargs):
+        # pylint: disable = too-many-statements
         self.kwargs = kwargs
+        data, targets = self.open_data(data, targets)
         # Common optional parameters
         self.output_dir = self.process_keyword_arg("output_dir", constants.DEFAULT_OUTPUT_DIR)
         self.perturbation = constants.PERMUTATION  # Zeroing deprecated, removed option
@@ -161,11 +307,31 @@ class ModelAnalyzer(ABC):
         if self.analyze_interactions:
             raise NotImplementedError("Interaction analysis currently disabled pending updated theoretical analysis")
         self.analyze_all_pairwise_interactions = self.process_keyword_arg("analyze_all_pairwise_interactions", False)  # pylint: disable = invalid-name
+        # Performance parameters
+        self.max_batch_rows = self.process_keyword_arg("max_batch_rows", 0)
+        self.max_batch_bytes = self.process_keyword_arg("max_batch_bytes", 0)
+        self.tune_batch_size = self.process_keyword_arg("tune_batch_size", False)
+        self.max_concurrent_predictions = self.process_keyword_arg("max_concurrent_predictions", 16)
+        self.perturb_in_place = self.process_keyword_arg("perturb_in_place", False)
+        self.n_jobs = self.process_keyword_arg("n_jobs", 1)
+        self.worker_executor = self.process_keyword_arg("worker_executor", constants.SERIAL, constants.CHOICES_WORKER_EXECUTORS)
+        self.worker_n_jobs = self.process_keyword_arg("worker_n_jobs", 1)
+        self.early_stopping_tolerance = self.process_keyword_arg("early_stopping_tolerance", 0.)
+        self.streaming_statistics = self.process_keyword_arg("streaming_statistics", False)
+        self.dtype = self.process_keyword_arg("dtype", None, [None, *constants.CHOICES_DTYPES])
+        self.cache_dir = self.process_keyword_arg("cache_dir", None)
+        self.cache_max_bytes = self.process_keyword_arg("cache_max_bytes", 2**32)
+        self.checkpoint = self.process_keyword_arg("checkpoint", False)
+        self.data_chunk_rows = self.process_keyword_arg("data_chunk_rows", 0)
+        self.data_format = self.process_keyword_arg("data_format", constants.HDF5, constants.CHOICES_DATA_FORMATS)
         # HTCondor parameters
         self.condor = self.process_keyword_arg("condor", False)
         self.shared_filesystem = self.process_keyword_arg("shared_filesystem", False)
         self.cleanup = self.process_keyword_arg("cleanup", True)
         self.features_per_worker = self.process_keyword_arg("features_per_worker", 1)
+        self.instance_shards = self.process_keyword_arg("instance_shards", 1)
+        self.prune_hierarchy = self.process_keyword_arg("prune_hierarchy", False)
+        self.shared_queue_fraction = self.process_keyword_arg("shared_queue_fraction", 0.)
         self.memory_requirement = self.process_keyword_arg("memory_requirement", 8)
         self.disk_requirement = self.process_keyword_arg("disk_requirement", 32)
         self.model_loader_filename = self.process_keyword_arg("model_loader_filename", None)
@@ -173,15 +339,47 @@ class ModelAnalyzer(ABC):
         self.retry_arbitrary_failures = self.process_keyword_arg("retry_arbitrary_failures", False)
         # Required parameters
         self.model = model
-        self.data = data
+        if out_of_core_spec(data) is not None:
+            if self.dtype is not None and np.dtype(self.dtype) != data.dtype:
+                raise ValueError(f"Out-of-core data of type {data.dtype} cannot be converted to dtype {self.dtype}; "
+                                 "convert data beforehand")
+            if not self.data_chunk_rows:
+                self.data_chunk_rows = max(1, constants.DATA_CHUNK_BYTES // (int(np.prod(data.shape[1:])) * data.dtype.itemsize))
+        self.data = data if self.dtype is None or out_of_core_spec(data) is not None else np.asarray(data, dtype=self.dtype)
         self.targets = targets
+        if self.dtype is not None and np.issubdtype(np.asarray(targets).dtype, np.floating):
+            self.targets = np.asarray(targets, dtype=self.dtype)
         self.model_filename = ""
         self.data_filename = ""
+        self.data_array_filename = ""
+        self.external_data_filename = ""
         if self.condor:
             self.model_filename = self.gen_model_file(model)
-            self.data_filename = self.gen_data_file(data, targets)
+            self.data_filename = self.gen_data_file(self.data, self.targets)
         self.analysis_type = constants.HIERARCHICAL
-        self.gen_hierarchy(data)
+        self.gen_hierarchy(self.data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open_data(self, data, targets):
+        """Open data (and targets, if not provided) from path to HDF5 file if required; the file is held open until closed"""
+        self._data_file = None
+        if not isinstance(data, (str, os.PathLike)):
+            return data, targets
+        self._data_file = h5py.File(data, "r")
+        if targets is None:
+            targets = self._data_file[constants.TARGETS][...]
+        return self._data_file[constants.DATA], targets
+
+    def close(self):
+        """Close data file opened from path, if any"""
+        if self._data_file is not None:
+            self._data_file.close()
+            self._data_file = None
 
     def process_keyword_arg(self, argname, default_value, choices=None):
         """Process keyword argument along with simple type validation"""
@@ -237,13 +435,24 @@ class ModelAnalyzer(ABC):
         return model_filename
 
     def gen_data_file(self, data, targets):
-        """Generate data file"""
+        """Generate data file (and raw data array file, if configured)"""
         data_filename = f"{self.output_dir}/{constants.DATA_FILENAME}"
         root = h5py.File(data_filename, "w")
         num_instances = data.shape[0]
         record_ids = [str(idx).encode("utf8") for idx in range(num_instances)]
         root.create_dataset(constants.RECORD_IDS, data=record_ids)
-        root.create_dataset(constants.DATA, data=data)
+        spec = out_of_core_spec(data)
+        if spec is not None:
+            # Reference out-of-core data instead of copying it
+            root.attrs[constants.EXTERNAL_DATA] = json.dumps(spec._asdict())
+            self.external_data_filename = spec.filename
+        elif self.data_format == constants.NPY:
+            self.data_array_filename = f"{self.output_dir}/{constants.DATA_ARRAY_FILENAME}"
+            np.save(self.data_array_filename, data)
+        else:
+            # Chunk dataset by instances so that workers may read chunks of instances efficiently
+            chunks = (min(self.data_chunk_rows, num_instances), *data.shape[1:]) if self.data_chunk_rows and num_instances else None
+            root.create_dataset(constants.DATA, data=data, chunks=chunks)
         root.create_dataset(constants.TARGETS, data=targets)
         root.close()
         return data_filename
@@ -260,45 +469,67 @@ class ModelAnalyzer(ABC):
             if self.feature_names is None:
                 # Generate feature names if not available
                 self.feature_names = [f"{idx}" for idx in range(num_features)]
-            root = Feature(constants.DUMMY_ROOT, description=constants.DUMMY_ROOT, perturbable=False)  # Dummy root node, shouldn't be perturbed
-            for idx, feature_name in enumerate(self.feature_names):
-                Feature(feature_name, parent=root, idx=[idx])
-            self.feature_hierarchy = root
+            # Dummy root node, shouldn't be perturbed
+            self.feature_hierarchy = FeatureHierarchy.from_parents(
+                [-1] + [0] * num_features, [[]] + [[idx] for idx in range(num_features)], names=[constants.DUMMY_ROOT, *self.feature_names],
+                descriptions=[constants.DUMMY_ROOT] + [""] * num_features, perturbable=[False] + [True] * num_features)
+        elif isinstance(self.feature_hierarchy, anytree.NodeMixin):
+            self.feature_hierarchy = self.gen_hierarchy_from_tree(num_features)
         else:
-            # TODO: Document real hierarchy with examples
-            # Input hierarchy needs a list of indices assigned to all base features
-            # Create hierarchy over features from input hierarchy
-            feature_nodes = {}
-            all_idx = set()
-            # Parse and validate input hierarchy
-            for node in anytree.PostOrderIter(self.feature_hierarchy):
-                idx = []
-                if node.is_leaf:
-                    valid = (hasattr(node, "idx") and
-                             isinstance(node.idx, list) and
-                             len(node.idx) >= 1 and
-                             all([isinstance(node.idx[i], int) for i in range(len(node.idx))]))
-                    assert valid, f"Leaf node {node.name} must contain a non-empty list of integer indices under attribute 'idx'"
-                    assert not all_idx.intersection(node.idx), f"Leaf node {node.name} has index overlap with other leaf nodes"
-                    idx = node.idx
-                    all_idx.update(idx)
-                else:
-                    # Ensure internal nodes have empty initial indices
-                    valid = not hasattr(node, "idx") or not node.idx
-                    assert valid, f"Internal node {node.name} must have empty initial indices under attribute 'idx'"
-                description = getattr(node, "description", "")
-                feature_nodes[node.name] = Feature(node.name, description=description, idx=idx)
-            # Update feature group (internal node) indices and tree connections
-            assert min(all_idx) >= 0 and max(all_idx) < num_features, "Feature indices in hierarchy must be in range [0, num_features - 1]"
-            feature_node = None
-            for node in anytree.PostOrderIter(self.feature_hierarchy):
-                feature_node = feature_nodes[node.name]
-                parent = node.parent
-                if parent:
-                    feature_node.parent = feature_nodes[parent.name]
-                for child in node.children:
-                    feature_node.idx += feature_nodes[child.name].idx
-            self.feature_hierarchy = Feature(constants.DUMMY_ROOT, children=[feature_node], perturbable=False)  # Dummy root node for consistency with flat hierarchy; last feature_node is original root
+            self.feature_hierarchy = self.gen_hierarchy_from_parents(num_features)
+
+    def gen_hierarchy_from_tree(self, num_features):
+        """Create hierarchy over features from input anytree hierarchy, in a single pass"""
+        # TODO: Document real hierarchy with examples
+        # Input hierarchy needs a list of indices assigned to all base features
+        parents, leaf_idx, names, descriptions = ([-1], [[]], [constants.DUMMY_ROOT], [""])  # Dummy root node
+        positions = {}
+        all_idx = set()
+        # Parse and validate input hierarchy
+        for node in anytree.PreOrderIter(self.feature_hierarchy):
+            positions[node.name] = len(names)
+            if node.is_leaf:
+                valid = (hasattr(node, "idx") and
+                         isinstance(node.idx, list) and
+                         len(node.idx) >= 1 and
+                         all([isinstance(node.idx[i], int) for i in range(len(node.idx))]))
+                assert valid, f"Leaf node {node.name} must contain a non-empty list of integer indices under attribute 'idx'"
+                assert all_idx.isdisjoint(node.idx), f"Leaf node {node.name} has index overlap with other leaf nodes"
+                all_idx.update(node.idx)
+            else:
+                # Ensure internal nodes have empty initial indices
+                valid = not hasattr(node, "idx") or not node.idx
+                assert valid, f"Internal node {node.name} must have empty initial indices under attribute 'idx'"
+            parents.append(positions[node.parent.name] if node.parent else 0)
+            leaf_idx.append(node.idx if node.is_leaf else [])
+            names.append(node.name)
+            descriptions.append(getattr(node, "description", ""))
+        assert min(all_idx) >= 0 and max(all_idx) < num_features, "Feature indices in hierarchy must be in range [0, num_features - 1]"
+        return FeatureHierarchy.from_parents(parents, leaf_idx, names=names, descriptions=descriptions,
+                                             perturbable=[False] + [True] * (len(names) - 1))
+
+    def gen_hierarchy_from_parents(self, num_features):
+        """
+        Create hierarchy over features from input linkage matrix or parent array, whose first nodes are the base features
+        (node i representing feature i)
+        """
+        parents = np.asarray(self.feature_hierarchy)
+        if parents.ndim == 2:
+            parents = linkage_parents(parents)
+        parents = parents.astype(np.int64)
+        num_nodes = parents.shape[0]
+        assert parents.ndim == 1 and np.all((parents >= -1) & (parents < num_nodes)), \
+            "Parent array must contain the position of each node's parent, or -1 for roots"
+        is_leaf = np.bincount(parents[parents >= 0], minlength=num_nodes) == 0
+        assert np.array_equal(np.flatnonzero(is_leaf), np.arange(num_features)), \
+            "Leaves of hierarchy must be the first nodes, one per base feature"
+        names = [str(node) for node in range(num_nodes)]
+        if self.feature_names is not None:
+            names[:num_features] = self.feature_names
+        # Dummy root node above input roots
+        return FeatureHierarchy.from_parents(np.concatenate([[-1], np.where(parents < 0, 0, parents + 1)]),
+                                             [[]] + [[node] if node < num_features else [] for node in range(num_nodes)],
+                                             names=[constants.DUMMY_ROOT, *names], perturbable=[False] + [True] * num_nodes)
 
     def set_loss_function(self, targets):
         """Set loss function if not provided based on inferred model type"""
@@ -327,11 +558,13 @@ class TemporalModelAnalyzer(ModelAnalyzer):
 
                 For instance, this may be a simple wrapper around a scikit-learn or Tensorflow model.
 
-            data: 3D numpy array
+            data: 3D numpy array, h5py dataset, numpy memmap, or str
                 Test data tensor of instances **x** features **x** sequences.
+                May be provided out-of-core, as for :class:`ModelAnalyzer`.
 
             targets: 1D numpy array
                 A vector containing targets for each instance in the test data.
+                May be None if data is the path to an HDF5 file holding the targets.
 
         **Temporal model analysis parameters:**
 
@@ -341,14 +574,23 @@ class TemporalModelAnalyzer(ModelAnalyzer):
             window_effect_size_threshold: float, default: 0.01
                 Fraction of total feature importance (effect size) permitted outside window while searching for relevant window.
 
+            window_search_arity: int, default: 2
+                Arity of the search for window boundaries. By default, boundaries are found by sequential binary search.
+                If greater than 2, each round of the search tests (arity - 1) candidate boundaries together,
+                batched into shared calls to the model's 'predict' function (within :attr:`max_batch_rows` and
+                :attr:`max_batch_bytes` if provided, else one copy of the data per candidate boundary),
+                reducing the number of sequential rounds by a factor of about log2(arity) for long sequences.
+
         {COMMON_DOC}
 
+        {PERFORMANCE_DOC}
+
         {CONDOR_DOC}
         """)
 
     def __init__(self, model, data, targets, **kwargs):
         super().__init__(model, data, targets, **kwargs)
-        if self.feature_hierarchy.name != constants.DUMMY_ROOT:
+        if self.feature_hierarchy.root.name != constants.DUMMY_ROOT:
             raise NotImplementedError("Hierarchical/feature group analysis is not currently supported for temporal models;"
                                       " unset attribute 'feature_hierarchy'")
         self.analysis_type = constants.TEMPORAL
@@ -357,6 +599,7 @@ class TemporalModelAnalyzer(ModelAnalyzer):
                                                                 constants.CHOICES_WINDOW_SEARCH_ALGORITHM)
         # TODO: Automatic proportional selection of window effect size threshold w.r.t. sequence length
         self.window_effect_size_threshold = self.process_keyword_arg("window_effect_size_threshold", 0.01)
+        self.window_search_arity = self.process_keyword_arg("window_search_arity", 2)
 
     def analyze(self):
         """
@@ -1,6 +1,6 @@
 """Classes for managing perturbations"""
 
-from abc import ABC
+from abc import ABC, abstractmethod
 from itertools import permutations
 from math import factorial
 
@@ -27,28 +27,54 @@ class Zeroing(PerturbationFunction):
 
 
 class Permutation(PerturbationFunction):
-    """Permute first axis of data array"""
+    """
+    Permute first axis of data array.
+    Permutation indices are generated in banks covering many permutations at once (drawing the same random numbers
+    from the RNG as shuffling the data once per permutation would), and applied by gathering into a preallocated buffer.
+    """
+    # pylint: disable = too-many-instance-attributes
+    max_bank_size = 2**24  # Maximum number of indices per bank, to bound memory usage
+
     def __init__(self, rng, num_elements, num_permutations, *args):
         super().__init__(*args)
         # If the number of instances is less than the number of permutations, we need to enumerate all permutations.
         # Else, we just shuffle
+        self._dtype = np.int32 if num_elements <= np.iinfo(np.int32).max else np.int64
+        self._bank = None  # Array of permutation indices (permutations x elements)
+        self._bank_idx = 0  # Index of next permutation in bank
+        self._num_remaining = num_permutations  # Number of permutations for which indices remain to be generated
+        self._num_elements = num_elements
+        self._buffer = None  # Preallocated output buffer
         self.pool = None
         if num_permutations >= num_elements:
             total_permutations = factorial(num_elements)
             # TODO: Probability of collisions is ~sqrt(num_elements) with permutations, so ideally we may want to
             # enumerate permutations even if the number of possible permutations is greater than the sample count
             if num_permutations >= total_permutations:
-                self.pool = permutations(range(num_elements))
-                self.pool.__next__()  # First permutation is the original order
+                # First permutation is the original order
+                self.pool = np.array(list(permutations(range(num_elements))), dtype=self._dtype).reshape(-1, num_elements)[1:]
+                self._bank = self.pool
         self._rng = rng
 
-    def operate(self, X):
-        if self.pool is not None:
-            idx = self.pool.__next__()  # Caller needs to catch StopIteration
-            return X[idx, ...]
+    def next_index(self):
+        """Return indices of next permutation"""
+        if self._bank is None or self._bank_idx == len(self._bank):
+            if self.pool is not None:
+                raise StopIteration  # Caller needs to catch StopIteration
+            # Generate new bank
+            num_permutations = max(1, min(self._num_remaining, self.max_bank_size // max(self._num_elements, 1)))
+            self._num_remaining -= num_permutations
+            bank = np.tile(np.arange(self._num_elements, dtype=self._dtype), (num_permutations, 1))
+            self._bank = self._rng.permuted(bank, axis=1, out=bank)
+            self._bank_idx = 0
+        self._bank_idx += 1
+        return self._bank[self._bank_idx - 1]
 
-        self._rng.shuffle(X)
-        return X
+    def operate(self, X):
+        idx = self.next_index()
+        if self._buffer is None or self._buffer.shape != X.shape or self._buffer.dtype != X.dtype:
+            self._buffer = np.empty_like(X)
+        return np.take(X, idx, axis=0, out=self._buffer, mode="clip")  # indices are valid; 'clip' avoids buffering output
 
 
 class PerturbationMechanism(ABC):
@@ -63,46 +89,88 @@ class PerturbationMechanism(ABC):
 
     def perturb(self, X, feature, *args, **kwargs):
         """Perturb feature for input data and given feature(s)"""
-        size = feature.size
-        if size == 0:
+        if feature.size == 0:
             return X  # No feature(s) to be perturbed
-        if size == 1:
-            idx = feature.idx[0]  # To enable fast view-based indexing for singleton features
-        else:
-            idx = feature.idx
         X_hat = np.copy(X)
-        return self._perturb(X_hat, idx, *args, **kwargs)
-
+        return self._perturb(X_hat, get_index(feature.idx), *args, **kwargs)
+
+    def perturb_in_place(self, X, feature, *args, **kwargs):
+        """
+        Perturb feature for input data and given feature(s) without copying the data.
+        Returns the perturbed data along with a record of the original values, to be passed to 'restore'
+        """
+        if feature.size == 0:
+            return X, None  # No feature(s) to be perturbed
+        idx = get_index(feature.idx)
+        region = self._region(idx, **kwargs)
+        original = X[region]
+        if np.may_share_memory(original, X):
+            original = np.copy(original)  # Basic indexing - copy values before they're overwritten
+        return self._perturb(X, idx, *args, **kwargs), (region, original)
+
+    @staticmethod
+    def restore(X, record):
+        """Restore original values to data perturbed in place"""
+        if record is None:
+            return
+        region, original = record
+        X[region] = original
+
+    @abstractmethod
     def _perturb(self, X_hat, idx, *args, **kwargs):
         """Perturb feature for input data and given feature indices"""
 
+    @abstractmethod
+    def _region(self, idx, **kwargs):
+        """Return index expression for region of input data affected by perturbing given feature indices"""
+
 
 class PerturbMatrix(PerturbationMechanism):
     """Perturb input arranged as matrix of instances X features"""
     def _perturb(self, X_hat, idx, *args, **kwargs):
         perturbed_slice = self._perturbation_fn.operate(X_hat[:, idx])
-        X_hat[:, idx] = perturbed_slice
+        if not np.may_share_memory(perturbed_slice, X_hat):
+            X_hat[:, idx] = perturbed_slice  # Perturbed slice is a copy; else view was perturbed, so no assignment needed
         return X_hat
 
+    def _region(self, idx, **kwargs):
+        return (slice(None), idx)
+
 
 class PerturbTensor(PerturbationMechanism):
     """Perturb input arranged as tensor of instances X features X time"""
     def _perturb(self, X_hat, idx, *args, **kwargs):
-        timesteps = kwargs.get("timesteps", ...)
+        timesteps = get_timesteps(kwargs.get("timesteps", ...))
         axis0 = slice(None)  # all sequences
         axis1 = idx  # features to be perturbed
         axis2 = timesteps  # timesteps to be perturbed
+        X_view = X_hat
         if self._perturbation_type == constants.WITHIN_INSTANCE:
-            X_hat = np.transpose(X_hat)
+            X_view = np.transpose(X_hat)
             axis0, axis2 = axis2, axis0  # swap sequence and timestep axis for within-instance permutation
-        perturbed_slice = self._perturbation_fn.operate(X_hat[axis0, axis1, axis2])
-        if self._perturbation_type == constants.WITHIN_INSTANCE and timesteps == ... and np.isscalar(idx):
-            # Basic indexing - view was perturbed, so no assignment needed
-            X_hat = X_hat.base
-            assert perturbed_slice.base is X_hat
-            return X_hat
-        X_hat[axis0, axis1, axis2] = perturbed_slice
-        return np.transpose(X_hat) if self._perturbation_type == constants.WITHIN_INSTANCE else X_hat
+        perturbed_slice = self._perturbation_fn.operate(X_view[axis0, axis1, axis2])
+        if not np.may_share_memory(perturbed_slice, X_hat):
+            X_view[axis0, axis1, axis2] = perturbed_slice  # Perturbed slice is a copy; else view was perturbed, so no assignment needed
+        return X_hat
+
+    def _region(self, idx, **kwargs):
+        return (slice(None), idx, get_timesteps(kwargs.get("timesteps", ...)))
+
+
+def get_index(idx):
+    """Convert feature indices to scalar or slice where possible, to enable fast view-based indexing"""
+    if len(idx) == 1:
+        return idx[0]
+    if np.all(np.diff(idx) == 1):
+        return slice(idx[0], idx[-1] + 1)  # Contiguous indices
+    return idx
+
+
+def get_timesteps(timesteps):
+    """Convert contiguous range of timesteps to slice, to enable fast view-based indexing"""
+    if isinstance(timesteps, range) and timesteps.step == 1:
+        return slice(timesteps.start, timesteps.stop)
+    return timesteps
 
 
 PERTURBATION_FUNCTIONS = {constants.ACROSS_INSTANCES: {constants.ZEROING: Zeroing, constants.PERMUTATION: Permutation},
@@ -1,20 +1,38 @@
-"""Serial and distributed (condor) perturbation pipelines"""
+"""Serial, local parallel and distributed (condor) perturbation pipelines"""
 
+import argparse
 from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import copy
 import glob
+import heapq
 import math
 import os
 import pickle
 import shutil
+import time
 
-import anytree
 import cloudpickle
 import numpy as np
 
 from anamod.core import constants, worker
 from anamod.core.compute_p_values import bh_procedure
-from anamod.core.utils import CondorJobWrapper
+from anamod.core.prediction import adapt_model
+from anamod.core.results import Results
+from anamod.core.utils import CondorJobWrapper, attach_shared_array, get_logger, share_array
+from anamod.core.work_queue import WorkQueue
+
+# Arguments passed on to workers
+WORKER_ARGS = ["analysis_type", "perturbation", "num_permutations", "permutation_test_statistic", "loss_function",
+               "importance_significance_level", "window_search_algorithm", "window_effect_size_threshold", "window_search_arity",
+               "max_batch_rows", "max_batch_bytes", "tune_batch_size", "max_concurrent_predictions", "perturb_in_place",
+               "worker_executor", "worker_n_jobs",
+               "early_stopping_tolerance", "streaming_statistics", "dtype", "cache_dir", "cache_max_bytes",
+               "checkpoint", "data_chunk_rows", "instance_shards"]
+COST_PROBE_ROWS = 256  # Number of instances used to measure the cost of predictions and perturbations
+COST_PROBE_TIME = 0.02  # Minimum time (in seconds) spent measuring each cost
+TEMPORAL_TESTS = 3  # Number of permutation tests of important features in temporal analysis besides window search (ordering, window, window ordering)
+QUEUE_CLAIMS_PER_JOB = 4  # Number of claims per job to drain shared queue (if all jobs were to finish their own features together)
 
 
 class SerialPipeline():
@@ -23,29 +41,47 @@ class SerialPipeline():
         self.args = copy.copy(args)
         self.features = features
         if features is None:
-            self.features = list(filter(lambda node: node.perturbable, anytree.PreOrderIter(self.args.feature_hierarchy)))  # flatten hierarchy
+            hierarchy = self.args.feature_hierarchy
+            self.features = hierarchy.features(np.flatnonzero(hierarchy.perturbable))  # flatten hierarchy
         self.num_jobs = 1
+        self.num_instance_shards = 1  # number of jobs (shards of instances) per group of features
+        self.groups = [self.features]  # groups of features assigned to jobs
+        self.queue_filename = None  # file of features shared across jobs, if any
 
     def write_features(self):
-        """Write features to analyze to files"""
-        num_features_per_file = math.ceil(len(self.features) / self.num_jobs)
+        """Write features to analyze to files (one per job; jobs over different shards of instances share features)"""
         for idx in range(self.num_jobs):
-            job_features = self.features[idx * num_features_per_file: (idx + 1) * num_features_per_file]
+            job_features = self.groups[idx // self.num_instance_shards]
+            if self.num_jobs > 1:
+                job_features = detach_features(job_features)
             features_filename = constants.INPUT_FEATURES_FILENAME.format(self.args.output_dir, idx)
             with open(features_filename, "wb") as features_file:
                 cloudpickle.dump(job_features, features_file, protocol=pickle.DEFAULT_PROTOCOL)
 
     def compile_results(self, output_dirs):
-        """Compile results"""
+        """Compile results, copying them from workers' results files onto features"""
         self.args.logger.info("Compiling results")
-        features = []
+        feature_map = {feature.name: feature for feature in self.features}
+        compiled = set()
         for idx in range(self.num_jobs):
-            directory = output_dirs[idx]
-            # Load features
-            features_filename = constants.OUTPUT_FEATURES_FILENAME.format(directory, idx)
-            with open(features_filename, "rb") as features_file:
-                features.extend(cloudpickle.load(features_file))
-        return features  # Updating self.features with output features unnecessary for serial pipeline, since order and hierarchy retained
+            filenames = [constants.RESULTS_FILENAME.format(output_dirs[idx], idx)]
+            queue_results_filename = constants.QUEUE_RESULTS_FILENAME.format(output_dirs[idx], idx)
+            if os.path.isfile(queue_results_filename):
+                filenames.append(queue_results_filename)  # Features claimed from shared queue
+            for filename in filenames:
+                with Results(filename) as results:
+                    names = results[constants.NAMES]
+                    results.apply([feature_map[name] for name in names])
+                compiled.update(names)
+        self.check_compiled(compiled)
+        return self.features
+
+    def check_compiled(self, names):
+        """Check that results were compiled for all features (results of earlier runs may be reused)"""
+        missing = [feature.name for feature in self.features if feature.name not in names]
+        if missing:
+            raise ValueError(f"Results missing for {len(missing)} features (e.g. {missing[0]}) in {self.args.output_dir}; "
+                             "results files may be left over from a different analysis")
 
     def cleanup(self, job_dirs=None):
         """Clean intermediate files after completing pipeline"""
@@ -54,8 +90,10 @@ class SerialPipeline():
         self.args.logger.info("Begin intermediate file cleanup")
         # Remove intermediate working directory files
         filetypes = [constants.INPUT_FEATURES_FILENAME.format(self.args.output_dir, "*"),
-                     constants.OUTPUT_FEATURES_FILENAME.format(self.args.output_dir, "*"),
-                     constants.RESULTS_FILENAME.format(self.args.output_dir, "*")]
+                     constants.RESULTS_FILENAME.format(self.args.output_dir, "*"),
+                     constants.CHECKPOINT_FILENAME.format(self.args.output_dir, "*"),
+                     constants.QUEUE_FILENAME.format(self.args.output_dir) + "*",
+                     constants.PARTITION_FILENAME.format(self.args.output_dir)]
         for filetype in filetypes:
             for filename in glob.glob(filetype):
                 try:
@@ -90,25 +128,109 @@ class CondorPipeline(SerialPipeline):
     """Class managing condor pipeline for distributing load across workers"""
     def __init__(self, args, features=None):
         super().__init__(args, features)
-        self.num_jobs = math.ceil(len(self.features) / self.args.features_per_worker)
+        self.num_instance_shards = self.args.instance_shards
+        self.num_jobs = math.ceil(len(self.features) / self.args.features_per_worker) * self.num_instance_shards
+
+    def estimate_costs(self):
+        """
+        Estimate relative cost of analyzing each feature (per instance and permutation): the time to predict on a perturbed
+        instance plus the time to perturb the feature's values, both measured by probing the model and data.
+        For temporal analysis, each feature index holds one value per timestep, and features are costed as if important:
+        besides the importance test, they undergo TEMPORAL_TESTS tests perturbing (up to) all timesteps, and the probes of
+        the window search, each perturbing about half of the timesteps.
+        """
+        sample = np.asarray(self.args.data[:COST_PROBE_ROWS])
+        model = adapt_model(self.args.model, getattr(self.args, "max_batch_rows", 0), getattr(self.args, "max_batch_bytes", 0),
+                            getattr(self.args, "max_concurrent_predictions", 1))
+        try:
+            predict_time = measure_time(lambda: model.predict(sample)) / sample.shape[0]
+        finally:
+            model.close()
+        permutation = np.random.default_rng(0).permutation(sample.shape[0])
+        perturb_time = measure_time(lambda: np.take(sample, permutation, axis=0)) / max(sample.size, 1)
+        values_per_index = int(np.prod(sample.shape[2:]))  # timesteps, for temporal analysis
+        sizes = np.array([feature.size for feature in self.features], dtype=np.float64)
+        predict_factor, perturb_factor = (1., 1.)
+        if self.args.analysis_type == constants.TEMPORAL:
+            arity = getattr(self.args, "window_search_arity", 2)
+            num_probes = 2 * math.ceil(math.log(max(values_per_index, 2), arity)) * (arity - 1)  # both boundaries
+            predict_factor = 1 + TEMPORAL_TESTS + num_probes
+            perturb_factor = 1 + TEMPORAL_TESTS + num_probes / 2
+        return predict_factor * predict_time + perturb_factor * sizes * values_per_index * perturb_time
+
+    def partition_features(self, costs):
+        """
+        Partition features into groups (one per job, or per set of jobs over shards of instances) of balanced estimated cost,
+        by assigning features in order of decreasing cost to the group with the lowest cost so far. If configured, the
+        cheapest features are instead held back in a queue shared across jobs; returns groups and positions of queued features
+        (in order of decreasing cost).
+        """
+        num_groups = self.num_jobs // self.num_instance_shards
+        order = np.argsort(-costs, kind="stable")
+        # Hold back cheapest features up to given fraction of total cost, leaving at least one feature per group
+        queue_cost = getattr(self.args, "shared_queue_fraction", 0.) * costs.sum()
+        num_queued = int(np.count_nonzero(np.cumsum(costs[order[::-1]]) <= queue_cost)) if queue_cost else 0
+        num_queued = min(num_queued, len(self.features) - num_groups)
+        assigned, queued = (order[:len(order) - num_queued], order[len(order) - num_queued:])
+        groups = [[] for _ in range(num_groups)]
+        loads = [(0., group) for group in range(num_groups)]
+        for position in assigned:
+            load, group = heapq.heappop(loads)
+            groups[group].append(self.features[position])
+            heapq.heappush(loads, (load + costs[position], group))
+        self.args.logger.info(f"Estimated cost of groups of features: min {loads[0][0]}, max {max(loads)[0]}; "
+                              f"{num_queued} features queued")
+        return groups, queued
+
+    def read_partition(self):
+        """
+        Return partition of features written by an earlier run with the same output directory and features, if any,
+        as (positions of features per group, positions of queued features, estimated costs). Since estimated costs depend
+        on timings, the partition is reused so that the results of jobs completed by the earlier run match their features.
+        """
+        partition_filename = constants.PARTITION_FILENAME.format(self.args.output_dir)
+        if not os.path.isfile(partition_filename):
+            return None
+        with open(partition_filename, "rb") as partition_file:
+            names, num_groups, partition = pickle.load(partition_file)
+        if names != [feature.name for feature in self.features] or num_groups != self.num_jobs // self.num_instance_shards:
+            self.args.logger.warning(f"Ignoring partition of features in {partition_filename}, written for different features")
+            return None
+        self.args.logger.info(f"Reusing partition of features in {partition_filename}")
+        return partition
+
+    def write_partition(self, partition):
+        """Write partition of features, to be reused if the run is restarted"""
+        partition_filename = constants.PARTITION_FILENAME.format(self.args.output_dir)
+        with open(partition_filename, "wb") as partition_file:
+            pickle.dump(([feature.name for feature in self.features], self.num_jobs // self.num_instance_shards, partition),
+                        partition_file, protocol=pickle.DEFAULT_PROTOCOL)
 
     def setup_jobs(self):
         """Setup and run condor jobs"""
-        transfer_args = ["analysis_type", "perturbation", "num_permutations", "permutation_test_statistic", "loss_function",
-                         "importance_significance_level", "window_search_algorithm", "window_effect_size_threshold"]
         jobs = [None] * self.num_jobs
         for idx in range(self.num_jobs):
             # Create and launch condor job
             features_filename = constants.INPUT_FEATURES_FILENAME.format(self.args.output_dir, idx)
-            input_files = [features_filename, self.args.model_filename, self.args.model_loader_filename, self.args.data_filename]
+            input_files = [features_filename, self.args.model_filename, self.args.model_loader_filename, self.args.data_filename,
+                           self.args.baseline_filename]
             job_dir = f"{self.args.output_dir}/outputs_{idx}"
+            paths = dict(output_dir=job_dir, features_filename=features_filename, model_filename=self.args.model_filename,
+                         model_loader_filename=self.args.model_loader_filename, data_filename=self.args.data_filename,
+                         baseline_filename=self.args.baseline_filename)
+            if self.args.external_data_filename:
+                input_files.append(self.args.external_data_filename)  # Out-of-core data referenced by data file
+            if self.args.data_array_filename:
+                input_files.append(self.args.data_array_filename)
+                paths["data_array_filename"] = self.args.data_array_filename
+            if self.queue_filename:
+                paths["queue_filename"] = self.queue_filename  # Shared filesystem required
             cmd = f"python3 -m anamod.core.worker -worker_idx {idx}"
-            for arg in transfer_args:
-                if hasattr(self.args, arg):
+            for arg in WORKER_ARGS:
+                if getattr(self.args, arg, None) is not None:
                     cmd += f" -{arg} {getattr(self.args, arg)}"
             # Relative file paths for non-shared FS, absolute for shared FS
-            for name, path in dict(output_dir=job_dir, features_filename=features_filename, model_filename=self.args.model_filename,
-                                   model_loader_filename=self.args.model_loader_filename, data_filename=self.args.data_filename).items():
+            for name, path in paths.items():
                 cmd += f" -{name} {os.path.abspath(path)}" if self.args.shared_filesystem else f" -{name} {os.path.basename(path)}"
             job = CondorJobWrapper(cmd, input_files, job_dir, shared_filesystem=self.args.shared_filesystem,
                                    memory=f"{self.args.memory_requirement}GB", disk=f"{self.args.disk_requirement}GB",
@@ -119,57 +241,217 @@ class CondorPipeline(SerialPipeline):
 
     def run(self):
         """Run condor pipeline"""
-        self.args.logger.info("Begin condor pipeline")
-        # Shuffle features to balance load across workers
-        pairs = list(zip(range(len(self.features)), self.features))
-        self.args.rng.shuffle(pairs)
-        fids, self.features = zip(*pairs)
+        self.args.logger.info(f"Begin {self.name} pipeline")
+        if getattr(self.args, "prune_hierarchy", False):
+            self.run_levels()
+        else:
+            self.run_round()
+            self.fdr_control()
+        self.args.logger.info(f"End {self.name} pipeline")
+        return self.features
+
+    def run_round(self):
+        """Run jobs over features and compile their results"""
+        # Balance load across workers by estimated cost
+        partition = self.read_partition()
+        reused = partition is not None
+        if not reused:
+            costs = self.estimate_costs()
+            groups, queued = self.partition_features(costs)
+            feature_positions = {feature.position: position for position, feature in enumerate(self.features)}
+            partition = ([[feature_positions[feature.position] for feature in group] for group in groups], queued, costs)
+            self.write_partition(partition)
+        groups, queued, costs = partition
+        self.groups = [[self.features[position] for position in group] for group in groups]
+        self.queue_filename = None
+        if queued.size:
+            # Jobs claim about 1/QUEUE_CLAIMS_PER_JOB of their share of the queue at a time
+            self.queue_filename = constants.QUEUE_FILENAME.format(self.args.output_dir)
+            if not (reused and os.path.isfile(self.queue_filename)):  # Else keep claims of earlier run, whose results are reused
+                WorkQueue.write(self.queue_filename, detach_features([self.features[position] for position in queued]),
+                                costs[queued], costs[queued].sum() / (QUEUE_CLAIMS_PER_JOB * self.num_jobs))
         # Write features and start jobs
         self.write_features()
+        job_dirs = self.run_jobs()
+        # Process results
+        self.compile_results(job_dirs)
+        self.cleanup(job_dirs)
+
+    def run_levels(self):
+        """
+        Descend hierarchy level by level (see worker.perturb_feature_hierarchy), running one round of jobs per level
+        over the children of the features found important so far, followed by BH procedure per parent.
+        Descendants of unimportant features are not tested, and retain default results.
+        """
+        hierarchy = self.args.feature_hierarchy
+        all_features, output_dir = (self.features, self.args.output_dir)
+        frontier = hierarchy.roots
+        level = 0
+        while frontier.size:
+            parents = frontier[hierarchy.child_pointers[frontier + 1] > hierarchy.child_pointers[frontier]]
+            if not parents.size:
+                break
+            positions = np.concatenate([hierarchy.children(parent) for parent in parents])
+            self.features = hierarchy.features(positions[hierarchy.perturbable[positions]])
+            if self.features:
+                self.num_jobs = math.ceil(len(self.features) / self.args.features_per_worker) * self.num_instance_shards
+                self.args.output_dir = f"{output_dir}/level_{level}"
+                os.makedirs(self.args.output_dir, exist_ok=True)
+                self.args.logger.info(f"Testing {len(self.features)} features at level {level} of hierarchy")
+                self.run_round()
+                if self.args.cleanup:
+                    shutil.rmtree(self.args.output_dir, ignore_errors=True)
+            else:
+                self.args.logger.info(f"No perturbable features at level {level} of hierarchy")  # Retain default results
+            frontier = np.concatenate([self.test_children(parent) for parent in parents])
+            level += 1
+        self.features, self.args.output_dir = (all_features, output_dir)
+
+    @property
+    def name(self):
+        """Pipeline name for logging"""
+        return "condor"
+
+    def run_jobs(self):
+        """Run jobs (unless only compiling results) and return job directories"""
         jobs = self.setup_jobs()
         if not self.args.compile_results_only:
             running_jobs = OrderedDict.fromkeys(jobs)
             for idx, job in enumerate(jobs):
-                features_filename = constants.OUTPUT_FEATURES_FILENAME.format(job.job_dir, idx)
-                if os.path.isfile(features_filename):
+                if os.path.isfile(constants.RESULTS_FILENAME.format(job.job_dir, idx)):
                     # Outputs computed previously, do not rerun job
                     # TODO: maybe add option to toggle reusing old results
                     running_jobs.pop(job)
                 else:
                     job.run()
             CondorJobWrapper.monitor(list(running_jobs.keys()), cleanup=self.args.cleanup)
-        job_dirs = [job.job_dir for job in jobs]
-        # Process results
-        results = self.compile_results(job_dirs)
-        self.fdr_control(results)
-        _, self.features = zip(*sorted(zip(fids, self.features), key=lambda pair: pair[0]))  # Restore feature order
-        self.cleanup(job_dirs)
-        self.args.logger.info("End condor pipeline")
+        return [job.job_dir for job in jobs]
+
+    def compile_results(self, output_dirs):
+        """Compile results, reducing partial losses across shards of instances and testing features if sharded"""
+        if self.num_instance_shards == 1:
+            return super().compile_results(output_dirs)
+        self.args.logger.info(f"Compiling results across {self.num_instance_shards} shards of instances")
+        baseline_mean_loss = np.mean(self.args.baseline_loss, dtype=np.float64)
+        feature_map = {feature.name: feature for feature in self.features}
+        compiled = set()
+        for first_idx in range(0, self.num_jobs, self.num_instance_shards):
+            with Results(constants.RESULTS_FILENAME.format(output_dirs[first_idx], first_idx)) as results:
+                group_features = [feature_map[name] for name in results[constants.NAMES]]
+            compiled.update(feature.name for feature in group_features)
+            with open(constants.PARTIAL_LOSSES_FILENAME.format(output_dirs[first_idx], first_idx), "rb") as partial_losses_file:
+                partial_losses = pickle.load(partial_losses_file)
+            for idx in range(first_idx + 1, first_idx + self.num_instance_shards):
+                with open(constants.PARTIAL_LOSSES_FILENAME.format(output_dirs[idx], idx), "rb") as partial_losses_file:
+                    shard_losses = pickle.load(partial_losses_file)
+                partial_losses = {name: losses + shard_losses[name] for name, losses in partial_losses.items()}
+            for feature in group_features:
+                perturbed_loss = partial_losses[feature.name].reduce(self.args.baseline_loss)
+                worker.compute_importance(self.args, feature, perturbed_loss, self.args.baseline_loss, baseline_mean_loss)
+        self.check_compiled(compiled)
         return self.features
 
-    def fdr_control(self, output_features):
-        """Apply hierarchical FDR control to aggregated feature importance results"""
-        # Map output feature names
-        output_feature_map = {output_feature.name: output_feature for output_feature in output_features}
-        # Update saved hierarchy with FDR-controlled results
-        queue = deque()
-        root = self.features[0].root
-        queue.append(root)
+    def fdr_control(self):
+        """Apply hierarchical FDR control to compiled feature importance results, descending from roots of hierarchy"""
+        hierarchy = self.args.feature_hierarchy
+        queue = deque(hierarchy.roots)
         while queue:
             parent = queue.popleft()
-            if not parent.children:
-                continue
-            pvalues = np.ones(len(parent.children))
-            for idx, child in enumerate(parent.children):
-                child.copy_attributes(output_feature_map[child.name])
-                pvalues[idx] = child.overall_pvalue
-            adjusted_pvalues, rejected_hypotheses = bh_procedure(pvalues, self.args.importance_significance_level)
-            for idx, child in enumerate(parent.children):
-                child.overall_pvalue = adjusted_pvalues[idx]
-                child.important = rejected_hypotheses[idx]
-                if child.important:
-                    queue.append(child)
-                else:
-                    child.window_important = False
-                    child.ordering_important = False
-                    child.window_ordering_important = False
+            if hierarchy.children(parent).size:
+                queue.extend(self.test_children(parent))
+
+    def test_children(self, parent):
+        """Apply BH procedure to children of feature at given position; returns positions of important children"""
+        hierarchy = self.args.feature_hierarchy
+        columns = hierarchy.columns
+        children = hierarchy.children(parent)
+        columns["pvalue"][children], columns["important"][children] = bh_procedure(columns["pvalue"][children],
+                                                                                   self.args.importance_significance_level)
+        unimportant = children[~columns["important"][children]]
+        for key in ["window_important", "ordering_important", "window_ordering_important"]:
+            columns[key][unimportant] = False
+        return children[columns["important"][children]]
+
+
+class LocalParallelPipeline(CondorPipeline):
+    """Class managing pipeline for distributing load across local worker processes"""
+    @property
+    def name(self):
+        return "local parallel"
+
+    def run_jobs(self):
+        """Run jobs in process pool (unless only compiling results) and return job directories"""
+        job_dirs = [f"{self.args.output_dir}/outputs_{idx}" for idx in range(self.num_jobs)]
+        if self.args.compile_results_only:
+            return job_dirs
+        pending_jobs = []
+        for idx, job_dir in enumerate(job_dirs):
+            if not os.path.isfile(constants.RESULTS_FILENAME.format(job_dir, idx)):
+                pending_jobs.append(idx)  # Outputs not computed previously
+                os.makedirs(job_dir, exist_ok=True)
+        if not pending_jobs:
+            return job_dirs
+        num_processes = os.cpu_count() if self.args.n_jobs < 0 else self.args.n_jobs
+        num_processes = min(num_processes, len(pending_jobs))
+        self.args.logger.info(f"Running {len(pending_jobs)} jobs across {num_processes} processes")
+        # Publish data once through shared memory instead of pickling it per task
+        shm, data_spec = share_array(self.args.data)
+        try:
+            initargs = (self.worker_args(), data_spec, self.args.targets, cloudpickle.dumps(self.args.model))
+            with ProcessPoolExecutor(max_workers=num_processes, initializer=init_local_worker, initargs=initargs) as executor:
+                futures = [executor.submit(run_local_worker, idx, job_dirs[idx]) for idx in pending_jobs]
+                for future in futures:
+                    future.result()  # Propagate worker exceptions
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        return job_dirs
+
+    def worker_args(self):
+        """Return picklable arguments for local workers"""
+        args = argparse.Namespace(fdr_control=False, output_dir=self.args.output_dir, baseline_loss=self.args.baseline_loss,
+                                  queue_filename=self.queue_filename)
+        for arg in WORKER_ARGS:
+            if hasattr(self.args, arg):
+                setattr(args, arg, getattr(self.args, arg))
+        return args
+
+
+def detach_features(features):
+    """Return copies of features detached from the rest of the hierarchy, for jobs that only test their own features"""
+    if not features:
+        return features
+    return features[0].hierarchy.subset([feature.position for feature in features]).features()
+
+
+def measure_time(func):
+    """Return time (in seconds) taken per call of function, measured over repeated calls after a warm-up call"""
+    func()
+    num_calls, start = (0, time.perf_counter())
+    while True:
+        func()
+        num_calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= COST_PROBE_TIME:
+            return elapsed / num_calls
+
+
+_LOCAL_WORKER = {}  # Process-level state of local workers: arguments and inputs shared across tasks
+
+
+def init_local_worker(args, data_spec, targets, model_bytes):
+    """Initialize local worker process with shared inputs"""
+    shm, data = attach_shared_array(data_spec)
+    _LOCAL_WORKER.update(args=args, shm=shm, data=data, targets=targets, model=cloudpickle.loads(model_bytes))
+
+
+def run_local_worker(idx, job_dir):
+    """Run worker pipeline on features assigned to job"""
+    args = copy.copy(_LOCAL_WORKER["args"])
+    args.data, args.targets, args.model = (_LOCAL_WORKER[key] for key in ["data", "targets", "model"])
+    args.worker_idx = idx
+    args.features_filename = constants.INPUT_FEATURES_FILENAME.format(args.output_dir, idx)
+    args.output_dir = job_dir
+    args.logger = get_logger(worker.__name__, f"{job_dir}/worker_{idx}.log")
+    worker.pipeline(args)
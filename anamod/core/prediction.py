@@ -0,0 +1,167 @@
+"""Adapters for calls to models' predict functions"""
+
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+TUNING_MIN_ROWS = 64  # Smallest batch size probed while tuning
+TUNING_MAX_ROWS = 2**20  # Largest batch size probed while tuning, unless limited by configuration
+TUNING_MAX_BYTES = 2**28  # Largest input size probed while tuning, unless limited by configuration
+TUNING_MIN_TIME = 0.05  # Minimum time (in seconds) spent measuring each batch size while tuning
+
+
+# pylint: disable = invalid-name
+class BatchedModel():
+    """
+    Wraps model to split calls to predict into batches of at most max_rows rows and max_bytes bytes (if nonzero),
+    concatenating the predictions across batches. Batches are predicted concurrently if the model is asynchronous
+    (see AsyncModel), in which case predictions may also be submitted without waiting for them (see submit).
+    """
+    def __init__(self, model, max_rows=0, max_bytes=0):
+        self.model = model
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.asynchronous = isinstance(model, AsyncModel)
+
+    def batch_rows(self, X):
+        """Return number of rows of input per batch"""
+        num_rows = X.shape[0]
+        if self.max_rows:
+            num_rows = min(num_rows, self.max_rows)
+        if self.max_bytes and X.shape[0]:
+            num_rows = min(num_rows, self.max_bytes // max(X.nbytes // X.shape[0], 1))
+        return max(num_rows, 1)
+
+    def predict(self, X):
+        """Predict outputs on input instances, in batches"""
+        if self.asynchronous:
+            return self.submit(X).result()
+        num_rows = self.batch_rows(X)
+        if num_rows >= X.shape[0]:
+            return self.model.predict(X)
+        return np.concatenate([self.model.predict(X[start: start + num_rows]) for start in range(0, X.shape[0], num_rows)])
+
+    def submit(self, X):
+        """Submit prediction on input instances (in batches) to asynchronous model; returns future of predictions"""
+        num_rows = self.batch_rows(X)
+        return self.model.submit([X[start: start + num_rows] for start in range(0, X.shape[0], num_rows)])
+
+    def close(self):
+        """Release resources held by model adapters"""
+        if self.asynchronous:
+            self.model.close()
+
+
+class AsyncModel():
+    """
+    Wraps model exposing a coroutine to predict outputs ('async def predict' or 'predict_async'), e.g. a client of an
+    inference service. Predictions run on a background event loop, with at most max_concurrency in flight at once.
+    """
+    def __init__(self, model, max_concurrency):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._loop = None  # started on first use
+        self._thread = None
+        self._semaphore = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_lock=None, _loop=None, _thread=None, _semaphore=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _start(self):
+        """Start event loop in background thread if required"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="anamod-predict-loop", daemon=True)
+                self._thread.start()
+                # Created on the loop's thread, since asyncio primitives bind to the current event loop before Python 3.10
+                self._semaphore = asyncio.run_coroutine_threadsafe(self._create_semaphore(), self._loop).result()
+
+    async def _create_semaphore(self):
+        return asyncio.Semaphore(self.max_concurrency)
+
+    async def _predict(self, X):
+        predict_async = getattr(self.model, "predict_async", None) or self.model.predict
+        async with self._semaphore:
+            return await predict_async(X)
+
+    async def _gather(self, inputs):
+        preds = await asyncio.gather(*[self._predict(X) for X in inputs])
+        return preds[0] if len(preds) == 1 else np.concatenate(preds)
+
+    def submit(self, inputs):
+        """Submit predictions on list of inputs; returns (concurrent) future of predictions concatenated across inputs"""
+        self._start()
+        return asyncio.run_coroutine_threadsafe(self._gather(inputs), self._loop)
+
+    def predict(self, X):
+        """Predict outputs on input instances, waiting for the predictions"""
+        return self.submit([X]).result()
+
+    def close(self):
+        """Stop event loop"""
+        with self._lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join()
+                self._loop.close()
+                self._loop, self._thread, self._semaphore = (None, None, None)
+
+
+def is_async_model(model):
+    """Return whether model predicts outputs using a coroutine"""
+    return hasattr(model, "predict_async") or asyncio.iscoroutinefunction(getattr(model, "predict", None))
+
+
+def adapt_model(model, max_rows=0, max_bytes=0, max_concurrency=1):
+    """Return model adapted to split calls to predict into batches and, if it is asynchronous, to run them concurrently"""
+    if is_async_model(model):
+        model = AsyncModel(model, max_concurrency)
+    return BatchedModel(model, max_rows, max_bytes)
+
+
+def unwrap_model(model):
+    """Return model wrapped by adapters, if any"""
+    while isinstance(model, (BatchedModel, AsyncModel)):
+        model = model.model
+    return model
+
+
+def tune_batch_rows(model, data, max_rows=0, max_bytes=0):
+    """
+    Measure the model's prediction throughput (rows per second) at geometrically increasing batch sizes,
+    within the given limits, on (repeated) instances of the data. Returns the batch size with the highest throughput
+    along with the throughput measured for each batch size.
+    """
+    num_instances = data.shape[0]
+    row_bytes = max(1, int(np.prod(data.shape[1:])) * np.dtype(data.dtype).itemsize)
+    limit = max(min(max_rows or TUNING_MAX_ROWS, (max_bytes or TUNING_MAX_BYTES) // row_bytes), 1)
+    sizes = []
+    size = min(TUNING_MIN_ROWS, limit)
+    while size < limit:
+        sizes.append(size)
+        size *= 2
+    sizes.append(limit)
+    sample = np.asarray(data[:min(num_instances, limit)])
+    throughputs = {}
+    for size in sizes:
+        batch = np.take(sample, np.arange(size) % sample.shape[0], axis=0)
+        model.predict(batch)  # Warm up
+        num_calls, start = (0, time.perf_counter())
+        while True:
+            model.predict(batch)
+            num_calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= TUNING_MIN_TIME:
+                break
+        throughputs[size] = num_calls * size / elapsed
+    return max(throughputs, key=throughputs.get), throughputs
@@ -0,0 +1,91 @@
+"""Columnar storage of feature importance results"""
+
+import h5py
+import numpy as np
+
+from anamod.core import constants
+from anamod.core.feature import ATTRIBUTES, FeatureHierarchy
+
+
+def write_results(filename, features):
+    """
+    Write features (of the same hierarchy) and their results to HDF5 file, as one column (dataset) per attribute, readable without anamod.
+    The hierarchy is stored as the position of each feature's parent in the list (-1 if not in the list),
+    and feature indices in compressed form (indices of feature i are indices[index_pointers[i]: index_pointers[i + 1]]).
+    """
+    hierarchy = features[0].hierarchy if features else FeatureHierarchy([], [], [], [], [])
+    positions = np.array([feature.position for feature in features], dtype=np.int64)
+    mapping = np.full(len(hierarchy) + 1, -1, dtype=np.int64)  # last entry maps missing parents (-1) to -1
+    mapping[positions] = np.arange(positions.size)
+    sizes = hierarchy.index_stops[positions] - hierarchy.index_starts[positions]
+    with h5py.File(filename, "w") as root:
+        root.create_dataset(constants.NAMES, data=[hierarchy.names[position] for position in positions], dtype=h5py.string_dtype())
+        root.create_dataset(constants.DESCRIPTIONS, data=[hierarchy.descriptions[position] or "" for position in positions],
+                            dtype=h5py.string_dtype())
+        root.create_dataset(constants.PARENTS, data=mapping[hierarchy.parents[positions]])
+        root.create_dataset(constants.INDEX_POINTERS, data=np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)]))
+        indices = [hierarchy.idx(position) for position in positions]
+        root.create_dataset(constants.INDICES, data=np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64))
+        root.create_dataset(constants.PERTURBABLE, data=hierarchy.perturbable[positions])
+        for key, values in hierarchy.columns.items():
+            root.create_dataset(key, data=values[positions])
+
+
+class Results():
+    """
+    Lazy view of columnar results file (see write_results): columns are read on first access,
+    and the feature hierarchy is only built when requested.
+    """
+    def __init__(self, filename):
+        self._root = h5py.File(filename, "r")
+        self._columns = {}
+        self._positions = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._root[constants.NAMES])
+
+    def __getitem__(self, column):
+        """Return column (as array, or list of strings)"""
+        if column not in self._columns:
+            values = self._root[column]
+            self._columns[column] = values.asstr()[...].tolist() if h5py.check_string_dtype(values.dtype) else values[...]
+        return self._columns[column]
+
+    def close(self):
+        """Close results file"""
+        self._root.close()
+
+    def position(self, name):
+        """Return position of feature with given name"""
+        if self._positions is None:
+            self._positions = {name: position for position, name in enumerate(self[constants.NAMES])}
+        return self._positions[name]
+
+    def hierarchy(self):
+        """Build feature hierarchy (forest) over features in file, along with their results"""
+        pointers = self[constants.INDEX_POINTERS]
+        hierarchy = FeatureHierarchy(self[constants.NAMES], self[constants.PARENTS], pointers[:-1], pointers[1:], self[constants.INDICES],
+                                     descriptions=self[constants.DESCRIPTIONS], perturbable=self[constants.PERTURBABLE])
+        for key in ATTRIBUTES:
+            hierarchy.columns[key] = self[key].copy()
+        return hierarchy
+
+    def features(self):
+        """Build all features, linked into hierarchy"""
+        return self.hierarchy().features()
+
+    def apply(self, features):
+        """Copy results onto given features (of the same hierarchy), by name"""
+        if not features:
+            return
+        columns = features[0].hierarchy.columns
+        targets = np.array([feature.position for feature in features], dtype=np.int64)
+        sources = np.array([self.position(feature.name) for feature in features], dtype=np.int64)
+        for key in ATTRIBUTES:
+            columns[key][targets] = self[key][sources]
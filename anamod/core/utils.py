@@ -1,12 +1,16 @@
 """Common utility functions"""
 import logging
+import mmap
 from collections import namedtuple, OrderedDict
 import contextlib
 import os
+import pickle
 import random
 import sys
 import time
+from multiprocessing import shared_memory
 
+import h5py
 import numpy as np
 try:
     # TODO: Add note about installing htcondor to documentation
@@ -16,7 +20,8 @@ except ImportError:
     pass  # Caller performs its own check to validate condor availability
 
 from anamod.core.constants import (EVENT_LOG_TRACKING, CONDOR_MAX_RUNNING_TIME, CONDOR_MAX_WAIT_TIME, CONDOR_MAX_RETRIES,
-                                   CONDOR_HOLD_RETRY_CODES, CONDOR_AVOID_HOSTS, CONDOR_MAX_ERROR_COUNT, QUEUE, REMOVE, QUERY, HISTORY)
+                                   CONDOR_HOLD_RETRY_CODES, CONDOR_AVOID_HOSTS, CONDOR_MAX_ERROR_COUNT, QUEUE, REMOVE, QUERY, HISTORY,
+                                   CONDOR_MAX_OPEN_EVENT_LOGS, CONDOR_MIN_POLL_INTERVAL, CONDOR_MAX_POLL_INTERVAL, CONDOR_POLL_BACKOFF)
 
 
 def get_logger(name, filename=None, level=logging.INFO):
@@ -32,6 +37,52 @@ def round_value(value, decimals=4):
     return np.around(value, decimals=decimals)
 
 
+SharedArray = namedtuple("SharedArray", ["name", "shape", "dtype"])
+OutOfCoreArray = namedtuple("OutOfCoreArray", ["filename", "name", "dtype", "shape", "offset", "order"])
+
+
+def share_array(array):
+    """
+    Copy array to shared memory; returns shared memory block (to be closed/unlinked by caller) and spec to attach to it.
+    Out-of-core arrays are shared by reference instead (the shared memory block is then None).
+    """
+    spec = out_of_core_spec(array)
+    if spec is not None:
+        return None, spec
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    shared[...] = array
+    return shm, SharedArray(shm.name, array.shape, array.dtype)
+
+
+def attach_shared_array(spec):
+    """Attach to array in shared memory (read-only); returns shared memory block (to be closed by caller) and array"""
+    if isinstance(spec, OutOfCoreArray):
+        return None, open_out_of_core_array(spec)
+    shm = shared_memory.SharedMemory(name=spec.name)
+    array = np.ndarray(spec.shape, dtype=spec.dtype, buffer=shm.buf)
+    array.flags.writeable = False
+    return shm, array
+
+
+def out_of_core_spec(array):
+    """Return spec to reopen out-of-core array (HDF5 dataset or memory-mapped file), or None if array is in memory"""
+    if isinstance(array, h5py.Dataset):
+        return OutOfCoreArray(array.file.filename, array.name, None, None, None, None)
+    if isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap):  # views of memory-mapped arrays are not reopened
+        order = "F" if array.flags.f_contiguous and not array.flags.c_contiguous else "C"
+        return OutOfCoreArray(array.filename, None, array.dtype.str, array.shape, array.offset, order)
+    return None
+
+
+def open_out_of_core_array(spec, filename=None):
+    """Open out-of-core array read-only, given its spec (and path to its file, if moved)"""
+    filename = filename or spec.filename
+    if spec.name is not None:
+        return h5py.File(filename, "r")[spec.name]
+    return np.memmap(filename, dtype=spec.dtype, mode="r", shape=tuple(spec.shape), offset=spec.offset, order=spec.order)
+
+
 Filenames = namedtuple("Filenames", ["exec_filename", "log_filename", "out_filename", "err_filename"])
 
 
@@ -39,6 +90,59 @@ class CondorJobFailure(RuntimeError):
     """Exception for condor job failure"""
 
 
+class EventLogReader():
+    """
+    Reads job event logs incrementally, keeping each job's position in its log across reads. At most max_open logs are
+    kept open at once: the least recently read logs are closed after saving their position (by pickling them),
+    and reopened at that position when next read. A job's log is read from the start again once the job is resubmitted.
+    """
+    def __init__(self, event_log_class=None, max_open=CONDOR_MAX_OPEN_EVENT_LOGS):
+        self._event_log_class = event_log_class or htcondor.JobEventLog
+        self._max_open = max_open
+        self._open_logs = OrderedDict()  # job -> (attempt, open event log), least recently read first
+        self._closed_logs = {}  # job -> (attempt, pickled event log)
+
+    def read(self, job):
+        """Return events written to job's log since previous read (none if log does not exist yet)"""
+        attempt, event_log = self._open_logs.pop(job, None) or self._closed_logs.pop(job, (job.tries, None))
+        if attempt != job.tries:
+            # Job resubmitted with new log
+            if event_log is not None and not isinstance(event_log, bytes):
+                event_log.close()
+            event_log = None
+        if event_log is None:
+            if not os.path.exists(job.filenames.log_filename):
+                return []
+            event_log = self._event_log_class(job.filenames.log_filename)
+        elif isinstance(event_log, bytes):
+            event_log = pickle.loads(event_log)
+        self._open_logs[job] = (job.tries, event_log)
+        events = list(event_log.events(0))
+        while len(self._open_logs) > self._max_open:
+            oldest_job, (oldest_attempt, oldest_log) = self._open_logs.popitem(last=False)
+            self._closed_logs[oldest_job] = (oldest_attempt, pickle.dumps(oldest_log))
+            oldest_log.close()
+        return events
+
+    @property
+    def num_open(self):
+        """Return number of open logs"""
+        return len(self._open_logs)
+
+    def discard(self, job):
+        """Stop reading job's log"""
+        self._closed_logs.pop(job, None)
+        _, event_log = self._open_logs.pop(job, (None, None))
+        if event_log is not None:
+            event_log.close()
+
+    def close(self):
+        """Close all logs"""
+        for job in list(self._open_logs):
+            self.discard(job)
+        self._closed_logs.clear()
+
+
 class CondorJobWrapper():
     """Schedule jobs using condor"""
     # pylint: disable = too-many-instance-attributes
@@ -195,8 +299,8 @@ class CondorJobWrapper():
         Monitor running jobs until completion
         Reference: https://htcondor.readthedocs.io/en/latest/apis/python-bindings/advanced/Scalable-Job-Tracking.html
         * Event log tracking uses log files to track job status
-            * May error out if opening too many event logs simultaneously
-              (greater than sysctl fs.inotify.max_user_instances)
+            * Reads new events incrementally, keeping at most CONDOR_MAX_OPEN_EVENT_LOGS logs open at once
+              (opening more than sysctl fs.inotify.max_user_instances simultaneously errors out)
         * Poll-based tracking uses condor_schedd to track job status
             * Completed jobs need to query condor history, from which job may leak out of if not queried soon enough
             * HTCondor staff discourages using this to reduce server load
@@ -212,52 +316,65 @@ class CondorJobWrapper():
             time.sleep(10)  # Time to allow file changes to reflect in shared filesystem
 
     @staticmethod
-    def monitor_event_logs(jobs, cleanup):
-        """Monitor jobs using event logs"""
+    def monitor_event_logs(jobs, cleanup, event_log_class=None):
+        """
+        Monitor jobs using event logs, reading only events written since the previous poll (see EventLogReader).
+        Logs are polled again soon after new events, backing off up to a maximum interval while jobs are quiet.
+        """
         # pylint: disable = too-many-branches
         running_jobs_set = OrderedDict.fromkeys(jobs)
-        while running_jobs_set:  # pylint: disable = too-many-nested-blocks
-            running_jobs = list(running_jobs_set.keys())
-            for job in running_jobs:
-                try:
-                    event_log = htcondor.JobEventLog(job.filenames.log_filename)
-                    events = event_log.events(0)
-                except OSError as error:
-                    # Fails if trying to open too many logs at the same time
-                    if job.error_count < CONDOR_MAX_ERROR_COUNT:
-                        CondorJobWrapper.logger.warning(f"Job {job.name}: attempt {job.error_count}: failed to open log "
-                                                        f"{job.filenames.log_filename}, retrying after pause; error: {error}")
-                        job.error_count += 1
-                        continue
-                    CondorJobWrapper.logger.error(f"Job {job.name}: failed to open log"
-                                                  f" {job.filenames.log_filename} in {CONDOR_MAX_ERROR_COUNT} attempts")
-                    raise
-                for event in events:
-                    event_type = event.type
-                    CondorJobWrapper.logger.debug(f"Job {job.name}: processing event type {event_type}")
-                    # Reference: https://htcondor.readthedocs.io/en/latest/apis/python-bindings/api/htcondor.html#reading-job-events
-                    if event_type == JobEventType.EXECUTE:
-                        if not job.running:
-                            job.execute_time = time.time()
-                            job.running = True
-                    if event_type == JobEventType.JOB_TERMINATED:
-                        if event["TerminatedNormally"]:
-                            if event["ReturnValue"] != 0:
-                                CondorJobWrapper.process_failure(job, "terminated normally with non-zero return code", jobs,
-                                                                 retry=job.retry_arbitrary_failures)
+        reader = EventLogReader(event_log_class)
+        interval = CONDOR_MIN_POLL_INTERVAL
+        try:
+            while running_jobs_set:  # pylint: disable = too-many-nested-blocks
+                running_jobs = list(running_jobs_set.keys())
+                num_events = 0
+                for job in running_jobs:
+                    try:
+                        events = reader.read(job)
+                    except OSError as error:
+                        # Fails if trying to open too many logs at the same time
+                        if job.error_count < CONDOR_MAX_ERROR_COUNT:
+                            CondorJobWrapper.logger.warning(f"Job {job.name}: attempt {job.error_count}: failed to open log "
+                                                            f"{job.filenames.log_filename}, retrying after pause; error: {error}")
+                            job.error_count += 1
+                            continue
+                        CondorJobWrapper.logger.error(f"Job {job.name}: failed to open log"
+                                                      f" {job.filenames.log_filename} in {CONDOR_MAX_ERROR_COUNT} attempts")
+                        raise
+                    num_events += len(events)
+                    for event in events:
+                        event_type = event.type
+                        CondorJobWrapper.logger.debug(f"Job {job.name}: processing event type {event_type}")
+                        # Reference: https://htcondor.readthedocs.io/en/latest/apis/python-bindings/api/htcondor.html#reading-job-events
+                        if event_type == JobEventType.EXECUTE:
+                            if not job.running:
+                                job.execute_time = time.time()
+                                job.running = True
+                        if event_type == JobEventType.JOB_TERMINATED:
+                            if event["TerminatedNormally"]:
+                                if event["ReturnValue"] != 0:
+                                    CondorJobWrapper.process_failure(job, "terminated normally with non-zero return code", jobs,
+                                                                     retry=job.retry_arbitrary_failures)
+                                else:
+                                    CondorJobWrapper.process_success(job, running_jobs_set, cleanup)
                             else:
-                                CondorJobWrapper.process_success(job, running_jobs_set, cleanup)
-                        else:
-                            CondorJobWrapper.process_failure(job, "terminated abnormally", jobs, retry=True)
-                    elif event_type == JobEventType.JOB_HELD:
-                        hold_reason_code = event["HoldReasonCode"]
-                        if hold_reason_code != 1:
-                            # TODO: investigate KeyError for HoldReason if reproducible
-                            CondorJobWrapper.process_failure(job, event["HoldReason"], jobs,
-                                                             retry=(job.retry_arbitrary_failures or hold_reason_code in CONDOR_HOLD_RETRY_CODES))
-                event_log.close()
-                CondorJobWrapper.process_timeout(job, jobs)
-            time.sleep(60 * random.uniform(0.9, 1.1))  # inject a little randomness to avoid synchronized waking up of parallel processes
+                                CondorJobWrapper.process_failure(job, "terminated abnormally", jobs, retry=True)
+                        elif event_type == JobEventType.JOB_HELD:
+                            hold_reason_code = event["HoldReasonCode"]
+                            if hold_reason_code != 1:
+                                # TODO: investigate KeyError for HoldReason if reproducible
+                                CondorJobWrapper.process_failure(job, event["HoldReason"], jobs,
+                                                                 retry=(job.retry_arbitrary_failures or hold_reason_code in CONDOR_HOLD_RETRY_CODES))
+                    if job not in running_jobs_set:
+                        reader.discard(job)
+                    CondorJobWrapper.process_timeout(job, jobs)
+                if not running_jobs_set:
+                    break
+                interval = CONDOR_MIN_POLL_INTERVAL if num_events else min(interval * CONDOR_POLL_BACKOFF, CONDOR_MAX_POLL_INTERVAL)
+                time.sleep(interval * random.uniform(0.9, 1.1))  # inject a little randomness to avoid synchronized waking up of parallel processes
+        finally:
+            reader.close()
 
     @staticmethod
     def monitor_polling(jobs, cleanup):
@@ -0,0 +1,62 @@
+"""Queue of features shared across jobs, from which jobs that finish their own features early pull more"""
+
+import fcntl
+import os
+import pickle
+
+import cloudpickle
+
+
+class WorkQueue():
+    """
+    Features (in order of decreasing estimated cost) written by the master to a file shared across jobs,
+    along with a log of claims (<filename>.claims). Jobs claim consecutive features of about 'quantum' estimated cost
+    at a time, under an exclusive lock on the log. A restarted job first reclaims its own earlier claims
+    (whose completed results are restored from its checkpoint, if enabled).
+    """
+    def __init__(self, filename):
+        self._filename = filename
+        self._claims_filename = f"{filename}.claims"
+        self._features = None
+        self._costs = None
+        self._quantum = None
+        self._reclaimed = False
+
+    @staticmethod
+    def write(filename, features, costs, quantum):
+        """Write queue of features, with their estimated costs and the estimated cost to claim at a time"""
+        with open(filename, "wb") as queue_file:
+            cloudpickle.dump((list(features), list(costs), quantum), queue_file, protocol=pickle.DEFAULT_PROTOCOL)
+        with open(f"{filename}.claims", "w", encoding="utf-8"):
+            pass  # Empty claims log
+
+    def _load(self):
+        """Load queued features"""
+        if self._features is None:
+            with open(self._filename, "rb") as queue_file:
+                self._features, self._costs, self._quantum = cloudpickle.load(queue_file)
+            for feature in self._features:
+                feature.initialize_rng()
+
+    def claim(self, worker_idx):
+        """Claim next features for worker (empty once queue is exhausted)"""
+        self._load()
+        with open(self._claims_filename, "r+", encoding="utf-8") as log:
+            fcntl.lockf(log, fcntl.LOCK_EX)  # Released on closing log
+            claims = [tuple(int(value) for value in line.split()) for line in log if len(line.split()) == 3]  # (worker, start, stop)
+            if not self._reclaimed:
+                self._reclaimed = True
+                own_claims = [self._features[start: stop] for worker, start, stop in claims if worker == worker_idx]
+                if own_claims:
+                    return [feature for features in own_claims for feature in features]
+            start = stop = max((claim[2] for claim in claims), default=0)
+            cost = 0.
+            while stop < len(self._features) and (stop == start or cost < self._quantum):
+                cost += self._costs[stop]
+                stop += 1
+            if stop > start:
+                log.seek(0, os.SEEK_END)
+                log.write(f"{worker_idx} {start} {stop}\n")
+                log.flush()
+                os.fsync(log.fileno())
+        return self._features[start: stop]
@@ -6,21 +6,32 @@ computes the effect on the model's output loss
 
 import argparse
 from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import copy
+from distutils.util import strtobool
 import importlib
+import json
 import os
 import pickle
 import socket
 import sys
+import threading
 
 import cloudpickle
 import h5py
 import numpy as np
 
 from anamod.core import constants
-from anamod.core.compute_p_values import compute_empirical_p_value, bh_procedure
+from anamod.core.cache import PerturbationCache
+from anamod.core.checkpoint import Checkpoint, IMPORTANCE, TEMPORAL, WINDOW
+from anamod.core.compute_p_values import (compute_empirical_p_value, bh_procedure, PartialPerturbedLoss,
+                                          SequentialPermutationTest, StreamingPerturbedLoss)
 from anamod.core.losses import Loss
-from anamod.core.perturbations import PERTURBATION_FUNCTIONS, PERTURBATION_MECHANISMS
-from anamod.core.utils import get_logger
+from anamod.core.results import write_results
+from anamod.core.prediction import adapt_model, tune_batch_rows
+from anamod.core.perturbations import PERTURBATION_FUNCTIONS, PERTURBATION_MECHANISMS, PerturbationMechanism
+from anamod.core.work_queue import WorkQueue
+from anamod.core.utils import OutOfCoreArray, attach_shared_array, get_logger, open_out_of_core_array, share_array
 
 Inputs = namedtuple("Inputs", ["data", "targets", "model"])
 
@@ -33,6 +44,11 @@ def main():
     parser.add_argument("-model_filename")
     parser.add_argument("-model_loader_filename")
     parser.add_argument("-data_filename")
+    parser.add_argument("-baseline_filename")
+    parser.add_argument("-data_array_filename")
+    parser.add_argument("-queue_filename")
+    parser.add_argument("-data_chunk_rows", type=int, default=0)
+    parser.add_argument("-instance_shards", type=int, default=1)
     parser.add_argument("-analysis_type", required=True)
     parser.add_argument("-perturbation", required=True)
     parser.add_argument("-num_permutations", required=True, type=int)
@@ -43,6 +59,20 @@ def main():
     parser.add_argument("-fdr_control", action="store_true")
     parser.add_argument("-window_search_algorithm", type=str)
     parser.add_argument("-window_effect_size_threshold", type=float)
+    parser.add_argument("-window_search_arity", type=int, default=2)
+    parser.add_argument("-cache_dir", type=str)
+    parser.add_argument("-cache_max_bytes", type=int, default=2**32)
+    parser.add_argument("-checkpoint", type=strtobool, default=False)
+    parser.add_argument("-max_batch_rows", type=int, default=0)
+    parser.add_argument("-max_batch_bytes", type=int, default=0)
+    parser.add_argument("-tune_batch_size", type=strtobool, default=False)
+    parser.add_argument("-max_concurrent_predictions", type=int, default=16)
+    parser.add_argument("-perturb_in_place", type=strtobool, default=False)
+    parser.add_argument("-worker_executor", type=str, default=constants.SERIAL, choices=constants.CHOICES_WORKER_EXECUTORS)
+    parser.add_argument("-worker_n_jobs", type=int, default=1)
+    parser.add_argument("-early_stopping_tolerance", type=float, default=0.)
+    parser.add_argument("-streaming_statistics", type=strtobool, default=False)
+    parser.add_argument("-dtype", type=str, choices=constants.CHOICES_DTYPES)
     args = parser.parse_args()
     args.logger = get_logger(__name__, "%s/worker_%d.log" % (args.output_dir, args.worker_idx))
     pipeline(args)
@@ -56,27 +86,55 @@ def pipeline(args):
     features = load_features(args.features_filename)
     # Load data
     data, targets = load_data(args)
-    # Load model
-    model = load_model(args)
+    # Load model, splitting calls to predict into batches as configured (and running them concurrently if asynchronous)
+    model = adapt_model(load_model(args), getattr(args, "max_batch_rows", 0), getattr(args, "max_batch_bytes", 0),
+                        getattr(args, "max_concurrent_predictions", 1))
+    if getattr(args, "tune_batch_size", False):
+        args.max_batch_rows, throughputs = tune_batch_rows(model.model, data, args.max_batch_rows, args.max_batch_bytes)
+        model.max_rows = args.max_batch_rows
+        args.logger.info(f"Tuned batch size: {args.max_batch_rows} rows; throughput (rows/s) by batch size: {throughputs}")
     inputs = Inputs(data, targets, model)
-    # Baseline predictions/losses
-    # FIXME: baseline may be computed in master and provided to all workers
+    # Baseline losses (computed by master if available)
     baseline_loss, loss_fn = compute_baseline(args, inputs)
-    if args.fdr_control:
-        # Perturb entire hierarchy and use FDR control to prune efficiently
-        perturb_feature_hierarchy(args, inputs, features, baseline_loss, loss_fn)
-    else:
-        # Perturb features in file
-        perturbed_losses = perturb_features(args, inputs, features, loss_fn)
-        compute_importances(args, features, perturbed_losses, baseline_loss)
-    # For important features, proceed with further analysis (temporal model analysis):
-    if args.analysis_type == constants.TEMPORAL:
-        temporal_analysis(args, inputs, features, baseline_loss, loss_fn)
+    if getattr(args, "cache_dir", None):
+        # Cache of perturbation results, persisting across analyses
+        config = {arg: getattr(args, arg, None) for arg in CACHE_ARGS}
+        args.perturbation_cache = PerturbationCache.from_args(args, inputs, config)
+    # Log of completed feature results, to resume from if restarted
+    checkpoint_filename = constants.CHECKPOINT_FILENAME.format(args.output_dir, args.worker_idx) if getattr(args, "checkpoint", False) else None
+    args.worker_checkpoint = Checkpoint(checkpoint_filename, {arg: getattr(args, arg, None) for arg in CHECKPOINT_ARGS}, args.logger)
+    partial_losses = None
+    queued_features = []
+    try:
+        if getattr(args, "instance_shards", 1) > 1:
+            # Perturb features over shard of instances, leaving tests to master
+            partial_losses = perturb_features_sharded(args, inputs, features)
+        elif args.fdr_control:
+            # Perturb entire hierarchy and use FDR control to prune efficiently
+            perturb_feature_hierarchy(args, inputs, features, baseline_loss, loss_fn)
+        else:
+            # Perturb features in file
+            perturb_features(args, inputs, features, baseline_loss, loss_fn)
+        # For important features, proceed with further analysis (temporal model analysis):
+        if args.analysis_type == constants.TEMPORAL and partial_losses is None:
+            temporal_analysis(args, inputs, features, baseline_loss, loss_fn)
+        if getattr(args, "queue_filename", None):
+            # Pull more features from queue shared across jobs
+            queued_features = analyze_queued_features(args, inputs, baseline_loss, loss_fn)
+    finally:
+        args.worker_checkpoint.close()
+        model.close()
     # Write outputs
-    write_outputs(args, features)
+    write_outputs(args, features, partial_losses, queued_features)
     args.logger.info("End anamod worker pipeline")
 
 
+# Arguments that determine worker results, used to validate checkpoints
+CHECKPOINT_ARGS = ["analysis_type", "perturbation", "num_permutations", "permutation_test_statistic", "loss_function",
+                   "importance_significance_level", "window_search_algorithm", "window_effect_size_threshold", "window_search_arity",
+                   "early_stopping_tolerance", "streaming_statistics", "dtype", "fdr_control"]
+
+
 def validate_args(args):
     """Validate arguments"""
     if args.analysis_type == constants.TEMPORAL:
@@ -94,11 +152,24 @@ def load_features(features_filename):
 
 
 def load_data(args):
-    """Load data from HDF5 file if required"""
+    """
+    Load data from HDF5 file (or raw data array file, if provided, or out-of-core data referenced by HDF5 file) if required.
+    If streaming data in chunks of instances, the data is opened lazily (as HDF5 dataset or memory-mapped array).
+    """
     if hasattr(args, "data"):
         return args.data, args.targets
+    lazy = bool(getattr(args, "data_chunk_rows", 0))
     data_root = h5py.File(args.data_filename, "r")
-    data = data_root[constants.DATA][...]
+    if getattr(args, "data_array_filename", None):
+        data = np.load(args.data_array_filename, mmap_mode="r" if lazy else None)
+    elif constants.EXTERNAL_DATA in data_root.attrs:
+        # Out-of-core data referenced by data file, at its original path (shared filesystem) or transferred alongside
+        spec = OutOfCoreArray(**json.loads(data_root.attrs[constants.EXTERNAL_DATA]))
+        filename = spec.filename if os.path.isfile(spec.filename) else os.path.basename(spec.filename)
+        data = open_out_of_core_array(spec, filename)
+        data = data if lazy else np.array(data)
+    else:
+        data = data_root[constants.DATA] if lazy else data_root[constants.DATA][...]
     targets = data_root[constants.TARGETS][...]
     return data, targets
 
@@ -117,15 +188,28 @@ def load_model(args):
 
 
 def compute_baseline(args, inputs):
-    """Compute baseline prediction/loss"""
+    """Compute baseline prediction/loss, or load it if computed by master"""
     data, targets, model = inputs
-    pred = model.predict(data)
-    loss_fn = Loss(args.loss_function, targets).loss_fn
-    baseline_loss = loss_fn(pred)
-    args.logger.info(f"Baseline mean loss: {np.mean(baseline_loss)}")
+    loss_fn = Loss(args.loss_function, targets, args.dtype).loss_fn
+    baseline_loss = load_baseline(args)
+    if baseline_loss is None:
+        pred = predict_chunked(model, data, args.data_chunk_rows) if getattr(args, "data_chunk_rows", 0) else model.predict(data)
+        baseline_loss = loss_fn(pred)
+    args.baseline_loss = baseline_loss
+    args.logger.info(f"Baseline mean loss: {np.mean(baseline_loss, dtype=np.float64)}")
     return baseline_loss, loss_fn
 
 
+def load_baseline(args):
+    """Load baseline loss computed by master if available, from args or from HDF5 file"""
+    if getattr(args, "baseline_loss", None) is not None:
+        return args.baseline_loss
+    if not getattr(args, "baseline_filename", None):
+        return None
+    with h5py.File(args.baseline_filename, "r") as baseline_root:
+        return baseline_root[constants.LOSSES][...]
+
+
 def get_perturbation_mechanism(args, rng, perturbation_type, num_instances, num_permutations):
     """Get appropriately configured object to perform perturbations"""
     perturbation_fn_class = PERTURBATION_FUNCTIONS[perturbation_type][args.perturbation]
@@ -133,105 +217,512 @@ def get_perturbation_mechanism(args, rng, perturbation_type, num_instances, num_
     return perturbation_mechanism_class(perturbation_fn_class, perturbation_type, rng, num_instances, num_permutations)
 
 
-def perturb_features(args, inputs, features, loss_fn):
-    """Perturb features"""
+def perturb_features(args, inputs, features, baseline_loss, loss_fn):
+    """Perturb features and compute their importances feature by feature"""
     # TODO: Perturbation modules should be provided as input so custom modules may be used
     args.logger.info("Begin perturbing features")
-    perturbed_losses = {}
-    # Perturb each feature
-    for feature in features:
-        perturbed_losses[feature.name] = perturb_feature(args, inputs, feature, loss_fn)
+    baseline_mean_loss = np.mean(baseline_loss, dtype=np.float64)
+    stopping_rule = get_stopping_rule(args, baseline_loss)
+    features = [feature for feature in features if not args.worker_checkpoint.restore(IMPORTANCE, feature)]
+    with FeatureScheduler(args, inputs, loss_fn) as scheduler:
+        for feature, perturbed_loss in scheduler.perturb(features, stopping_rule):
+            compute_importance(args, feature, perturbed_loss, baseline_loss, baseline_mean_loss)
+            args.worker_checkpoint.record(IMPORTANCE, feature)
     args.logger.info("End perturbing features")
-    return perturbed_losses
 
 
 def perturb_feature_hierarchy(args, inputs, features, baseline_loss, loss_fn):
-    """Perturb all features in hierarchy, while pruning efficiently using FDR control"""
+    """
+    Perturb all features in hierarchy, while pruning efficiently using FDR control.
+    The hierarchy is descended level by level: all children of the nodes on the current frontier
+    are perturbed together (concurrently if configured), followed by BH procedure per parent.
+    """
     # pylint: disable = too-many-locals
     args.logger.info("Begin perturbing features")
-    baseline_mean_loss = np.mean(baseline_loss)
-    queue = deque()
-    root = features[0].root
-    queue.append(root)
-    while queue:
-        feature = queue.popleft()
-        if not feature.children:
-            continue
-        num_children = len(feature.children)
-        pvalues = np.ones(num_children)
-        for idx, child in enumerate(feature.children):
-            perturbed_loss = perturb_feature(args, inputs, child, loss_fn)
-            compute_importance(args, child, perturbed_loss, baseline_loss, baseline_mean_loss)
-            pvalues[idx] = child.overall_pvalue
-        adjusted_pvalues, rejected_hypotheses = bh_procedure(pvalues, args.importance_significance_level)
-        for idx, child in enumerate(feature.children):
-            child.overall_pvalue = adjusted_pvalues[idx]
-            child.important = rejected_hypotheses[idx]
-            if child.important:
-                queue.append(child)
+    baseline_mean_loss = np.mean(baseline_loss, dtype=np.float64)
+    stopping_rule = get_stopping_rule(args, baseline_loss)
+    hierarchy = features[0].hierarchy
+    columns = hierarchy.columns
+    frontier = hierarchy.roots
+    with FeatureScheduler(args, inputs, loss_fn) as scheduler:
+        while frontier.size:
+            parents = frontier[hierarchy.child_pointers[frontier + 1] > hierarchy.child_pointers[frontier]]
+            positions = np.concatenate([hierarchy.children(parent) for parent in parents]) if parents.size else parents
+            children = [child for child in hierarchy.features(positions) if not args.worker_checkpoint.restore(IMPORTANCE, child)]
+            for child, perturbed_loss in scheduler.perturb(children, stopping_rule):
+                compute_importance(args, child, perturbed_loss, baseline_loss, baseline_mean_loss)
+                args.worker_checkpoint.record(IMPORTANCE, child)
+            important = []
+            for parent in parents:
+                positions = hierarchy.children(parent)
+                columns["pvalue"][positions], columns["important"][positions] = bh_procedure(columns["pvalue"][positions],
+                                                                                             args.importance_significance_level)
+                important.append(positions[columns["important"][positions]])
+            frontier = np.concatenate(important) if important else parents
     args.logger.info("End perturbing features")
 
 
+class FeatureScheduler():
+    """
+    Perturbs sets of independent features (e.g. the frontier of the hierarchy) across a pool of threads or processes,
+    as configured by args.worker_executor and args.worker_n_jobs. All permutations of a given feature are performed
+    by the same thread/process using the feature's own RNG, so results are identical to serial perturbation
+    and feature RNGs are left in the same state as well. Threads perturb private workspaces, never the shared data.
+    """
+    def __init__(self, args, inputs, loss_fn):
+        self._args = args
+        self._inputs = inputs
+        self._loss_fn = loss_fn
+        self._num_jobs = os.cpu_count() if args.worker_n_jobs < 0 else args.worker_n_jobs
+        self._executor = None  # started on first use
+        self._shm = None  # shared memory block holding data for worker processes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._executor is not None:
+            self._executor.shutdown()
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+
+    def _get_executor(self, executor_type):
+        """Return pool of configured type, starting it if required; None if serial or of other type"""
+        if self._num_jobs <= 1 or self._args.worker_executor != executor_type:
+            return None
+        if self._executor is None and executor_type == constants.THREAD:
+            self._executor = ThreadPoolExecutor(max_workers=self._num_jobs, initializer=init_perturbation_thread)
+        elif self._executor is None:
+            self._shm, data_spec = share_array(self._inputs.data)
+            args = argparse.Namespace(**{arg: getattr(self._args, arg, None) for arg in PERTURBATION_ARGS})
+            initargs = (args, data_spec, cloudpickle.dumps(self._inputs.model), self._loss_fn)
+            self._executor = ProcessPoolExecutor(max_workers=self._num_jobs, initializer=init_perturbation_process, initargs=initargs)
+        return self._executor
+
+    def perturb(self, features, stopping_rule=None):
+        """Perturb features, yielding (feature, perturbed_loss) pairs in input order as they become available"""
+        executor = self._get_executor(self._args.worker_executor) if len(features) > 1 else None
+        if executor is None:
+            yield from perturb_features_batched(self._args, self._inputs, features, self._loss_fn, stopping_rule=stopping_rule)
+            return
+        # Split features into contiguous chunks so that each task can batch predictions across its features
+        chunks = [[features[idx] for idx in chunk] for chunk in np.array_split(np.arange(len(features)), min(self._num_jobs, len(features)))]
+        if self._args.worker_executor == constants.THREAD:
+            futures = [executor.submit(perturb_features_list, self._args, self._inputs, chunk, self._loss_fn, stopping_rule) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                yield from zip(chunk, future.result())
+            return
+        futures = [executor.submit(perturb_features_detached, [DetachedFeature.from_feature(feature) for feature in chunk], stopping_rule)
+                   for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            for feature, (perturbed_loss, rng) in zip(chunk, future.result()):
+                feature.rng = rng  # Advance RNG as if perturbed locally
+                yield feature, perturbed_loss
+
+    def map(self, func, features):
+        """
+        Apply func to each feature, across threads if using thread executor (serially otherwise).
+        func must only modify the feature it is applied to.
+        """
+        executor = self._get_executor(constants.THREAD)
+        if executor is None:
+            return [func(feature) for feature in features]
+        return list(executor.map(func, features))
+
+
+# Arguments required to perturb features in worker processes
+PERTURBATION_ARGS = ["analysis_type", "perturbation", "num_permutations", "max_batch_rows", "max_batch_bytes", "perturb_in_place",
+                     "max_concurrent_predictions",
+                     "streaming_statistics", "permutation_test_statistic", "baseline_loss", "dtype", "perturbation_cache",
+                     "data_chunk_rows"]
+_PERTURBATION_PROCESS = {}  # Process-level state of perturbation processes
+
+
+class DetachedFeature(namedtuple("DetachedFeature", ["name", "idx", "size", "rng"])):
+    """Lightweight copy of feature detached from hierarchy, to send to perturbation processes"""
+    @classmethod
+    def from_feature(cls, feature):
+        """Create detached copy of feature"""
+        return cls(feature.name, feature.idx, feature.size, feature.rng)
+
+
+def init_perturbation_process(args, data_spec, model_bytes, loss_fn):
+    """Initialize perturbation process with shared inputs"""
+    shm, data = attach_shared_array(data_spec)
+    _PERTURBATION_PROCESS.update(args=args, shm=shm, inputs=Inputs(data, None, cloudpickle.loads(model_bytes)), loss_fn=loss_fn)
+
+
+def perturb_features_detached(features, stopping_rule=None):
+    """Perturb detached features in perturbation process, returning (perturbed loss, advanced RNG) pairs"""
+    args, inputs, loss_fn = (_PERTURBATION_PROCESS[key] for key in ["args", "inputs", "loss_fn"])
+    return [(perturbed_loss, feature.rng) for feature, perturbed_loss
+            in perturb_features_batched(args, inputs, features, loss_fn, stopping_rule=stopping_rule)]
+
+
+_PERTURBATION_THREAD = threading.local()  # Thread-level state of perturbation threads
+
+
+def init_perturbation_thread():
+    """Initialize perturbation thread with private workspace (see get_workspace)"""
+    _PERTURBATION_THREAD.workspace = None
+
+
+def perturb_features_list(args, inputs, features, loss_fn, stopping_rule=None):
+    """Perturb features, returning list of perturbed losses"""
+    return [perturbed_loss for _, perturbed_loss in perturb_features_batched(args, inputs, features, loss_fn, stopping_rule=stopping_rule)]
+
+
+def get_stopping_rule(args, baseline_loss):
+    """Return sequential test to stop permuting features early if configured, else None"""
+    if not args.early_stopping_tolerance:
+        return None
+    return SequentialPermutationTest(baseline_loss, args.permutation_test_statistic, args.importance_significance_level,
+                                     args.early_stopping_tolerance, args.num_permutations)
+
+
 def perturb_feature(args, inputs, feature, loss_fn,
-                    timesteps=..., perturbation_type=constants.ACROSS_INSTANCES):
+                    timesteps=..., perturbation_type=constants.ACROSS_INSTANCES, stopping_rule=None):
     """Perturb feature"""
+    # pylint: disable = too-many-arguments
+    _, perturbed_loss = next(perturb_features_batched(args, inputs, [feature], loss_fn, timesteps, perturbation_type, stopping_rule))
+    return perturbed_loss
+
+
+def perturb_features_batched(args, inputs, features, loss_fn,
+                             timesteps=..., perturbation_type=constants.ACROSS_INSTANCES, stopping_rule=None):
+    """
+    Perturb features as described in perturb_features_uncached, reusing cached results where available
+    (see PerturbationCache) and caching new results
+    """
+    # pylint: disable = too-many-arguments, too-many-locals, stop-iteration-return
+    cache = getattr(args, "perturbation_cache", None)
+    if cache is None:
+        yield from perturb_features_uncached(args, inputs, features, loss_fn, timesteps, perturbation_type, stopping_rule)
+        return
+    timesteps = timesteps if isinstance(timesteps, list) else [timesteps] * len(features)
+    keys = [cache.key(feature, feature_timesteps, perturbation_type, args.num_permutations, stopping_rule)
+            for feature, feature_timesteps in zip(features, timesteps)]
+    entries = [cache.get(key) for key in keys]
+    misses = [idx for idx, entry in enumerate(entries) if entry is None]
+    perturbed = perturb_features_uncached(args, inputs, [features[idx] for idx in misses], loss_fn,
+                                          [timesteps[idx] for idx in misses], perturbation_type, stopping_rule)
+    for feature, key, entry in zip(features, keys, entries):
+        if entry is None:
+            _, perturbed_loss = next(perturbed)
+            cache.put(key, perturbed_loss, feature.rng.bit_generator.state)
+        else:
+            perturbed_loss, feature.rng.bit_generator.state = entry  # Restore RNG state as if perturbed
+        yield feature, perturbed_loss
+
+
+# Arguments (besides inputs) that determine perturbation results, used to identify cached results
+CACHE_ARGS = ["analysis_type", "perturbation", "loss_function", "dtype", "streaming_statistics", "permutation_test_statistic"]
+
+
+def perturb_features_uncached(args, inputs, features, loss_fn,
+                              timesteps=..., perturbation_type=constants.ACROSS_INSTANCES, stopping_rule=None):
+    """
+    Perturb features, stacking permuted copies of the data (across permutations and features)
+    into batched calls to model.predict as permitted by the configured batch size.
+    Yields (feature, perturbed_loss) pairs in input order as their losses become available.
+    If a stopping rule (sequential test) is provided, permutations of a feature stop once its decision is settled.
+    Timesteps to perturb (for temporal data) may be provided for all features, or as a list with one entry per feature.
+    """
+    # pylint: disable = too-many-arguments, too-many-locals
+    if getattr(args, "data_chunk_rows", 0):
+        yield from perturb_features_chunked(args, inputs, features, loss_fn, timesteps, perturbation_type, stopping_rule)
+        return
+    data, _, model = inputs
+    num_instances = data.shape[0]
+    assert args.perturbation == constants.PERMUTATION, "Zeroing deprecated, only permutation-type perturbations currently supported"
+    batch = PredictionBatch(args, model, loss_fn, data)
+    pending = deque()  # features with perturbed copies queued, along with index of their last copy in the batch sequence
+    for fidx, feature in enumerate(features):
+        feature_timesteps = timesteps[fidx] if isinstance(timesteps, list) else timesteps
+        num_elements = num_instances
+        if perturbation_type == constants.WITHIN_INSTANCE:
+            num_elements = data.shape[2] if feature_timesteps == ... else len(feature_timesteps)
+        num_permutations = args.num_permutations
+        perturbed_loss = new_perturbed_loss(args, num_instances, num_permutations)
+        perturbation_mechanism = get_perturbation_mechanism(args, feature.rng, perturbation_type, num_elements, num_permutations)
+        for kidx in range(num_permutations):
+            try:
+                batch.add(perturbation_mechanism, feature, feature_timesteps, perturbed_loss, kidx)
+            except StopIteration:
+                num_permutations = kidx
+                break
+            yield from pop_completed(pending, batch)
+            if stopping_rule is not None and stopping_rule.is_checkpoint(kidx + 1):
+                batch.flush()
+                yield from pop_completed(pending, batch)
+                if stopping_rule.settled(perturbed_loss[:, :kidx + 1]):
+                    num_permutations = kidx + 1
+                    break
+        pending.append((feature, perturbed_loss[:, :num_permutations], batch.num_queued))
+        yield from pop_completed(pending, batch)
+    batch.flush()
+    yield from pop_completed(pending, batch)
+
+
+def perturb_features_chunked(args, inputs, features, loss_fn,
+                             timesteps=..., perturbation_type=constants.ACROSS_INSTANCES, stopping_rule=None):
+    """
+    Perturb features of (possibly out-of-core) data, streaming chunks of instances through model.predict
+    so that memory usage scales with the chunk size rather than the size of the data (see perturb_feature_values).
+    """
     # pylint: disable = too-many-arguments, too-many-locals
     data, _, model = inputs
-    num_permutations = args.num_permutations
+    assert args.perturbation == constants.PERMUTATION, "Zeroing deprecated, only permutation-type perturbations currently supported"
+    for fidx, feature in enumerate(features):
+        feature_timesteps = timesteps[fidx] if isinstance(timesteps, list) else timesteps
+        perturbed_loss = new_perturbed_loss(args, data.shape[0], args.num_permutations)
+        num_permutations = 0
+        for perturbed_values in perturb_feature_values(args, data, feature, feature_timesteps, perturbation_type):
+            pred = predict_chunked(model, data, args.data_chunk_rows, feature.idx if feature.size else None, perturbed_values)
+            perturbed_loss[:, num_permutations] = loss_fn(pred)
+            num_permutations += 1
+            if (stopping_rule is not None and stopping_rule.is_checkpoint(num_permutations)
+                    and stopping_rule.settled(perturbed_loss[:, :num_permutations])):
+                break
+        yield feature, perturbed_loss[:, :num_permutations]
+
+
+def perturb_features_sharded(args, inputs, features):
+    """
+    Perturb features over the worker's shard of instances (shard worker_idx modulo instance_shards), returning partial
+    perturbed losses (see PartialPerturbedLoss) by feature name, to be reduced across shards by the master.
+    Permutations are drawn across all instances from each feature's RNG, identically in every shard,
+    so that the reduced results form a permutation test across all instances.
+    """
+    # pylint: disable = too-many-locals
+    data, targets, model = inputs
+    instances = shard_instances(data.shape[0], args.instance_shards, args.worker_idx % args.instance_shards)
+    args.logger.info(f"Begin perturbing features over instances [{instances.start}, {instances.stop})")
+    loss_fn = Loss(args.loss_function, targets[instances.start: instances.stop], args.dtype).loss_fn
+    baseline_loss = args.baseline_loss[instances.start: instances.stop]
+    chunk_rows = getattr(args, "data_chunk_rows", 0) or len(instances)
+    partial_losses = {}
+    for feature in features:
+        perturbed_loss = PartialPerturbedLoss(baseline_loss, [args.permutation_test_statistic], args.num_permutations)
+        num_permutations = 0
+        for perturbed_values in perturb_feature_values(args, data, feature):
+            pred = predict_chunked(model, data, chunk_rows, feature.idx if feature.size else None, perturbed_values, instances)
+            perturbed_loss[:, num_permutations] = loss_fn(pred)
+            num_permutations += 1
+        partial_losses[feature.name] = perturbed_loss[:, :num_permutations]
+    args.logger.info("End perturbing features")
+    return partial_losses
+
+
+def shard_instances(num_instances, num_shards, shard):
+    """Return range of instances in given shard, out of num_shards contiguous shards of near-equal size"""
+    return range(num_instances * shard // num_shards, num_instances * (shard + 1) // num_shards)
+
+
+def perturb_feature_values(args, data, feature, timesteps=..., perturbation_type=constants.ACROSS_INSTANCES):
+    """
+    Yield values of feature across all instances of (possibly out-of-core) data, perturbed once per permutation.
+    Only the feature's values are read, and perturbed as a standalone array with the same RNG draws as
+    perturbing the data as a whole (the values are None for features of size 0).
+    """
+    # pylint: disable = too-many-arguments
     num_elements = data.shape[0]
-    perturbed_loss = np.zeros((num_elements, num_permutations))
     if perturbation_type == constants.WITHIN_INSTANCE:
         num_elements = data.shape[2] if timesteps == ... else len(timesteps)
-    perturbation_mechanism = get_perturbation_mechanism(args, feature.rng, perturbation_type, num_elements, num_permutations)
-    assert args.perturbation == constants.PERMUTATION, "Zeroing deprecated, only permutation-type perturbations currently supported"
-    for kidx in range(num_permutations):
+    values = read_columns(data, feature.idx) if feature.size else None
+    values_feature = DetachedFeature(feature.name, list(range(len(feature.idx))), feature.size, feature.rng)
+    perturbation_mechanism = get_perturbation_mechanism(args, feature.rng, perturbation_type, num_elements, args.num_permutations)
+    for _ in range(args.num_permutations):
         try:
-            data_perturbed = perturbation_mechanism.perturb(data, feature, timesteps=timesteps)
+            perturbed_values = perturbation_mechanism.perturb(values, values_feature, timesteps=timesteps)
         except StopIteration:
-            num_permutations = kidx
-            break
-        pred = model.predict(data_perturbed)
-        perturbed_loss[:, kidx] = loss_fn(pred)
-    return perturbed_loss[:, :num_permutations]
+            return
+        yield perturbed_values
+
+
+def read_columns(data, idx):
+    """Read values of given feature indices across all instances of (possibly out-of-core) data"""
+    unique_idx, inverse = np.unique(idx, return_inverse=True)  # HDF5 datasets require increasing indices
+    return np.asarray(data[:, unique_idx])[:, inverse]
+
+
+def predict_chunked(model, data, chunk_rows, idx=None, values=None, instances=None):
+    """
+    Predict on chunks of instances of (possibly out-of-core) data in turn, returning predictions across
+    the given range of instances (all instances by default).
+    If provided, the values of the given feature indices are replaced by the given values (across all instances).
+    """
+    # pylint: disable = too-many-arguments
+    instances = range(data.shape[0]) if instances is None else instances
+    preds = []
+    for start in range(instances.start, instances.stop, chunk_rows):
+        stop = min(start + chunk_rows, instances.stop)
+        chunk = data[start: stop]
+        if idx is not None:
+            chunk = np.array(chunk)  # Copy chunk to substitute values
+            chunk[:, idx] = values[start: stop]
+        preds.append(model.predict(chunk))
+    return np.concatenate(preds)
+
+
+def new_perturbed_loss(args, num_instances, num_permutations):
+    """Return (instances x permutations) matrix to record perturbed losses, or streaming accumulator of their statistics"""
+    if args.streaming_statistics:
+        return StreamingPerturbedLoss(args.baseline_loss, [args.permutation_test_statistic], num_permutations)
+    return np.zeros((num_instances, num_permutations), dtype=args.dtype or np.float64)
+
+
+def pop_completed(pending, batch):
+    """Yield pending features for which all perturbed copies have been predicted"""
+    while pending and pending[0][2] <= batch.num_predicted:
+        feature, perturbed_loss, _ = pending.popleft()
+        yield feature, perturbed_loss
+
+
+class PredictionBatch():
+    """
+    Stacks perturbed copies of the data into a single call to model.predict, subject to row/byte budgets.
+    If perturbing in place, copies are perturbed within a persistent workspace and restored after prediction.
+    If the model is asynchronous, up to max_concurrent_predictions batches are kept in flight at once
+    (perturbing in place is then disabled), and their losses are recorded in order as they complete.
+    """
+    # pylint: disable = too-many-instance-attributes
+    def __init__(self, args, model, loss_fn, data):
+        self._model = model
+        self._loss_fn = loss_fn
+        self._data = data
+        self._num_instances = data.shape[0]
+        self._max_copies = max_batch_copies(args, data)
+        self._asynchronous = getattr(model, "asynchronous", False)
+        self._max_in_flight = getattr(args, "max_concurrent_predictions", 1)
+        self._in_flight = deque()  # (future of predictions, destinations) pairs of batches submitted to asynchronous model
+        self._workspace = get_workspace(data, self._max_copies) if args.perturb_in_place and not self._asynchronous else None
+        self._copies = []  # perturbed copies of data, or (workspace slot, record of original values) pairs if perturbing in place
+        self._destinations = []  # (perturbed loss matrix, column) pairs to write losses to
+        self.num_queued = 0  # number of copies queued so far
+        self.num_predicted = 0  # number of copies predicted so far
+
+    def add(self, perturbation_mechanism, feature, timesteps, perturbed_loss, kidx):
+        """Queue perturbed copy of data for prediction, flushing batch if full"""
+        # pylint: disable = too-many-arguments
+        if self._workspace is None:
+            self._copies.append(perturbation_mechanism.perturb(self._data, feature, timesteps=timesteps))
+        else:
+            offset = len(self._copies) * self._num_instances
+            slot = self._workspace[offset: offset + self._num_instances]
+            _, record = perturbation_mechanism.perturb_in_place(slot, feature, timesteps=timesteps)
+            self._copies.append((slot, record))
+        self._destinations.append((perturbed_loss, kidx))
+        self.num_queued += 1
+        if len(self._copies) >= self._max_copies:
+            self.flush(wait=False)
+
+    def flush(self, wait=True):
+        """
+        Predict on queued copies of data and record losses.
+        Unless asked to wait, predictions of an asynchronous model are left in flight (see collect).
+        """
+        num_copies = len(self._copies)
+        if num_copies:
+            if self._workspace is None:
+                stacked = self._copies[0] if num_copies == 1 else np.concatenate(self._copies)
+                if self._asynchronous:
+                    self._in_flight.append((self._model.submit(stacked), self._destinations))
+                else:
+                    self._record(self._model.predict(stacked), self._destinations)
+            else:
+                try:
+                    pred = self._model.predict(self._workspace[:num_copies * self._num_instances])
+                finally:
+                    for slot, record in self._copies:
+                        PerturbationMechanism.restore(slot, record)
+                self._record(pred, self._destinations)
+            self._copies = []
+            self._destinations = []
+        self.collect(wait)
+
+    def collect(self, wait=True):
+        """
+        Record losses of batches in flight in order of submission: all of them if asked to wait,
+        else those completed (waiting for the oldest ones while too many are in flight)
+        """
+        while self._in_flight and (wait or self._in_flight[0][0].done() or len(self._in_flight) > self._max_in_flight):
+            future, destinations = self._in_flight.popleft()
+            self._record(future.result(), destinations)
+
+    def _record(self, pred, destinations):
+        """Record losses of predictions on batch of copies"""
+        for cidx, (perturbed_loss, kidx) in enumerate(destinations):
+            perturbed_loss[:, kidx] = self._loss_fn(pred[cidx * self._num_instances: (cidx + 1) * self._num_instances])
+        self.num_predicted += len(destinations)
+
+
+def get_workspace(data, num_copies):
+    """
+    Return workspace to perturb copies of data in place; the data itself is used if possible.
+    Perturbation threads instead reuse a private workspace, since the data is shared across threads.
+    """
+    if not hasattr(_PERTURBATION_THREAD, "workspace"):
+        if num_copies == 1 and data.flags.writeable:
+            return data
+        return np.concatenate([data] * num_copies)
+    workspace = _PERTURBATION_THREAD.workspace
+    if workspace is None or workspace[0] is not data or workspace[1] != num_copies:
+        workspace = (data, num_copies, np.concatenate([data] * num_copies))
+        _PERTURBATION_THREAD.workspace = workspace
+    return workspace[2]
+
+
+def max_batch_copies(args, data):
+    """Return maximum number of copies of the data to stack into a single call to model.predict"""
+    max_rows, max_bytes = args.max_batch_rows, args.max_batch_bytes
+    if not (max_rows or max_bytes):
+        return 1
+    max_copies = np.inf
+    if max_rows:
+        max_copies = min(max_copies, max_rows // data.shape[0])
+    if max_bytes:
+        max_copies = min(max_copies, max_bytes // data.nbytes)
+    return int(max(max_copies, 1))
 
 
 def compute_importance(args, feature, perturbed_loss, baseline_loss, baseline_mean_loss):
     """Computes p-value indicating feature importance"""
     feature.overall_pvalue = compute_empirical_p_value(baseline_loss, perturbed_loss, args.permutation_test_statistic)
-    feature.overall_effect_size = np.mean(perturbed_loss) - baseline_mean_loss
+    feature.overall_effect_size = np.mean(perturbed_loss, dtype=np.float64) - baseline_mean_loss
     feature.important = feature.overall_pvalue < args.importance_significance_level
 
 
-def compute_importances(args, features, perturbed_losses, baseline_loss):
-    """Computes p-values indicating feature importances"""
-    baseline_mean_loss = np.mean(baseline_loss)
-    for feature in features:
-        perturbed_loss = perturbed_losses[feature.name]
-        feature.overall_pvalue = compute_empirical_p_value(baseline_loss, perturbed_loss, args.permutation_test_statistic)
-        feature.overall_effect_size = np.mean(perturbed_loss) - baseline_mean_loss
-        feature.important = feature.overall_pvalue < args.importance_significance_level
-
-
 def search_window(args, inputs, feature, baseline_loss, loss_fn):
     """Search temporal window of importance for given feature"""
-    # pylint: disable = too-many-arguments, too-many-locals
     args.logger.info("Begin searching for temporal window for feature %s" % feature.name)
-    overall_effect_size_magnitude = np.abs(feature.overall_effect_size)
+    baseline_mean_loss = np.mean(baseline_loss, dtype=np.float64)
+    window_search = search_window_kary if args.window_search_arity > 2 else search_window_binary
+    left, right = window_search(args, inputs, feature, baseline_loss, loss_fn)
+    # Report importance as per significance test
+    perturbed_loss = perturb_feature(args, inputs, feature, loss_fn, range(left, right + 1))
+    # Set attributes on feature
+    # TODO: FDR control via Benjamini Hochberg for importance_test algorithm
+    # Doesn't seem appropriate though: (i) The p-values are sequentially generated and are not independent, and
+    # (ii) What does it mean for some p-values to be significant while others are not in the context of the search?
+    feature.window_pvalue = compute_empirical_p_value(baseline_loss, perturbed_loss, args.permutation_test_statistic)
+    feature.window_important = feature.window_pvalue < args.importance_significance_level
+    feature.window_effect_size = np.mean(perturbed_loss, dtype=np.float64) - baseline_mean_loss
+    feature.temporal_window = (left, right)
+    return left, right
+
+
+def search_window_binary(args, inputs, feature, baseline_loss, loss_fn):
+    """Search window boundaries using sequential binary search"""
     T = inputs.data.shape[2]  # pylint: disable = invalid-name
     # Search left boundary of window by identifying the left inverted window
     lbound, current, rbound = (0, T // 2, T)
-    baseline_mean_loss = np.mean(baseline_loss)
     while current < rbound:
         # Search for the largest 'negative' window anchored on the left that results in a non-important p-value/effect size
         # The right boundary of the left inverted window is the left boundary of the window of interest
         perturbed_loss = perturb_feature(args, inputs, feature, loss_fn, range(0, current))
-        if args.window_search_algorithm == constants.IMPORTANCE_TEST:
-            important = compute_empirical_p_value(baseline_loss, perturbed_loss, args.permutation_test_statistic) < args.importance_significance_level
-        else:
-            # window_search_algorithm == constants.EFFECT_SIZE
-            important = (np.abs(np.mean(perturbed_loss) - baseline_mean_loss) >
-                         (args.window_effect_size_threshold / 2) * overall_effect_size_magnitude)
-        if important:
+        if window_probe_important(args, feature, perturbed_loss, baseline_loss):
             # Move pointer to the left, decrease negative window size
             rbound = current
             current = max(current // 2, lbound)
@@ -244,13 +735,7 @@ def search_window(args, inputs, feature, baseline_loss, loss_fn):
     lbound, current, rbound = (left, (left + T) // 2, T)
     while lbound < current:
         perturbed_loss = perturb_feature(args, inputs, feature, loss_fn, range(current, T))
-        if args.window_search_algorithm == constants.IMPORTANCE_TEST:
-            important = compute_empirical_p_value(baseline_loss, perturbed_loss, args.permutation_test_statistic) < args.importance_significance_level
-        else:
-            # window_search_algorithm == constants.EFFECT_SIZE
-            important = (np.abs(np.mean(perturbed_loss) - baseline_mean_loss) >
-                         (args.window_effect_size_threshold / 2) * overall_effect_size_magnitude)
-        if important:
+        if window_probe_important(args, feature, perturbed_loss, baseline_loss):
             # Move pointer to the right, decrease negative window size
             lbound = current
             current = (current + rbound) // 2
@@ -259,52 +744,132 @@ def search_window(args, inputs, feature, baseline_loss, loss_fn):
             rbound = current
             current = (current + lbound) // 2
     right = current
-    # Report importance as per significance test
-    perturbed_loss = perturb_feature(args, inputs, feature, loss_fn, range(left, right + 1))
-    # Set attributes on feature
-    # TODO: FDR control via Benjamini Hochberg for importance_test algorithm
-    # Doesn't seem appropriate though: (i) The p-values are sequentially generated and are not independent, and
-    # (ii) What does it mean for some p-values to be significant while others are not in the context of the search?
-    feature.window_pvalue = compute_empirical_p_value(baseline_loss, perturbed_loss, args.permutation_test_statistic)
-    feature.window_important = feature.window_pvalue < args.importance_significance_level
-    feature.window_effect_size = np.mean(perturbed_loss) - baseline_mean_loss
-    feature.temporal_window = (left, right)
     return left, right
 
 
+def search_window_kary(args, inputs, feature, baseline_loss, loss_fn):
+    """
+    Search window boundaries using k-ary search: each round tests (k - 1) candidate boundaries together,
+    batched into shared calls to model.predict (as permitted by the configured batch size, or one copy of the data
+    per candidate if no batch size is configured), shrinking the search interval k-fold. Each probe uses its own RNG
+    derived from the feature's seed and the perturbed timesteps, so that results do not depend on the order of evaluation.
+    """
+    # pylint: disable = too-many-arguments
+    T = inputs.data.shape[2]  # pylint: disable = invalid-name
+    if not (args.max_batch_rows or args.max_batch_bytes or getattr(args, "data_chunk_rows", 0)):
+        # Stack one permuted copy of the data per candidate of a round into each call to model.predict
+        args = copy.copy(args)
+        args.max_batch_rows = (args.window_search_arity - 1) * inputs.data.shape[0]
+
+    def probe(timesteps):
+        probes = [DetachedFeature(feature.name, feature.idx, feature.size,
+                                  np.random.default_rng([feature.rng_seed, window.start, window.stop])) for window in timesteps]
+        perturbed_losses = perturb_features_batched(args, inputs, probes, loss_fn, timesteps)
+        return [window_probe_important(args, feature, perturbed_loss, baseline_loss) for _, perturbed_loss in perturbed_losses]
+
+    # Search left boundary of window: smallest boundary such that perturbing the timesteps to its left is important
+    lbound, rbound = (0, T)
+    while rbound - lbound > 1:
+        candidates = search_candidates(lbound, rbound, args.window_search_arity)
+        important = probe([range(0, candidate) for candidate in candidates])
+        rbound = min([rbound] + [candidate for candidate, imp in zip(candidates, important) if imp])
+        lbound = max([lbound] + [candidate for candidate, imp in zip(candidates, important) if not imp and candidate < rbound])
+    left = rbound - 1  # range(0, rbound) = 0, 1, ... rbound - 1
+    # Search right boundary of window: largest boundary such that perturbing the timesteps from it onwards is important
+    lbound, rbound = (left, T)
+    while rbound - lbound > 1:
+        candidates = search_candidates(lbound, rbound, args.window_search_arity)
+        important = probe([range(candidate, T) for candidate in candidates])
+        lbound = max([lbound] + [candidate for candidate, imp in zip(candidates, important) if imp])
+        rbound = min([rbound] + [candidate for candidate, imp in zip(candidates, important) if not imp and candidate > lbound])
+    right = lbound
+    return left, right
+
+
+def search_candidates(lbound, rbound, arity):
+    """Return (up to arity - 1) evenly spaced candidate boundaries strictly between lbound and rbound (rbound - lbound > 1)"""
+    return sorted({lbound + max(1, (rbound - lbound) * idx // arity) for idx in range(1, arity)})
+
+
+def window_probe_important(args, feature, perturbed_loss, baseline_loss):
+    """Return whether perturbing timesteps outside candidate window is important during window search"""
+    if args.window_search_algorithm == constants.IMPORTANCE_TEST:
+        return compute_empirical_p_value(baseline_loss, perturbed_loss, args.permutation_test_statistic) < args.importance_significance_level
+    # window_search_algorithm == constants.EFFECT_SIZE
+    baseline_mean_loss = np.mean(baseline_loss, dtype=np.float64)
+    return (np.abs(np.mean(perturbed_loss, dtype=np.float64) - baseline_mean_loss) >
+            (args.window_effect_size_threshold / 2) * np.abs(feature.overall_effect_size))
+
+
 def temporal_analysis(args, inputs, features, baseline_loss, loss_fn):
     """Perform temporal analysis of important features"""
+    # pylint: disable = too-many-arguments
     features = [feature for feature in features if feature.important]
     args.logger.info("Identified important features: %s; proceeding with temporal analysis" % ",".join([feature.name for feature in features]))
-    for feature in features:
+    with FeatureScheduler(args, inputs, loss_fn) as scheduler:
+        scheduler.map(lambda feature: analyze_temporal_feature(args, inputs, feature, baseline_loss, loss_fn), features)
+
+
+def analyze_temporal_feature(args, inputs, feature, baseline_loss, loss_fn):
+    """Perform temporal analysis of important feature"""
+    checkpoint = args.worker_checkpoint
+    if checkpoint.restore(TEMPORAL, feature):
+        return
+    stopping_rule = get_stopping_rule(args, baseline_loss)
+    if checkpoint.restore(WINDOW, feature):
+        left, right = feature.temporal_window
+    else:
         # Test importance of feature ordering across whole sequence
-        perturbed_loss = perturb_feature(args, inputs, feature, loss_fn, perturbation_type=constants.WITHIN_INSTANCE)
+        perturbed_loss = perturb_feature(args, inputs, feature, loss_fn, perturbation_type=constants.WITHIN_INSTANCE, stopping_rule=stopping_rule)
         feature.ordering_pvalue = compute_empirical_p_value(baseline_loss, perturbed_loss, args.permutation_test_statistic)
         feature.ordering_important = feature.ordering_pvalue < args.importance_significance_level
         args.logger.info(f"Feature {feature.name}: ordering important: {feature.ordering_important}")
         # Test feature temporal localization
         left, right = search_window(args, inputs, feature, baseline_loss, loss_fn)
-        # FDR control
-        adjusted_pvalues, rejected_hypotheses = bh_procedure([feature.ordering_pvalue, feature.window_pvalue], args.importance_significance_level)
-        feature.ordering_pvalue, feature.window_pvalue = adjusted_pvalues
-        feature.ordering_important, feature.window_important = rejected_hypotheses
-        feature.window_ordering_important &= feature.window_important
-        if feature.window_important:
-            # Test importance of feature ordering across window
-            perturbed_loss = perturb_feature(args, inputs, feature, loss_fn, range(left, right + 1), perturbation_type=constants.WITHIN_INSTANCE)
-            feature.window_ordering_pvalue = compute_empirical_p_value(baseline_loss, perturbed_loss, args.permutation_test_statistic)
-            feature.window_ordering_important = feature.window_ordering_pvalue < args.importance_significance_level
-        args.logger.info(f"Found window for feature {feature.name}: ({left}, {right});"
-                         f" significant: {feature.window_important}; ordering important: {feature.window_ordering_important}")
-
-
-def write_outputs(args, features):
+        checkpoint.record(WINDOW, feature)
+    # FDR control
+    adjusted_pvalues, rejected_hypotheses = bh_procedure([feature.ordering_pvalue, feature.window_pvalue], args.importance_significance_level)
+    feature.ordering_pvalue, feature.window_pvalue = adjusted_pvalues
+    feature.ordering_important, feature.window_important = rejected_hypotheses
+    feature.window_ordering_important &= feature.window_important
+    if feature.window_important:
+        # Test importance of feature ordering across window
+        perturbed_loss = perturb_feature(args, inputs, feature, loss_fn, range(left, right + 1),
+                                         perturbation_type=constants.WITHIN_INSTANCE, stopping_rule=stopping_rule)
+        feature.window_ordering_pvalue = compute_empirical_p_value(baseline_loss, perturbed_loss, args.permutation_test_statistic)
+        feature.window_ordering_important = feature.window_ordering_pvalue < args.importance_significance_level
+    args.logger.info(f"Found window for feature {feature.name}: ({left}, {right});"
+                     f" significant: {feature.window_important}; ordering important: {feature.window_ordering_important}")
+    checkpoint.record(TEMPORAL, feature)
+
+
+def analyze_queued_features(args, inputs, baseline_loss, loss_fn):
+    """Analyze features claimed from queue shared across jobs until it is exhausted, and return them"""
+    queue = WorkQueue(args.queue_filename)
+    queued_features = []
+    while True:
+        features = queue.claim(args.worker_idx)
+        if not features:
+            return queued_features
+        args.logger.info(f"Claimed {len(features)} features from shared queue")
+        perturb_features(args, inputs, features, baseline_loss, loss_fn)
+        if args.analysis_type == constants.TEMPORAL:
+            temporal_analysis(args, inputs, features, baseline_loss, loss_fn)
+        queued_features.extend(features)
+
+
+def write_outputs(args, features, partial_losses=None, queued_features=None):
     """Write outputs to results file"""
     args.logger.info("Begin writing outputs")
-    # Write features
-    features_filename = constants.OUTPUT_FEATURES_FILENAME.format(args.output_dir, args.worker_idx)
-    with open(features_filename, "wb") as features_file:
-        cloudpickle.dump(features, features_file, protocol=pickle.DEFAULT_PROTOCOL)
+    if partial_losses is not None:
+        # Write partial losses first, since outputs are complete once results are written
+        partial_losses_filename = constants.PARTIAL_LOSSES_FILENAME.format(args.output_dir, args.worker_idx)
+        with open(partial_losses_filename, "wb") as partial_losses_file:
+            pickle.dump(partial_losses, partial_losses_file, protocol=pickle.DEFAULT_PROTOCOL)
+    # Write results
+    if queued_features:
+        write_results(constants.QUEUE_RESULTS_FILENAME.format(args.output_dir, args.worker_idx), queued_features)
+    write_results(constants.RESULTS_FILENAME.format(args.output_dir, args.worker_idx), features)
     args.logger.info("End writing outputs")
 
 
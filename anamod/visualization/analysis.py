@@ -75,16 +75,19 @@ def visualize_temporal(args, features, sequence_length):
 
 def visualize_hierarchical(args, features):
     """Visualize hierarchical feature importance results"""
-    tree = features[0].root
+    hierarchy = features[0].hierarchy
     opts = SimpleNamespace(output_dir=args.output_dir, effect_name="Importance Score", color_scheme="ylorrd9",
                            color_range=[1, 9], sorting_param=constants.EFFECT_SIZE, minimal_labels=False, rectangle_leaves=True)
     nodes = {}
-    for node in anytree.LevelOrderIter(tree):
-        if node.important or node.name == constants.DUMMY_ROOT:
-            parent = nodes[node.parent.name] if node.parent else None
-            newnode = anytree.Node(node.name, parent=parent,
-                                   description=node.description, effect_size=node.effect_size, was_leaf=node.is_leaf)
-            nodes[newnode.name] = newnode
+    important, effect_size = (hierarchy.columns["important"], hierarchy.columns["effect_size"])
+    for level in hierarchy.levels():
+        for position in level:
+            name = hierarchy.names[position]
+            if important[position] or name == constants.DUMMY_ROOT:
+                parent = hierarchy.parents[position]
+                newnode = anytree.Node(name, parent=nodes[parent] if parent >= 0 else None, description=hierarchy.descriptions[position],
+                                       effect_size=effect_size[position].item(), was_leaf=not hierarchy.children(position).size)
+                nodes[position] = newnode
     if len(nodes) <= 1:
         print("No important features identified, skipping feature importance hierarchy visualization.")
         return
@@ -1,12 +1,90 @@
 """Unit tests"""
 
+import asyncio
+import glob
+import logging
+import os
 import random
+import time
+from types import SimpleNamespace
 
+import anytree
+import h5py
 import numpy as np
 import pytest
 
-from anamod.core.compute_p_values import bh_procedure
-from anamod import ModelAnalyzer
+from anamod.core import constants, master, pipelines, utils, worker
+from anamod.core.compute_p_values import bh_procedure, compute_empirical_p_value, compute_empirical_p_values, compute_statistics
+from anamod.core.feature import FeatureHierarchy, linkage_parents
+from anamod.core.perturbations import Permutation
+from anamod.core.pipelines import CondorPipeline
+from anamod.core.prediction import BatchedModel, tune_batch_rows
+from anamod.core.results import Results
+from anamod import ModelAnalyzer, TemporalModelAnalyzer
+
+
+class LinearModel():
+    """Linear model over features (summed over a window for temporal data) that counts calls to predict"""
+    def __init__(self, coefficients, window=slice(3, 7)):
+        self.coefficients = coefficients
+        self.window = window
+        self.num_calls = 0
+
+    def predict(self, X):
+        """Predict outputs on input instances"""
+        self.num_calls += 1
+        if X.ndim == 3:
+            X = X[:, :, self.window].sum(axis=2)
+        return X @ self.coefficients
+
+
+class ProbabilityModel():
+    """Wraps model to output probabilities, clipped to [0, 1]"""
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, X):
+        """Predict probabilities on input instances"""
+        return np.clip(0.5 + self.model.predict(X) / 4, 0, 1)
+
+
+def gen_model_data(num_instances=100, num_features=10, sequence_length=None, seed=0):
+    """Generate linear model with half of its features relevant, along with data and targets"""
+    rng = np.random.default_rng(seed)
+    coefficients = np.zeros(num_features)
+    coefficients[:num_features // 2] = rng.uniform(1, 2, size=num_features // 2)
+    shape = (num_instances, num_features) if sequence_length is None else (num_instances, num_features, sequence_length)
+    data = rng.normal(size=shape)
+    model = LinearModel(coefficients)
+    targets = model.predict(data) + rng.normal(scale=0.1, size=num_instances)
+    model.num_calls = 0
+    return model, data, targets
+
+
+def gen_hierarchy(num_features=10):
+    """Generate hierarchy with contiguous and non-contiguous feature groups"""
+    root = anytree.Node("root")
+    contiguous = anytree.Node("contiguous", parent=root)
+    non_contiguous = anytree.Node("non_contiguous", parent=root)
+    for idx in range(num_features // 2):
+        anytree.Node(str(idx), parent=contiguous, idx=[idx])
+    for idx in sorted(range(num_features // 2, num_features), key=lambda idx: idx % 2):
+        anytree.Node(str(idx), parent=non_contiguous, idx=[idx])
+    return root
+
+
+def analyze(tmpdir, name, model, data, targets, analyzer_class=ModelAnalyzer, **kwargs):
+    """Run analysis with default test options and return features"""
+    analyzer = analyzer_class(model, data, targets, output_dir=f"{tmpdir}/{name}", visualize=False, **kwargs)
+    return analyzer.analyze()
+
+
+def assert_same_results(features, other_features):
+    """Check that analysis results are identical"""
+    assert [feature.name for feature in features] == [feature.name for feature in other_features]
+    for feature, other_feature in zip(features, other_features):
+        for attribute in ["pvalue", "effect_size", "important", "ordering_pvalue", "window", "window_pvalue", "window_effect_size"]:
+            assert getattr(feature, attribute) == getattr(other_feature, attribute), f"{feature.name}: {attribute}"
 
 
 def test_bh_procedure1():
@@ -24,8 +102,563 @@ def test_bh_procedure1():
     assert adjusted_pvalues[:5] == (0.001 * 25, 0.008 * 25/2, 0.042 * 25/5, 0.042 * 25/5, 0.042 * 25/5)  # noqa: E226
 
 
+@pytest.mark.parametrize("num_instances", [1, 6, 101])
+def test_vectorized_statistics(num_instances):
+    """Test vectorized permutation test statistics against per-permutation computation"""
+    rng = np.random.default_rng(0)
+    baseline_loss = rng.exponential(size=num_instances)
+    perturbed_loss = rng.exponential(size=(num_instances, 50))
+    results = compute_statistics(baseline_loss, perturbed_loss, constants.CHOICES_TEST_STATISTICS)
+    columns = perturbed_loss.T
+    expected = {constants.MEAN_LOSS: [np.mean(column) for column in columns],
+                constants.MEAN_LOG_LOSS: [np.mean(np.log(column)) for column in columns],
+                constants.MEDIAN_LOSS: [np.median(column) for column in columns],
+                constants.RELATIVE_MEAN_LOSS: [np.mean(column / baseline_loss) for column in columns],
+                constants.SIGN_LOSS: [np.sign(sum(column > baseline_loss + 1e-10) - num_instances // 2) for column in columns]}
+    for statistic, values in expected.items():
+        assert np.allclose(results[statistic][1], values, rtol=1e-12), statistic
+    pvalues = compute_empirical_p_values(baseline_loss, perturbed_loss, constants.CHOICES_TEST_STATISTICS)
+    for statistic in constants.CHOICES_TEST_STATISTICS:
+        assert pvalues[statistic] == compute_empirical_p_value(baseline_loss, perturbed_loss, statistic)
+
+
+def test_permutation_banks(monkeypatch):
+    """Test that banks of permutation indices reproduce the permutations given by shuffling the data"""
+    monkeypatch.setattr(Permutation, "max_bank_size", 300)  # Multiple banks
+    data = np.random.default_rng(0).normal(size=(100, 3))
+    rng, other_rng = np.random.default_rng(1), np.random.default_rng(1)
+    permutation = Permutation(rng, 100, 10)
+    for _ in range(10):
+        shuffled = np.copy(data)
+        other_rng.shuffle(shuffled)
+        assert np.array_equal(permutation.operate(data), shuffled)
+    assert rng.integers(1000) == other_rng.integers(1000)
+    # Enumerated permutations
+    permutation = Permutation(rng, 3, 10)
+    permuted = {tuple(permutation.operate(np.arange(3))) for _ in range(5)}
+    assert len(permuted) == 5 and (0, 1, 2) not in permuted
+    with pytest.raises(StopIteration):
+        permutation.operate(np.arange(3))
+
+
 def test_loss_function_processing():
     """Test loss function processing"""
     targets = np.random.default_rng(0).integers(3, size=100)
     with pytest.raises(ValueError):
         ModelAnalyzer(None, None, targets)
+
+
+def test_batched_prediction(tmpdir):
+    """Test that stacking permuted copies of the data into batched predict calls leaves results unchanged"""
+    model, data, targets = gen_model_data()
+    features = analyze(tmpdir, "unbatched", model, data, targets)
+    num_calls = model.num_calls
+    model.num_calls = 0
+    batched_features = analyze(tmpdir, "batched", model, data, targets, max_batch_rows=1000)
+    assert model.num_calls < num_calls / 5
+    assert_same_results(features, batched_features)
+    model, data, targets = gen_model_data(sequence_length=10)
+    features = analyze(tmpdir, "unbatched_temporal", model, data, targets, analyzer_class=TemporalModelAnalyzer)
+    batched_features = analyze(tmpdir, "batched_temporal", model, data, targets, analyzer_class=TemporalModelAnalyzer,
+                               max_batch_bytes=10 * data.nbytes)
+    assert_same_results(features, batched_features)
+
+
+def test_in_place_perturbation(tmpdir):
+    """Test that perturbing in place leaves results and data unchanged"""
+    model, data, targets = gen_model_data()
+    original_data = np.copy(data)
+    features = analyze(tmpdir, "copy", model, data, targets, feature_hierarchy=gen_hierarchy())
+    in_place_features = analyze(tmpdir, "in_place", model, data, targets, feature_hierarchy=gen_hierarchy(), perturb_in_place=True)
+    assert_same_results(features, in_place_features)
+    batched_features = analyze(tmpdir, "in_place_batched", model, data, targets, feature_hierarchy=gen_hierarchy(),
+                               perturb_in_place=True, max_batch_rows=350)
+    assert_same_results(features, batched_features)
+    assert np.array_equal(data, original_data)
+    model, data, targets = gen_model_data(sequence_length=10)
+    original_data = np.copy(data)
+    features = analyze(tmpdir, "copy_temporal", model, data, targets, analyzer_class=TemporalModelAnalyzer)
+    in_place_features = analyze(tmpdir, "in_place_temporal", model, data, targets, analyzer_class=TemporalModelAnalyzer,
+                                perturb_in_place=True)
+    assert_same_results(features, in_place_features)
+    assert np.array_equal(data, original_data)
+
+
+def test_local_parallel_pipeline(tmpdir):
+    """Test that distributing the analysis across local processes leaves results unchanged"""
+    model, data, targets = gen_model_data()
+    features = analyze(tmpdir, "serial", model, data, targets)
+    parallel_features = analyze(tmpdir, "parallel", model, data, targets, n_jobs=2, features_per_worker=3)
+    assert_same_results(features, parallel_features)
+    model, data, targets = gen_model_data(sequence_length=10)
+    features = analyze(tmpdir, "serial_temporal", model, data, targets, analyzer_class=TemporalModelAnalyzer)
+    parallel_features = analyze(tmpdir, "parallel_temporal", model, data, targets, analyzer_class=TemporalModelAnalyzer,
+                                n_jobs=2, features_per_worker=3, perturb_in_place=True)
+    assert_same_results(features, parallel_features)
+    for invalid_kwargs in [dict(n_jobs=0), dict(worker_n_jobs=-2)]:
+        with pytest.raises(ValueError):
+            analyze(tmpdir, "invalid", model, data, targets, **invalid_kwargs)
+
+
+@pytest.mark.parametrize("worker_executor", ["thread", "process"])
+def test_level_parallel_hierarchy(tmpdir, worker_executor):
+    """Test that perturbing hierarchy levels concurrently leaves results unchanged"""
+    model, data, targets = gen_model_data(sequence_length=10)
+    features = analyze(tmpdir, "serial", model, data, targets, analyzer_class=TemporalModelAnalyzer, feature_hierarchy=gen_hierarchy())
+    parallel_features = analyze(tmpdir, "parallel", model, data, targets, analyzer_class=TemporalModelAnalyzer,
+                                feature_hierarchy=gen_hierarchy(), worker_executor=worker_executor, worker_n_jobs=3, perturb_in_place=True)
+    assert_same_results(features, parallel_features)
+
+
+def test_threaded_binary_cross_entropy(tmpdir):
+    """Test threaded analysis with binary cross-entropy loss, including zero probabilities"""
+    model, data, targets = gen_model_data(sequence_length=10)
+    model = ProbabilityModel(model)
+    targets = (targets > 0).astype(np.int64)
+    features = analyze(tmpdir, "serial", model, data, targets, analyzer_class=TemporalModelAnalyzer)
+    threaded_features = analyze(tmpdir, "threaded", model, data, targets, analyzer_class=TemporalModelAnalyzer,
+                                worker_executor="thread", worker_n_jobs=4, perturb_in_place=True)
+    assert_same_results(features, threaded_features)
+
+
+def test_baseline_computed_by_master(tmpdir):
+    """Test that workers load baseline losses computed by master instead of recomputing them"""
+    model, data, targets = gen_model_data()
+    args = SimpleNamespace(model=model, data=data, targets=targets, loss_function=constants.QUADRATIC_LOSS,
+                           condor=True, output_dir=str(tmpdir), logger=logging.getLogger(__name__), dtype=None)
+    master.compute_baseline(args)
+    assert model.num_calls == 1
+    worker_args = SimpleNamespace(loss_function=constants.QUADRATIC_LOSS, baseline_filename=args.baseline_filename,
+                                  logger=args.logger, dtype=None)
+    baseline_loss, _ = worker.compute_baseline(worker_args, worker.Inputs(data, targets, model))
+    assert model.num_calls == 1
+    assert np.array_equal(baseline_loss, (model.predict(data) - targets)**2)
+
+
+def test_early_stopping(tmpdir):
+    """Test that sequential permutation tests stop early without changing importance decisions"""
+    model, data, targets = gen_model_data()
+    features = analyze(tmpdir, "full", model, data, targets, num_permutations=500)
+    num_calls = model.num_calls
+    model.num_calls = 0
+    early_features = analyze(tmpdir, "early", model, data, targets, num_permutations=500, early_stopping_tolerance=1e-3)
+    assert model.num_calls < num_calls / 5
+    assert [feature.important for feature in features] == [feature.important for feature in early_features]
+
+
+@pytest.mark.parametrize("statistic", constants.CHOICES_TEST_STATISTICS)
+def test_streaming_statistics(tmpdir, statistic):
+    """Test that accumulating test statistics online gives the same results as storing perturbed losses"""
+    model, data, targets = gen_model_data(sequence_length=10)
+    targets = np.abs(targets)  # positive losses for log-loss statistic
+    kwargs = dict(analyzer_class=TemporalModelAnalyzer, permutation_test_statistic=statistic, feature_hierarchy=gen_hierarchy())
+    features = analyze(tmpdir, "matrix", model, data, targets, **kwargs)
+    streaming_features = analyze(tmpdir, "streaming", model, data, targets, streaming_statistics=True, **kwargs)
+    for feature, streaming_feature in zip(features, streaming_features):
+        assert feature.name == streaming_feature.name
+        assert np.isclose(feature.effect_size, streaming_feature.effect_size)
+        for attribute in ["pvalue", "important", "ordering_pvalue", "window", "window_pvalue"]:
+            assert getattr(feature, attribute) == getattr(streaming_feature, attribute), f"{feature.name}: {attribute}"
+
+
+def test_float32_analysis(tmpdir):
+    """Test that float32 analysis carries reduced precision through and matches float64 importance decisions"""
+    model, data, targets = gen_model_data(sequence_length=10)
+    features = analyze(tmpdir, "float64", model, data, targets, analyzer_class=TemporalModelAnalyzer)
+    analyzer = TemporalModelAnalyzer(model, data, targets, output_dir=f"{tmpdir}/float32", visualize=False, dtype="float32")
+    assert analyzer.data.dtype == np.float32 and analyzer.targets.dtype == np.float32
+    float32_features = analyzer.analyze()
+    for feature, float32_feature in zip(features, float32_features):
+        assert feature.important == float32_feature.important
+        assert np.isclose(feature.effect_size, float32_feature.effect_size, rtol=1e-4)
+        assert feature.window == float32_feature.window
+    with pytest.raises(ValueError):
+        TemporalModelAnalyzer(model, data, targets, output_dir=f"{tmpdir}/float16", dtype="float16")
+
+
+def test_kary_window_search(tmpdir):
+    """Test that k-ary window search finds the same windows as binary search in fewer rounds of predictions"""
+    model, data, targets = gen_model_data(sequence_length=40)
+    features = analyze(tmpdir, "binary", model, data, targets, analyzer_class=TemporalModelAnalyzer, max_batch_rows=10**6)
+    num_calls = model.num_calls
+    model.num_calls = 0
+    kary_features = analyze(tmpdir, "kary", model, data, targets, analyzer_class=TemporalModelAnalyzer, max_batch_rows=10**6,
+                            window_search_arity=8)
+    assert model.num_calls < num_calls
+    for feature, kary_feature in zip(features, kary_features):
+        assert feature.important == kary_feature.important
+        assert feature.window == kary_feature.window
+    assert [feature.window for feature in kary_features if feature.important] == [(3, 6)] * 5
+    # Candidates of each round share calls to predict with default batch settings as well
+    model.num_calls = 0
+    features = analyze(tmpdir, "binary_default", model, data, targets, analyzer_class=TemporalModelAnalyzer)
+    num_calls = model.num_calls
+    model.num_calls = 0
+    kary_features = analyze(tmpdir, "kary_default", model, data, targets, analyzer_class=TemporalModelAnalyzer, window_search_arity=8)
+    assert model.num_calls < num_calls
+    assert [feature.window for feature in features] == [feature.window for feature in kary_features]
+
+
+def test_perturbation_cache(tmpdir):
+    """Test that cached perturbation results are reused across analyses, with identical results"""
+    model, data, targets = gen_model_data(sequence_length=10)
+    kwargs = dict(analyzer_class=TemporalModelAnalyzer, cache_dir=f"{tmpdir}/cache")
+    features = analyze(tmpdir, "uncached", model, data, targets, **kwargs)
+    assert model.num_calls > 1
+    model.num_calls = 0
+    cached_features = analyze(tmpdir, "cached", model, data, targets, **kwargs)
+    assert model.num_calls == 1  # baseline
+    assert_same_results(features, cached_features)
+    # Changing significance level reuses results
+    model.num_calls = 0
+    analyze(tmpdir, "changed", model, data, targets, importance_significance_level=0.01, **kwargs)
+    assert model.num_calls == 1
+    # Changing number of permutations does not
+    analyze(tmpdir, "more_permutations", model, data, targets, num_permutations=60, **kwargs)
+    assert model.num_calls > 2
+    # Eviction
+    cache_size = sum(os.path.getsize(filename) for filename in glob.glob(f"{tmpdir}/cache/*"))
+    analyze(tmpdir, "evicted", model, data, targets, cache_max_bytes=cache_size // 2, **kwargs)
+    assert sum(os.path.getsize(filename) for filename in glob.glob(f"{tmpdir}/cache/*")) <= cache_size // 2
+
+
+def test_checkpoint_resume(tmpdir):
+    """Test that a restarted analysis resumes from the checkpoint log, with identical results"""
+    model, data, targets = gen_model_data(sequence_length=10)
+    kwargs = dict(analyzer_class=TemporalModelAnalyzer, checkpoint=True, cleanup=False)
+    features = analyze(tmpdir, "checkpointed", model, data, targets, **kwargs)
+    checkpoint_filename = constants.CHECKPOINT_FILENAME.format(f"{tmpdir}/checkpointed", 0)
+    assert os.path.isfile(checkpoint_filename)
+    model.num_calls = 0
+    resumed_features = analyze(tmpdir, "checkpointed", model, data, targets, **kwargs)
+    assert model.num_calls == 1  # baseline
+    assert_same_results(features, resumed_features)
+    # Partially written record is discarded and recomputed
+    with open(checkpoint_filename, "r+b") as checkpoint_file:
+        checkpoint_file.truncate(os.path.getsize(checkpoint_filename) - 10)
+    model.num_calls = 0
+    resumed_features = analyze(tmpdir, "checkpointed", model, data, targets, **kwargs)
+    assert model.num_calls > 1
+    assert_same_results(features, resumed_features)
+
+
+def test_chunked_data(tmpdir):
+    """Test that streaming data through the model in chunks of instances gives identical results"""
+    model, data, targets = gen_model_data(sequence_length=10)
+    features = analyze(tmpdir, "whole", model, data, targets, analyzer_class=TemporalModelAnalyzer)
+    chunked_features = analyze(tmpdir, "chunked", model, data, targets, analyzer_class=TemporalModelAnalyzer, data_chunk_rows=7)
+    # Predictions on chunks may differ from predictions on the whole data in the last floating-point digits
+    for feature, chunked_feature in zip(features, chunked_features):
+        for attribute in ["pvalue", "important", "ordering_pvalue", "window", "window_pvalue"]:
+            assert getattr(feature, attribute) == getattr(chunked_feature, attribute), f"{feature.name}: {attribute}"
+        assert feature.effect_size == pytest.approx(chunked_feature.effect_size)
+
+
+@pytest.mark.parametrize("data_format", constants.CHOICES_DATA_FORMATS)
+def test_lazy_data_loading(tmpdir, data_format):
+    """Test that worker opens data file lazily when streaming data in chunks"""
+    model, data, targets = gen_model_data(sequence_length=10)
+    analyzer = TemporalModelAnalyzer(model, data, targets, output_dir=str(tmpdir), data_chunk_rows=7, data_format=data_format)
+    data_filename = analyzer.gen_data_file(analyzer.data, analyzer.targets)
+    args = SimpleNamespace(data_filename=data_filename, data_array_filename=analyzer.data_array_filename, data_chunk_rows=7)
+    lazy_data, lazy_targets = worker.load_data(args)
+    assert not isinstance(lazy_data, np.ndarray) or isinstance(lazy_data, np.memmap)
+    assert np.array_equal(lazy_data[...], data) and np.array_equal(lazy_targets, targets)
+    pred = worker.predict_chunked(model, lazy_data, args.data_chunk_rows)
+    assert np.allclose(pred, model.predict(data))
+
+
+@pytest.mark.parametrize("statistic", [constants.MEAN_LOSS, constants.SIGN_LOSS])
+def test_instance_sharding(tmpdir, statistic):
+    """Test that sharding instances across jobs gives the same results as perturbing all instances"""
+    model, data, targets = gen_model_data()
+    kwargs = dict(n_jobs=2, features_per_worker=5, permutation_test_statistic=statistic)
+    features = analyze(tmpdir, "unsharded", model, data, targets, **kwargs)
+    sharded_features = analyze(tmpdir, "sharded", model, data, targets, instance_shards=3, **kwargs)
+    for feature, sharded_feature in zip(features, sharded_features):
+        assert (feature.name, feature.pvalue, feature.important) == (sharded_feature.name, sharded_feature.pvalue, sharded_feature.important)
+        assert feature.effect_size == pytest.approx(sharded_feature.effect_size)
+    # Shards reduced on serial path (single process) as well
+    serial_features = analyze(tmpdir, "serial", model, data, targets, permutation_test_statistic=statistic)
+    serial_sharded_features = analyze(tmpdir, "serial_sharded", model, data, targets, instance_shards=3, permutation_test_statistic=statistic)
+    assert [feature.pvalue for feature in serial_features] == [feature.pvalue for feature in serial_sharded_features]
+    assert any(feature.pvalue < 1. for feature in serial_sharded_features)
+    for invalid_kwargs in [dict(instance_shards=0), dict(instance_shards=3, permutation_test_statistic=constants.MEDIAN_LOSS)]:
+        with pytest.raises(ValueError):
+            analyze(tmpdir, "invalid", model, data, targets, **{**kwargs, **invalid_kwargs})
+
+
+def test_out_of_core_inputs(tmpdir):
+    """Test analysis of data provided out-of-core, as memory-mapped array or HDF5 file"""
+    model, data, targets = gen_model_data(sequence_length=10)
+    features = analyze(tmpdir, "in_memory", model, data, targets, analyzer_class=TemporalModelAnalyzer)
+    np.save(f"{tmpdir}/data.npy", data)
+    with h5py.File(f"{tmpdir}/data.hdf5", "w") as root:
+        root.create_dataset(constants.DATA, data=data)
+        root.create_dataset(constants.TARGETS, data=targets)
+    for name, (out_of_core_data, out_of_core_targets), kwargs in [
+            ("memmap", (np.load(f"{tmpdir}/data.npy", mmap_mode="r"), targets), dict(n_jobs=2, features_per_worker=5)),
+            ("hdf5", (f"{tmpdir}/data.hdf5", None), dict(data_chunk_rows=30))]:
+        out_of_core_features = analyze(tmpdir, name, model, out_of_core_data, out_of_core_targets,
+                                       analyzer_class=TemporalModelAnalyzer, **kwargs)
+        for feature, out_of_core_feature in zip(features, out_of_core_features):
+            assert (feature.name, feature.pvalue, feature.window) == (out_of_core_feature.name, out_of_core_feature.pvalue, out_of_core_feature.window)
+    # Data file references out-of-core data (of matching dtype) instead of copying it
+    with TemporalModelAnalyzer(model, f"{tmpdir}/data.hdf5", None, output_dir=str(tmpdir.mkdir("data_file")),
+                               dtype=constants.FLOAT64) as analyzer:
+        assert isinstance(analyzer.data, h5py.Dataset)
+        data_filename = analyzer.gen_data_file(analyzer.data, analyzer.targets)
+    assert not analyzer.data  # Data file closed
+    assert analyzer.external_data_filename == f"{tmpdir}/data.hdf5"
+    args = SimpleNamespace(data_filename=data_filename, data_chunk_rows=analyzer.data_chunk_rows)
+    worker_data, worker_targets = worker.load_data(args)
+    assert np.array_equal(worker_data[...], data) and np.array_equal(worker_targets, targets)
+
+
+def test_batch_size_tuning(tmpdir):
+    """Test splitting of calls to predict into batches, and tuning of batch size"""
+    model, data, targets = gen_model_data()
+    batched_model = BatchedModel(model, max_rows=30)
+    assert np.allclose(batched_model.predict(data), model.predict(data))
+    assert model.num_calls == 5  # 4 batches + 1 unbatched
+    batch_rows, throughputs = tune_batch_rows(model, data, max_bytes=1000 * data[0].nbytes)
+    assert batch_rows in throughputs and max(throughputs) == 1000
+    features = analyze(tmpdir, "untuned", model, data, targets)
+    tuned_features = analyze(tmpdir, "tuned", model, data, targets, tune_batch_size=True)
+    for feature, tuned_feature in zip(features, tuned_features):
+        assert (feature.name, feature.pvalue) == (tuned_feature.name, tuned_feature.pvalue)
+
+
+class AsyncLinearModel():
+    """Stand-in for client of inference service: linear model predicting asynchronously, with latency"""
+    def __init__(self, model):
+        self.model = model
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def predict(self, X):
+        """Predict outputs on input instances"""
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        return self.model.predict(X)
+
+
+def test_async_model(tmpdir):
+    """Test that asynchronous models are kept busy with concurrent predictions, with identical results"""
+    model, data, targets = gen_model_data(sequence_length=10)
+    features = analyze(tmpdir, "sync", model, data, targets, analyzer_class=TemporalModelAnalyzer)
+    async_model = AsyncLinearModel(model)
+    async_features = analyze(tmpdir, "async", async_model, data, targets, analyzer_class=TemporalModelAnalyzer, max_concurrent_predictions=4)
+    assert async_model.max_in_flight == 4
+    assert_same_results(features, async_features)
+
+
+def test_columnar_results(tmpdir):
+    """Test that results are written to columnar HDF5 file, readable directly or lazily as features"""
+    model, data, targets = gen_model_data(sequence_length=10)
+    features = analyze(tmpdir, "results", model, data, targets, analyzer_class=TemporalModelAnalyzer, feature_hierarchy=gen_hierarchy())
+    filename = f"{tmpdir}/results/{constants.FEATURE_IMPORTANCE}.hdf5"
+    with h5py.File(filename, "r") as root:
+        assert np.array_equal(root["pvalue"][...], [feature.pvalue for feature in features])
+    with Results(filename) as results:
+        assert results[constants.NAMES] == [feature.name for feature in features]
+        loaded_features = results.features()
+        assert [feature.parent.name if feature.parent else None for feature in loaded_features] == \
+            [feature.parent.name if feature.parent in features else None for feature in features]
+        assert [feature.idx.tolist() for feature in loaded_features] == [feature.idx.tolist() for feature in features]
+        assert_same_results(features, loaded_features)
+
+
+def test_feature_hierarchy(tmpdir):
+    """Test array-backed feature hierarchy and feature views"""
+    model, data, targets = gen_model_data()
+    analyzer = ModelAnalyzer(model, data, targets, output_dir=str(tmpdir), feature_hierarchy=gen_hierarchy())
+    hierarchy = analyzer.feature_hierarchy
+    assert isinstance(hierarchy, FeatureHierarchy)
+    assert [node.name for node in anytree.PreOrderIter(hierarchy.root)] == \
+        [constants.DUMMY_ROOT, "root", "contiguous", "0", "1", "2", "3", "4", "non_contiguous", "6", "8", "5", "7", "9"]
+    non_contiguous = hierarchy.feature(8)
+    assert non_contiguous.idx.tolist() == [6, 8, 5, 7, 9] and non_contiguous.size == 5
+    assert non_contiguous.parent.name == "root" and non_contiguous.depth == 2 and not non_contiguous.is_leaf
+    assert [[hierarchy.names[position] for position in level] for level in hierarchy.levels()][:3] == \
+        [[constants.DUMMY_ROOT], ["root"], ["contiguous", "non_contiguous"]]
+    # Results are stored in columns shared by views
+    non_contiguous.overall_pvalue = 0.01
+    non_contiguous.window = (2, 4)
+    assert hierarchy.feature(8).pvalue == 0.01 and hierarchy.columns["temporal_window"][8].tolist() == [2, 4]
+    # Subset of hierarchy keeps links and results among selected nodes
+    subset = hierarchy.subset([8, 9, 10])
+    assert [feature.parent.name if feature.parent else None for feature in subset.features()] == [None, "non_contiguous", "non_contiguous"]
+    assert subset.feature(0).window == (2, 4) and subset.feature(1).window is None
+
+
+def test_hierarchy_ingestion(tmpdir):
+    """Test ingestion of hierarchy from linkage matrix and parent array, matching equivalent anytree hierarchy"""
+    model, data, targets = gen_model_data(num_features=200)
+    num_features = data.shape[1]
+    # Deep (caterpillar) linkage: each merge adds the next feature to the previous cluster
+    linkage = np.array([[0 if i == 0 else num_features + i - 1, i + 1, 1., i + 2] for i in range(num_features - 1)])
+    nodes = [anytree.Node(str(idx), idx=[idx]) for idx in range(num_features)]
+    for i, (left, right, _, _) in enumerate(linkage):
+        nodes.append(anytree.Node(str(num_features + i), children=[nodes[int(min(left, right))], nodes[int(max(left, right))]]))
+    hierarchies = [ModelAnalyzer(model, data, targets, output_dir=str(tmpdir), feature_hierarchy=feature_hierarchy).feature_hierarchy
+                   for feature_hierarchy in [nodes[-1], linkage, linkage_parents(linkage)]]
+    for hierarchy in hierarchies:
+        assert hierarchy.indices.size == num_features  # Index sets are ranges of one shared index array
+        assert hierarchy.names == hierarchies[0].names
+        assert np.array_equal(hierarchy.parents, hierarchies[0].parents)
+        assert [feature.idx.tolist() for feature in hierarchy.features()] == [feature.idx.tolist() for feature in hierarchies[0].features()]
+    assert sorted(hierarchies[0].root.children[0].idx.tolist()) == list(range(num_features))
+
+
+def test_cost_balanced_jobs(tmpdir, monkeypatch):
+    """Test assignment of features to jobs balancing estimated costs, and claiming of queued features by jobs"""
+    model, data, targets = gen_model_data()
+    analyzer = ModelAnalyzer(model, data, targets, output_dir=str(tmpdir), feature_hierarchy=gen_hierarchy(), features_per_worker=4)
+    analyzer.logger = logging.getLogger(__name__)
+    pipeline = CondorPipeline(analyzer)
+    sizes = np.array([feature.size for feature in pipeline.features])
+    costs = pipeline.estimate_costs()
+    assert costs.shape == sizes.shape and np.all(costs[sizes == 10] > costs[sizes == 1])
+    # Root (10 indices) alone in one job, remaining groups and leaves balanced across other jobs
+    groups, queued = pipeline.partition_features(sizes.astype(float))
+    assert sorted(sum(feature.size for feature in group) for group in groups) == [6, 7, 7, 10] and not queued.size
+    pipeline.args.shared_queue_fraction = 0.2
+    groups, queued = pipeline.partition_features(sizes.astype(float))
+    assert queued.size == 6 and sum(len(group) for group in groups) == len(pipeline.features) - 6
+    # Jobs claim queued features
+    kwargs = dict(n_jobs=2, features_per_worker=4, feature_hierarchy=gen_hierarchy(), cleanup=False)
+    features = analyze(tmpdir, "unqueued", model, data, targets, **kwargs)
+    queued_features = analyze(tmpdir, "queued", model, data, targets, shared_queue_fraction=0.5, **kwargs)
+    assert_same_results(features, queued_features)
+    with open(f"{constants.QUEUE_FILENAME.format(f'{tmpdir}/queued')}.claims", encoding="utf-8") as claims_log:
+        assert claims_log.read()
+    # Restarted run reuses partition (regardless of estimated costs) along with results of completed jobs
+    os.remove(constants.RESULTS_FILENAME.format(f"{tmpdir}/queued/outputs_1", 1))
+    monkeypatch.setattr(CondorPipeline, "estimate_costs", lambda self: np.random.default_rng().random(len(self.features)))
+    restarted_features = analyze(tmpdir, "queued", model, data, targets, shared_queue_fraction=0.5, **kwargs)
+    assert_same_results(queued_features, restarted_features)
+
+
+def test_cost_by_analysis_type(tmpdir, monkeypatch):
+    """Test that estimated costs, and hence the assignment of features to jobs, account for temporal analysis"""
+    model, data, targets = gen_model_data(sequence_length=10)
+    analyzer = ModelAnalyzer(model, data, targets, output_dir=str(tmpdir), feature_hierarchy=gen_hierarchy(), features_per_worker=4)
+    analyzer.logger = logging.getLogger(__name__)
+    pipeline = CondorPipeline(analyzer)
+    partitions = []
+    for analysis_type in [constants.HIERARCHICAL, constants.TEMPORAL]:
+        times = iter([1., 3.])  # Prediction, perturbation
+        monkeypatch.setattr(pipelines, "measure_time", lambda func, times=times: next(times))
+        pipeline.args.analysis_type = analysis_type
+        costs = pipeline.estimate_costs()
+        groups, _ = pipeline.partition_features(costs)
+        partitions.append(sorted(sum(feature.size for feature in group) for group in groups))
+    # Window search and ordering tests weigh predictions more heavily than perturbations of larger features
+    assert partitions == [[4, 7, 8, 11], [4, 7, 7, 12]]
+
+
+def test_distributed_hierarchy_pruning(tmpdir):
+    """Test that descending hierarchy level by level across jobs gives the same results as the serial pipeline"""
+    model, data, targets = gen_model_data()
+    features = analyze(tmpdir, "serial", model, data, targets, feature_hierarchy=gen_hierarchy())
+    pruned_features = analyze(tmpdir, "pruned", model, data, targets, feature_hierarchy=gen_hierarchy(), n_jobs=2, prune_hierarchy=True)
+    assert_same_results(features, pruned_features)
+    # Descendants of unimportant group not tested
+    non_contiguous = next(feature for feature in pruned_features if feature.name == "non_contiguous")
+    assert not non_contiguous.important and all(child.pvalue == 1. for child in non_contiguous.children)
+    # Level without perturbable features skipped, leaving default results
+    analyzer = ModelAnalyzer(model, data, targets, output_dir=f"{tmpdir}/unperturbable", visualize=False, feature_hierarchy=gen_hierarchy(),
+                             n_jobs=2, prune_hierarchy=True)
+    hierarchy = analyzer.feature_hierarchy
+    hierarchy.perturbable[hierarchy.children(hierarchy.roots[0])] = False
+    assert not any(feature.important for feature in analyzer.analyze())
+
+
+class StandInEvent(dict):
+    """Stand-in for condor job event"""
+    def __init__(self, event_type, **kwargs):
+        super().__init__(**kwargs)
+        self.type = event_type
+
+
+class StandInJob(SimpleNamespace):
+    """Stand-in for condor job, hashable like CondorJobWrapper"""
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+
+class StandInEventLog():
+    """Stand-in for condor job event log, reading events written as lines of '<type> <key>=<value> ...'"""
+    num_open = 0
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.offset = 0
+        StandInEventLog.num_open += 1
+
+    def __getstate__(self):
+        return dict(filename=self.filename, offset=self.offset)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        StandInEventLog.num_open += 1
+
+    def close(self):
+        """Close log"""
+        StandInEventLog.num_open -= 1
+
+    def events(self, stop_after):  # pylint: disable = unused-argument
+        """Yield events written since previous read"""
+        with open(self.filename, encoding="utf-8") as log:
+            log.seek(self.offset)
+            for line in iter(log.readline, ""):
+                self.offset = log.tell()
+                event_type, *items = line.split()
+                yield StandInEvent(event_type, **{key: int(value) for key, value in (item.split("=") for item in items)})
+
+
+def test_event_log_monitoring(tmpdir, monkeypatch):
+    """Test monitoring of condor jobs by incrementally reading event logs, with bounded number of open logs and adaptive polling"""
+    monkeypatch.setattr(utils, "JobEventType", SimpleNamespace(EXECUTE="EXECUTE", JOB_TERMINATED="JOB_TERMINATED", JOB_HELD="JOB_HELD"),
+                        raising=False)
+    jobs = [StandInJob(name=f"job{idx}", filenames=SimpleNamespace(log_filename=f"{tmpdir}/job{idx}.log"), tries=1, running=False,
+                       cluster_id=idx, retry_arbitrary_failures=False, submit_time=time.time(), execute_time=-1, error_count=0,
+                       cleanup=lambda cleanup: None)
+            for idx in range(5)]
+
+    def write_events(job, *events):
+        with open(job.filenames.log_filename, "a", encoding="utf-8") as log:
+            log.writelines(f"{event}\n" for event in events)
+
+    # Reader returns only new events, closing least recently read logs (keeping their positions) to stay within bound
+    reader = utils.EventLogReader(StandInEventLog, max_open=2)
+    assert not reader.read(jobs[0])  # Log not written yet
+    for job in jobs:
+        write_events(job, "SUBMIT", "EXECUTE")
+    assert [[event.type for event in reader.read(job)] for job in jobs] == [["SUBMIT", "EXECUTE"]] * len(jobs)
+    assert StandInEventLog.num_open == reader.num_open == 2
+    assert not any(reader.read(job) for job in jobs)
+    write_events(jobs[0], "JOB_TERMINATED TerminatedNormally=1 ReturnValue=0")
+    assert [event.type for event in reader.read(jobs[0])] == ["JOB_TERMINATED"]
+    jobs[0].tries += 1  # Resubmitted job has new log, read from the start
+    assert len(reader.read(jobs[0])) == 3
+    reader.close()
+    assert StandInEventLog.num_open == 0
+    # Monitor polls again soon after new events (here, one job terminating per poll), backing off while no events are seen
+    sleeps = []
+
+    def sleep(interval):
+        sleeps.append(interval)
+        if len(sleeps) > 3:
+            write_events(jobs[len(sleeps) - 3], "JOB_TERMINATED TerminatedNormally=1 ReturnValue=0")
+    monkeypatch.setattr(time, "sleep", sleep)
+    monkeypatch.setattr(utils.CondorJobWrapper, "logger", logging.getLogger(__name__))
+    monkeypatch.setattr(utils, "CONDOR_MIN_POLL_INTERVAL", 1)
+    monkeypatch.setattr(utils, "CONDOR_MAX_POLL_INTERVAL", 3)
+    monkeypatch.setattr(utils, "CONDOR_POLL_BACKOFF", 2)
+    utils.CondorJobWrapper.monitor_event_logs(jobs[1:], cleanup=False, event_log_class=StandInEventLog)
+    assert all(job.running for job in jobs[1:]) and StandInEventLog.num_open == 0
+    assert [round(interval) for interval in sleeps] == [1, 2, 3, 3, 1, 1, 1]